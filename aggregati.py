@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Colonne numeriche aggregate e statistiche precalcolate per ciascun raggruppamento
+MISURE = ["Entrate stimate", "Vendite stimate", "Prezzo", "Piazzamento", "BSR 30", "RPR", "# di recensioni"]
+STATISTICHE = ["sum", "count", "mean"]
+
+# Raggruppamenti usati dai grafici: le chiavi singole e le combinazioni utili
+# (Marca, ASIN) permette di filtrare gli ASIN per brand senza raggruppare di nuovo il DataFrame
+RAGGRUPPAMENTI = [
+    "Marca",
+    "ASIN",
+    "Venditore",
+    "Categoria",
+    ("Marca", "ASIN"),
+    ("Marca", "Venditore"),
+    ("Categoria", "Marca"),
+]
+
+
+# Costruisce una volta per dataset pulito tutte le aggregazioni usate dalla dashboard.
+# aggregati[raggruppamento][statistica] è un DataFrame con una riga per chiave e una colonna per misura,
+# es. aggregati["Marca"]["sum"]["Entrate stimate"] o aggregati[("Marca", "Venditore")]["sum"]
+def costruisci_aggregati(df_cleaned):
+    misure = [misura for misura in MISURE if misura in df_cleaned.columns]
+    aggregati = {}
+
+    for raggruppamento in RAGGRUPPAMENTI:
+        chiavi = list(raggruppamento) if isinstance(raggruppamento, tuple) else raggruppamento
+        if not set([chiavi] if isinstance(chiavi, str) else chiavi) <= set(df_cleaned.columns):
+            continue
+
+        # dropna=False: anche le righe senza Marca/Venditore restano nei totali
+        # observed=True: per le colonne categoriche solo le combinazioni effettivamente presenti
+        tabella = df_cleaned.groupby(chiavi, dropna=False, observed=True)[misure].agg(STATISTICHE)
+        aggregati[raggruppamento] = {statistica: tabella.xs(statistica, axis=1, level=1)
+                                     for statistica in STATISTICHE}
+
+    return aggregati
+
+
+# Valori ammessi per il numero di elementi delle classifiche (top N)
+OPZIONI_TOP_N = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+# Primi n elementi per la colonna indicata (o per i valori della Serie), senza ordinare tutta la tabella:
+# np.partition trova in tempo lineare la soglia dell'n-esimo valore e si ordinano solo gli n selezionati.
+# I valori mancanti sono esclusi; a parità di valore vince la riga che viene prima, come in nlargest/nsmallest.
+# Con righe (posizioni) si cercano i primi solo tra quelle righe, senza estrarle prima dalla tabella
+def primi_n(tabella, n, colonna=None, crescente=False, righe=None):
+    valori = (tabella if colonna is None else tabella[colonna]).to_numpy(dtype="float64", na_value=np.nan)
+    if righe is not None:
+        valori = valori[righe]
+    chiavi = valori if crescente else -valori
+    validi = np.flatnonzero(~np.isnan(chiavi))
+
+    if n <= 0:
+        scelti = validi[:0]
+    elif n < len(validi):
+        candidati = chiavi[validi]
+        soglia = np.partition(candidati, n - 1)[n - 1]
+        migliori = validi[candidati < soglia]
+        pari = validi[candidati == soglia][:n - len(migliori)]
+        scelti = np.concatenate([migliori, pari])
+    else:
+        scelti = validi
+
+    scelti = scelti[np.lexsort((scelti, chiavi[scelti]))]
+    return tabella.iloc[scelti if righe is None else np.asarray(righe)[scelti]]
+
+
+# Aggregato per ASIN, eventualmente limitato agli ASIN delle marche indicate
+def per_asin(aggregati, statistica="sum", marche=None):
+    if marche is None:
+        return aggregati["ASIN"][statistica]
+
+    tabella = aggregati[("Marca", "ASIN")][statistica]
+    selezione = tabella.index.get_level_values("Marca").isin(pd.Index(marche))
+    return tabella[selezione].droplevel("Marca")
+
+
+def _per_chiave(aggregati, raggruppamento, statistica, marche):
+    if raggruppamento == "ASIN":
+        return per_asin(aggregati, statistica, marche)
+    tabella = aggregati[raggruppamento][statistica]
+    if marche is not None and raggruppamento == "Marca":
+        tabella = tabella[tabella.index.isin(pd.Index(marche))]
+    return tabella
+
+
+# Attributi aggiunti di default alla classifica: nome della colonna -> (misura, statistica)
+ATTRIBUTI_TOP_N = {"Prezzo medio": ("Prezzo", "mean")}
+
+
+# Primi n ASIN/brand per la misura indicata, con quota di mercato e attributi per chiave in un'unica tabella.
+# Gli attributi vengono letti dalle aggregazioni precalcolate allineandoli sull'indice dei primi n,
+# quindi il costo non cresce con n per il numero di righe del dataset.
+# "Market Share (%)" è la quota all'interno dei primi n, "Quota sul totale (%)" quella sull'intero dataset filtrato
+def top_n(aggregati, raggruppamento, misura, n=10, marche=None, attributi=ATTRIBUTI_TOP_N):
+    somme = _per_chiave(aggregati, raggruppamento, "sum", marche)
+    primi = primi_n(somme[misura], n)
+
+    classifica = pd.DataFrame({misura: primi})
+    classifica["Market Share (%)"] = primi / primi.sum() * 100
+    classifica["Quota sul totale (%)"] = primi / somme[misura].sum() * 100
+    for nome, (colonna, statistica) in attributi.items():
+        valori = somme if statistica == "sum" else _per_chiave(aggregati, raggruppamento, statistica, marche)
+        classifica[nome] = valori[colonna].reindex(primi.index)
+
+    classifica.index.name = raggruppamento if isinstance(raggruppamento, str) else None
+    return classifica
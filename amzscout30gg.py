@@ -1,17 +1,44 @@
-import requests
-import pip
-pip.main(["install", "openpyxl"])
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.subplots as sp
-import locale
-from PIL import Image
+import numpy as np
+from ingestione import formatta_statistiche
+from pulizia import carica_export_pulito, carica_export_multipli
+from cache_disco import impronta
+from aggregati import costruisci_aggregati, per_asin, primi_n, top_n, OPZIONI_TOP_N
+from tabelle import tabella_paginata
+from rendering import mostra_grafico, grafico_memorizzato
+from ricerca import IndiceRicerca, MODALITA
+from analisi import (kpi, tabella_variazione, righe_marche, conteggi, fulfillment_per_marca, ripartizione_fulfillment,
+                     venditori_non_riconosciuti, COLONNE_VARIAZIONE, COLONNE_RECENSIONI)
+import storico
+from registro_dati import Prenotazione
+from modello_bsr import costruisci_modello
+from confronto import (confronta, confronta_marche, riepilogo_confronto, righe_con_stato, COLONNE_CONFRONTO, COLONNA_QUOTA,
+                       PREFISSO_DELTA, SUFFISSO_PRIMA, SUFFISSO_DOPO, ENTRATO, USCITO, PRESENTE)
+from sezioni import (sezione, memorizza, frammento, segna_interazione, registra_interazione, avvia_profilazione,
+                     pannello_profilazione)
+import profilazione
+
+# Profilazione su richiesta (pannello "Debug" nella barra laterale): misura tutto ciò che segue
+avvia_profilazione()
+
+CARTELLA_APP = os.path.dirname(os.path.abspath(__file__))
+
+# Immagini della pagina lette dal disco una sola volta per processo e condivise da tutte le sessioni.
+# Senza spinner: viene chiamata prima di st.set_page_config, che deve restare il primo comando della pagina
+@st.cache_resource(show_spinner=False)
+def carica_immagine(nome):
+    from PIL import Image
+
+    immagine = Image.open(os.path.join(CARTELLA_APP, nome))
+    immagine.load()
+    return immagine
 
 # Carica un'immagine per l'icona della pagina
-img = Image.open('tondino3.png')
-image = Image.open('logo.bettershop.png')
+img = carica_immagine('tondino3.png')
+image = carica_immagine('logo.bettershop.png')
 
 # Imposta la configurazione della pagina
 st.set_page_config(
@@ -34,61 +61,167 @@ hide_style = """
     """
 st.markdown(hide_style, unsafe_allow_html=True)
 
-# Carica il file Excel
-@st.cache_data
-def load_data(file):
-    data = pd.read_excel(file)
-    return data
-
-uploaded_file = st.sidebar.file_uploader("Scegli un file Excel")
-
-if uploaded_file is None:
+# Impronta del contenuto del file, calcolata una sola volta per upload e ricordata nella sessione
+def impronta_upload(file):
+    chiave_sessione = f"impronta_{getattr(file, 'file_id', file.name)}"
+    if chiave_sessione not in st.session_state:
+        st.session_state[chiave_sessione] = impronta(file)
+    return st.session_state[chiave_sessione]
+
+# Dataset della sessione preso dal registro condiviso da tutte le sessioni del processo (vedi registro_dati):
+# lo stesso export caricato da più analisti è in memoria una volta sola e ogni sessione ne riceve una vista
+# in sola lettura. La prenotazione resta nella sessione e viene rilasciata quando la sessione cambia file
+# o termina; il file viene letto e pulito (carica()) solo se non è già nel registro.
+# Il dataset pulito resta anche nella cache su disco, condivisa tra riavvii e repliche
+def dataset_sessione(chiave_sessione, impronta_file, carica):
+    prenotazione = st.session_state.get(chiave_sessione)
+    if prenotazione is None or prenotazione.impronta_file != impronta_file:
+        rilascia_dataset(chiave_sessione)
+        prenotazione = Prenotazione(impronta_file, carica)
+        st.session_state[chiave_sessione] = prenotazione
+    return prenotazione.data, prenotazione.statistiche
+
+def rilascia_dataset(chiave_sessione):
+    prenotazione = st.session_state.pop(chiave_sessione, None)
+    if prenotazione is not None:
+        prenotazione.rilascia()
+
+# Carica il file (Excel, CSV o Parquet) e lo pulisce una volta sola per upload
+def load_data(chiave_sessione, impronta_file, file):
+    return dataset_sessione(chiave_sessione, impronta_file,
+                            lambda: carica_export_pulito(file, impronta_file=impronta_file))
+
+# Più export (es. uno per categoria o marketplace) vengono letti in parallelo e uniti in un unico dataset
+def load_data_multipli(chiave_sessione, impronte, files):
+    return dataset_sessione(chiave_sessione, "+".join(impronte),
+                            lambda: carica_export_multipli(files, list(impronte), [file.name for file in files]))
+
+uploaded_files = st.sidebar.file_uploader("Scegli uno o più file Excel, CSV o Parquet", type=["xlsx", "xlsm", "csv", "parquet"],
+                                          accept_multiple_files=True)
+
+if not uploaded_files:
     st.info("Carica un file tramite il menu laterale")
     st.stop()
 
-df = load_data(uploaded_file)
-
-
+# Aggregazioni per Marca, ASIN, Venditore e Categoria, calcolate una volta per dataset pulito
+@st.cache_resource(max_entries=8)
+def load_aggregati(impronta_file, _df_cleaned):
+    return costruisci_aggregati(_df_cleaned)
+
+# Indice di ricerca sui nomi delle marche, costruito una volta per dataset pulito
+@st.cache_resource(max_entries=8)
+def load_indice_marche(impronta_file, _df_cleaned):
+    return IndiceRicerca(_df_cleaned["Marca"])
+
+# Curva Sales rank -> vendite stimate per Categoria, stimata una volta per dataset pulito
+@st.cache_resource(max_entries=8)
+def load_modello_bsr(impronta_file, _df_cleaned):
+    return costruisci_modello(_df_cleaned)
+
+# Confronto ASIN per ASIN tra un export precedente e quello caricato, calcolato una volta per coppia di file
+@st.cache_resource(max_entries=4)
+def load_confronto(impronta_precedente, impronta_file, _precedente, _attuale):
+    differenze = confronta(_precedente, _attuale)
+    marche = confronta_marche(differenze)
+    return differenze, marche, riepilogo_confronto(differenze, marche)
+
+with profilazione.fase("caricamento export", "ingestione"):
+    impronte = tuple(impronta_upload(file) for file in uploaded_files)
+    if len(uploaded_files) == 1:
+        impronta_file = impronte[0]
+        df, statistiche_lettura = load_data("_dataset", impronta_file, uploaded_files[0])
+    else:
+        # Il dataset unito è identificato dall'insieme ordinato dei file che lo compongono
+        impronta_file = "+".join(impronte)
+        df, statistiche_lettura = load_data_multipli("_dataset", impronte, uploaded_files)
+st.sidebar.caption(formatta_statistiche(statistiche_lettura))
+
+# Storico: la fotografia dell'export può essere aggiunta allo storico giornaliero per seguire gli ASIN nel tempo
+with st.sidebar.expander("Storico"):
+    data_fotografia = st.date_input("Data della fotografia")
+    if storico.contiene(impronta_file, data_fotografia):
+        st.caption("Export già presente nello storico per questa data")
+    elif st.button("Aggiungi allo storico"):
+        righe = storico.aggiungi_snapshot(df, impronta_file, data_fotografia, ", ".join(file.name for file in uploaded_files))
+        st.caption(f"{righe:,} righe aggiunte".replace(",", "."))
+    st.caption(f"Date nello storico: {len(storico.date_disponibili())}")
+with profilazione.fase("aggregazioni", "calcolo"):
+    aggregati = load_aggregati(impronta_file, df)
+
+# Report completo (KPI, tutte le tabelle in Excel o Parquet e i grafici) scaricabile come archivio zip.
+# Viene scritto su disco solo su richiesta, in un solo passaggio e senza tenere le tabelle in memoria (report.esporta_report);
+# l'archivio resta in una cartella temporanea della sessione, eliminata quando la sessione prepara un altro report o termina.
+# chiave identifica dataset e filtri come nelle tabelle; marche come in analisi.tabelle_analisi
+def report_completo(df_cleaned, chiave, marche=None):
+    with st.sidebar.expander("Report completo"):
+        formato_tabelle = st.radio("Tabelle", ["xlsx", "parquet"], horizontal=True, key="formato_report",
+                                   on_change=segna_interazione, args=("formato_report",))
+        chiave = (chiave, n_top, formato_tabelle)
+        if st.button("Prepara il report"):
+            # Import locale: report carica plotly.express, che non serve all'avvio della dashboard
+            from report import esporta_report, comprimi
+
+            st.session_state.pop("_report", None)
+            cartella = tempfile.TemporaryDirectory(prefix="amzscout_report_")
+            with st.spinner("Scrittura del report"), profilazione.fase("report completo", "sezione"):
+                esporta_report(df_cleaned, aggregati, os.path.join(cartella.name, "report"), n_top, marche,
+                               modello=load_modello_bsr(impronta_file, df), tabelle=formato_tabelle)
+                comprimi(os.path.join(cartella.name, "report"), os.path.join(cartella.name, "report.zip"))
+            st.session_state["_report"] = (chiave, cartella)
+
+        preparato = st.session_state.get("_report")
+        if preparato is not None and preparato[0] == chiave:
+            with open(os.path.join(preparato[1].name, "report.zip"), "rb") as archivio:
+                st.download_button("Scarica il report", archivio, file_name="report.zip", mime="application/zip")
+        else:
+            st.caption("Il report non è ancora stato preparato per questi dati e filtri")
 
 
 # Scelta del tipo di analisi
-analisi_type = st.sidebar.radio("Seleziona il tipo di analisi:", [None, "RISULTATO BRAND", "RISULTATO CATEGORIA"])
+analisi_type = st.sidebar.radio("Seleziona il tipo di analisi:", [None, "RISULTATO BRAND", "RISULTATO CATEGORIA", "CONFRONTO"],
+                                on_change=segna_interazione, args=("analisi_type",))
 
+# Numero di ASIN/brand mostrati in tutte le classifiche
+n_top = st.sidebar.select_slider("Numero di elementi nelle classifiche (Top N)", options=OPZIONI_TOP_N, value=10,
+                                 on_change=segna_interazione, args=("n_top",))
 
-if analisi_type == "RISULTATO BRAND":
-    # Rimuovi le colonne specifiche
-    brand_name = st.sidebar.text_input("Inserisci il nome del BRAND:")
-
-    columns_to_remove = ["Netto", "Commissioni FBA", "Margine netto", "LQS", "Peso"]
-    df_cleaned = df.drop(columns=columns_to_remove, axis=1)
-
-    # Formatta la colonna "Disponibile da" come data
-    df_cleaned["Disponibile da"] = pd.to_datetime(df_cleaned["Disponibile da"], errors="coerce").dt.strftime("%d/%m/%Y")
+# L'export precedente serve solo al confronto: fuori da CONFRONTO non lo si tiene occupato nel registro
+if analisi_type != "CONFRONTO":
+    rilascia_dataset("_dataset_precedente")
 
-    # Rimuovi i duplicati basati sulla colonna "ASIN"
-    df_cleaned = df_cleaned.drop_duplicates(subset=["ASIN"])
 
-    # Converte le celle vuote in "Vendite stimate" in 1 se "Entrate stimate" contiene un valore
-    mask = (df_cleaned["Vendite stimate"].isna()) & (df_cleaned["Entrate stimate"].notna())
-    df_cleaned.loc[mask, "Vendite stimate"] = 1
+if analisi_type == "RISULTATO BRAND":
+    brand_name = st.sidebar.text_input("Inserisci il nome del BRAND:", on_change=segna_interazione, args=("brand_name",))
+    modalita_ricerca = st.sidebar.radio("Ricerca del BRAND", MODALITA, horizontal=True,
+                                        on_change=segna_interazione, args=("modalita_ricerca",))
 
-    # Rimuovi le righe in cui entrambe le colonne sono vuote
-    df_cleaned = df_cleaned.dropna(subset=["Vendite stimate", "Entrate stimate"], how="all")
+    # Il DataFrame caricato è già pulito (vedi pulizia.pulisci_dati): a ogni rerun si applica solo il filtro sul brand
+    df_cleaned = df
+    marche_filtrate = None
 
     if brand_name:
-        # Filtra il DataFrame in base al nome del brand
-        df_cleaned = df_cleaned[df_cleaned["Marca"].str.contains(brand_name, case=False, na=False)]
+        # Filtra il DataFrame in base al nome del brand: l'indice trova le marche e le loro righe senza scorrere il dataset
+        with profilazione.fase("filtro brand", "calcolo"):
+            indice_marche = load_indice_marche(impronta_file, df)
+            identificativi = indice_marche.identificativi(brand_name, modalita_ricerca)
+            marche_filtrate = pd.Index(indice_marche.distinti[identificativi])
+            df_cleaned = df_cleaned.iloc[indice_marche.righe_di(identificativi)]
         if df_cleaned.empty:
             st.sidebar.warning("NESSUN BRAND RILEVATO")
 
+    # Identifica il contenuto delle tabelle (file caricato + filtro sul brand) per riusarne gli ordinamenti
+    chiave_tabelle = (impronta_file, brand_name, modalita_ricerca)
+
     # Espandi il DataFrame pulito per la visualizzazione
     with st.expander("Anteprima dei dati puliti"):
-        st.dataframe(df_cleaned)
+        tabella_paginata(df_cleaned, "brand_anteprima", chiave_tabelle)
 
     # KPIs
-    total_Revenue = df_cleaned["Entrate stimate"].sum()
-    total_Sales = df_cleaned["Vendite stimate"].sum()
-    asp = df_cleaned["Prezzo"].mean()
+    # I risultati dipendono solo da dataset e filtro sul brand: si memorizzano con la stessa chiave delle tabelle
+    indicatori = memorizza("brand_kpi", chiave_tabelle, kpi, df_cleaned)
+    total_Revenue = indicatori["Total Revenue"]
+    total_Sales = indicatori["Total Sales"]
+    asp = indicatori["Average Selling Price"]
 
     formatted_total_revenues = "{:,.2f}".format(total_Revenue).replace(",", "X").replace(".", ",").replace("X", ".")
     formatted_total_units = "{:,.2f}".format(total_Sales).replace(",", "X").replace(".", ",").replace("X", ".")
@@ -114,13 +247,13 @@ if analisi_type == "RISULTATO BRAND":
 
     #FULFILLMENT KPIS
 
-    fatturato_FBA = df_cleaned[df['Venditore'] == 'FBA']['Entrate stimate'].sum()
-    fatturato_MFN = df_cleaned[df['Venditore'] == 'MCH']['Entrate stimate'].sum()
-    fatturato_AMZ = df_cleaned[df['Venditore'] == 'AMZ']['Entrate stimate'].sum()
+    # Entrate, vendite e ASIN per Marca e gestione fulfillment in un solo raggruppamento, poi i totali per gestione
+    fulfillment_marca = memorizza("brand_fulfillment", chiave_tabelle, fulfillment_per_marca, df_cleaned)
+    ripartizione = ripartizione_fulfillment(fulfillment_marca)
 
-    incidenza_FBA = (fatturato_FBA / total_Revenue) * 100
-    incidenza_MFN = ( fatturato_MFN / total_Revenue) * 100
-    incidenza_AMZ = (fatturato_AMZ / total_Revenue) * 100
+    incidenza_FBA = ripartizione.loc["FBA", "Quota (%)"]
+    incidenza_MFN = ripartizione.loc["MCH/FBM", "Quota (%)"]
+    incidenza_AMZ = ripartizione.loc["AMZ", "Quota (%)"]
 
     col4, col5, col6 = st.columns(3)
 
@@ -139,12 +272,19 @@ if analisi_type == "RISULTATO BRAND":
         st.metric(
             label="AMZ",
             value="{:.2f} %".format(incidenza_AMZ))
+
+    # Codici Venditore diversi da FBA, MCH e AMZ: non rientrano nelle tre metriche, quindi si segnalano
+    altri_venditori = venditori_non_riconosciuti(ripartizione)
+    if len(altri_venditori):
+        st.warning("Fatturato con codici Venditore non riconosciuti: " + ", ".join(
+            "{} ({:.2f} %, {} ASIN)".format(codice, riga["Quota (%)"], int(riga["Conteggio ASIN"]))
+            for codice, riga in altri_venditori.iterrows()))
         
     colA, colB= st.columns(2)
 
     # Calcola il conteggio di ASIN e Marca
-    count_asin = df_cleaned["ASIN"].nunique()
-    count_brand = df_cleaned["Marca"].nunique()
+    count_asin = indicatori["Conteggio ASIN"]
+    count_brand = indicatori["Conteggio BRAND"]
 
     with colA:
         st.metric("Conteggio ASIN", count_asin, "ASIN")
@@ -155,261 +295,331 @@ if analisi_type == "RISULTATO BRAND":
 
     #ANALISI PER PRODOTTI NEL RISULTATO BRAND
 
-    st.subheader("_Visualizzazione TOP BRAND per Revenue e Unita'_", divider ="orange")
+    # Somme per ASIN (limitate ai brand filtrati) lette dalle aggregazioni precalcolate, usate da più sezioni
+    somme_ASIN = per_asin(aggregati, "sum", marche_filtrate)
 
-    # Seleziona il grafico da visualizzare
+    # I grafici dipendono dal dataset, dal filtro sul brand e dal Top N (più gli eventuali widget della sezione):
+    # con la stessa chiave vengono serviti dalla cache delle figure senza ricostruirli
+    chiave_grafici = (chiave_tabelle, n_top)
 
-    selected_chart = st.selectbox("Seleziona il grafico da visualizzare", ["ASIN BY REVENUES", "ASIN BY UNITS"])
+    report_completo(df_cleaned, chiave_tabelle, None if marche_filtrate is None else list(marche_filtrate))
 
-    col7, col8 = st.columns(2)
+    # Le sezioni seguenti vengono calcolate solo se aperte
+    if sezione("_Visualizzazione TOP BRAND per Revenue e Unita'_", "top", aperta=True):
+        @frammento("top")
+        def sezione_top():
+            # Import locali: plotly viene caricato solo quando una sezione con grafici viene aperta
+            import plotly.express as px
 
-    ASIN_revenues = df_cleaned.groupby("ASIN").sum().nlargest(10, "Entrate stimate")
+            # Seleziona il grafico da visualizzare
 
-    fig1 = px.bar(ASIN_revenues,
-                x=ASIN_revenues.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
-                y="Entrate stimate",
-                title="Top 10 ASIN by Revenue")
+            selected_chart = st.selectbox("Seleziona il grafico da visualizzare", ["ASIN BY REVENUES", "ASIN BY UNITS"],
+                                          on_change=segna_interazione, args=("selected_chart", "top"))
 
-    ASIN_units = df_cleaned.groupby("ASIN").sum().nlargest(10, "Vendite stimate")
+            col7, col8 = st.columns(2)
 
-    fig2 = px.bar(ASIN_units,
-                x=ASIN_units.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
-                y="Vendite stimate",
-                title="Top 10 ASIN by Units")
+            def costruisci_fig1():
+                ASIN_revenues = primi_n(somme_ASIN, n_top, "Entrate stimate")
 
-    # Ordina il DataFrame in base al fatturato (in ordine decrescente)
-    df_sorted_revenues = df_cleaned.sort_values(by="Entrate stimate", ascending=False)
-    df_sorted_units = df_cleaned.sort_values(by="Vendite stimate", ascending=False)
+                return px.bar(ASIN_revenues,
+                            x=ASIN_revenues.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
+                            y="Entrate stimate",
+                            title=f"Top {n_top} ASIN by Revenue")
 
+            def costruisci_fig2():
+                ASIN_units = primi_n(somme_ASIN, n_top, "Vendite stimate")
 
-    # Seleziona solo le colonne "ASIN" e "Product Details"
-    preview_table1 = df_sorted_revenues[["ASIN", "Nome prodotto","Prezzo"]]
-    preview_table2 = df_sorted_units[["ASIN", "Nome prodotto","Prezzo"]]
+                return px.bar(ASIN_units,
+                            x=ASIN_units.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
+                            y="Vendite stimate",
+                            title=f"Top {n_top} ASIN by Units")
 
+            # Colonne mostrate nelle tabelle: la tabella paginata estrae da df_cleaned solo la pagina visibile
+            # (l'ordinamento per fatturato/unità avviene nella tabella paginata)
+            colonne_table1 = ["ASIN", "Nome prodotto","Prezzo", "Entrate stimate"]
+            colonne_table2 = ["ASIN", "Nome prodotto","Prezzo", "Vendite stimate"]
 
-    # Visualizza il grafico selezionato
-    if selected_chart == "ASIN BY REVENUES":
-        with col7:
-            st.plotly_chart(fig1)
-        with col8:
-            st.dataframe(preview_table1)
-    else:
-        with col7:
-            st.plotly_chart(fig2)
-        with col8:
-            st.dataframe(preview_table2)
 
+            # Visualizza il grafico selezionato
+            if selected_chart == "ASIN BY REVENUES":
+                with col7:
+                    grafico_memorizzato("brand_asin_revenues", chiave_grafici, costruisci_fig1)
+                with col8:
+                    tabella_paginata(df_cleaned, "brand_asin_revenues", chiave_tabelle, ordina_per="Entrate stimate", crescente=False,
+                                     colonne=colonne_table1)
+            else:
+                with col7:
+                    grafico_memorizzato("brand_asin_units", chiave_grafici, costruisci_fig2)
+                with col8:
+                    tabella_paginata(df_cleaned, "brand_asin_units", chiave_tabelle, ordina_per="Vendite stimate", crescente=False,
+                                     colonne=colonne_table2)
 
-    st.subheader("_Quote di mercato e Prezzo_", divider ="orange")
+        sezione_top()
 
-    col9, col10 =st.columns(2)
 
-   # Calcola le quote di mercato percentuali per i primi 10 ASIN
-    top_10_ASIN = df_cleaned.groupby("ASIN")["Entrate stimate"].sum().nlargest(10)
-    ASIN_market_share_percentage = top_10_ASIN / top_10_ASIN.sum() * 100
+    if sezione("_Quote di mercato e Prezzo_", "quote"):
+        @frammento("quote")
+        def sezione_quote():
+            import plotly.express as px
+            import plotly.graph_objects as go
 
-    # Crea un DataFrame con le quote di mercato percentuali
-    market_share_df = pd.DataFrame({
-        "ASIN": top_10_ASIN.index,
-        "Market Share (%)": ASIN_market_share_percentage.values})
-    
-# Crea il grafico a torta per i primi 10 brand
-    fig_pie = px.pie(market_share_df,
-                 names="ASIN",
-                 values="Market Share (%)",
-                 title="Quote di Mercato dei Top 10 ASIN")
+            col9, col10 =st.columns(2)
 
-    with col9:
-        st.plotly_chart(fig_pie)
+           # Calcola le quote di mercato percentuali e il prezzo medio per i primi N ASIN (solo se i grafici non sono in cache)
+            def quote_ASIN():
+                return top_n(aggregati, "ASIN", "Entrate stimate", n_top, marche_filtrate).reset_index()
 
-    # Crea il sottografo con due assi y
-    fig3 = go.Figure()
+        # Crea il grafico a torta per i primi N ASIN
+            def costruisci_fig_pie():
+                market_share_df = quote_ASIN()
+                return px.pie(market_share_df,
+                             names="ASIN",
+                             values="Market Share (%)",
+                             title=f"Quote di Mercato dei Top {n_top} ASIN")
 
-    # Aggiungi il grafico a barre per le quote di mercato sull'asse y sinistra
-    fig3.add_trace(go.Bar(x=market_share_df["ASIN"], y=market_share_df["Market Share (%)"], name="Quote di Mercato (%)"))
+            with col9:
+                grafico_memorizzato("brand_quote_torta", chiave_grafici, costruisci_fig_pie)
 
-    # Crea un secondo asse y per i valori in colonna "Prezzo"
-    fig3.update_layout(yaxis=dict(title="Quote di Mercato (%)", titlefont=dict(color="blue")),
-                    yaxis2=dict(title="Prezzo", titlefont=dict(color="red"), overlaying="y", side="right"))
-    fig3.add_trace(go.Scatter(x=market_share_df["ASIN"], y=[df_cleaned[df_cleaned["ASIN"] == asin]["Prezzo"].mean() for asin in top_10_ASIN.index],
-                         mode="lines+markers", name="Prezzo", yaxis="y2"))
+            def costruisci_fig3():
+                market_share_df = quote_ASIN()
 
-    # Imposta il titolo del grafico
-    fig3.update_layout(title="Quote di Mercato e Prezzo dei Top 10 ASIN")
+                # Crea il sottografo con due assi y
+                fig3 = go.Figure()
 
-    # Imposta le etichette degli assi
-    fig3.update_xaxes(title_text="ASIN")
+                # Aggiungi il grafico a barre per le quote di mercato sull'asse y sinistra
+                fig3.add_trace(go.Bar(x=market_share_df["ASIN"], y=market_share_df["Market Share (%)"], name="Quote di Mercato (%)"))
 
-    with col10:
-        st.plotly_chart(fig3, use_container_width=True)
+                # Crea un secondo asse y per i valori in colonna "Prezzo"
+                fig3.update_layout(yaxis=dict(title="Quote di Mercato (%)", titlefont=dict(color="blue")),
+                                yaxis2=dict(title="Prezzo", titlefont=dict(color="red"), overlaying="y", side="right"))
+                fig3.add_trace(go.Scatter(x=market_share_df["ASIN"], y=market_share_df["Prezzo medio"],
+                                     mode="lines+markers", name="Prezzo", yaxis="y2"))
 
-    st.subheader("_Analisi Sales Rank / Vendite stimate_", divider ="orange")
+                # Imposta il titolo del grafico
+                fig3.update_layout(title=f"Quote di Mercato e Prezzo dei Top {n_top} ASIN")
 
-    col11, col12 = st.columns([1,1])
-    ASIN_ratings = df_cleaned.groupby("ASIN").sum().nsmallest(10, "Piazzamento")
+                # Imposta le etichette degli assi
+                fig3.update_xaxes(title_text="ASIN")
+                return fig3
 
-    # Rimuovi le righe in cui "Piazzamento" è vuoto o uguale a zero
-    ASIN_ratings = ASIN_ratings.dropna(subset=["Piazzamento"])
-    ASIN_ratings = ASIN_ratings[ASIN_ratings["Piazzamento"] > 0]
+            with col10:
+                grafico_memorizzato("brand_quote_prezzo", chiave_grafici, costruisci_fig3, use_container_width=True)
 
-    # Ordina il DataFrame in modo crescente in base al "Piazzamento"
-    ASIN_ratings = ASIN_ratings.sort_values(by="Piazzamento")
+        sezione_quote()
 
-    fig4 = px.bar(
-        ASIN_ratings,
-        x="Piazzamento",
-        y=ASIN_ratings.index,
-        title="Top 10 ASIN by Sales Rank",
-        orientation="h")
+    if sezione("_Analisi Sales Rank / Vendite stimate_", "rank"):
+        @frammento("rank")
+        def sezione_rank():
+            import plotly.express as px
+            import plotly.graph_objects as go
 
-    fig4.update_traces(marker_color="lightblue", marker_line_width=1.5)
+            col11, col12 = st.columns([1,1])
 
-    fig4.update_layout(
-        xaxis_title="Piazzamento",
-        yaxis_title="ASIN",
-        yaxis=dict(autorange="reversed"))
-    
-    with col11:
-        st.plotly_chart(fig4)
+            def costruisci_fig4():
+                # Rimuovi le righe in cui "Piazzamento" è vuoto o uguale a zero, poi prendi gli N migliori (in ordine crescente)
+                ASIN_ratings = primi_n(somme_ASIN[somme_ASIN["Piazzamento"] > 0], n_top, "Piazzamento", crescente=True)
+
+                fig4 = px.bar(
+                    ASIN_ratings,
+                    x="Piazzamento",
+                    y=ASIN_ratings.index,
+                    title=f"Top {n_top} ASIN by Sales Rank",
+                    orientation="h")
+
+                fig4.update_traces(marker_color="lightblue", marker_line_width=1.5)
+
+                fig4.update_layout(
+                    xaxis_title="Piazzamento",
+                    yaxis_title="ASIN",
+                    yaxis=dict(autorange="reversed"))
+                return fig4
 
-    preview_table3 = df_cleaned[["ASIN", "Nome prodotto","Piazzamento","Vendite stimate"]]
+            with col11:
+                # Oltre il limite di punti i Sales rank degli ASIN esclusi si riassumono con la media (una somma di rank non ha senso)
+                grafico_memorizzato("brand_sales_rank", chiave_grafici, costruisci_fig4, aggregazione="mean")
 
-    with col12:
-        st.dataframe(preview_table3)
+            with col12:
+                tabella_paginata(df_cleaned, "brand_sales_rank", chiave_tabelle, colonne=["ASIN", "Nome prodotto","Piazzamento","Vendite stimate"])
 
     
-    #GRAFICO CONFRONTO PIAZZAMENTO VENDITE E PREZZO
-    # Seleziona i primi 10 ASIN in base alle Vendite stimate
-    top_10_ASIN = df_cleaned.nlargest(10, 'Vendite stimate')
+            #GRAFICO CONFRONTO PIAZZAMENTO VENDITE E PREZZO
+            def costruisci_fig6():
+                # Seleziona i primi N ASIN in base alle Vendite stimate
+                top_ASIN = primi_n(df_cleaned, n_top, 'Vendite stimate')
 
-    fig6 = go.Figure()
+                fig6 = go.Figure()
 
-    # Aggiungi le barre per Vendite stimate e Piazzamento sull'asse y sinistra
-    fig6.add_trace(go.Bar(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Vendite stimate'], name='Vendite stimate', yaxis='y', marker_color='blue'))
-    fig6.add_trace(go.Bar(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Piazzamento'], name='Piazzamento', yaxis='y', marker_color='lightblue'))
+                # Aggiungi le barre per Vendite stimate e Piazzamento sull'asse y sinistra
+                fig6.add_trace(go.Bar(x=top_ASIN['ASIN'], y=top_ASIN['Vendite stimate'], name='Vendite stimate', yaxis='y', marker_color='blue'))
+                fig6.add_trace(go.Bar(x=top_ASIN['ASIN'], y=top_ASIN['Piazzamento'], name='Piazzamento', yaxis='y', marker_color='lightblue'))
 
-    # Aggiungi il Prezzo come linea sull'asse y destra
-    fig6.add_trace(go.Scatter(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Prezzo'], name='Prezzo', yaxis='y2', mode='lines+markers', line=dict(color='green')))
+                # Aggiungi il Prezzo come linea sull'asse y destra
+                fig6.add_trace(go.Scatter(x=top_ASIN['ASIN'], y=top_ASIN['Prezzo'], name='Prezzo', yaxis='y2', mode='lines+markers', line=dict(color='green')))
 
-    # Imposta i titoli degli assi e del grafico
-    fig6.update_layout(
-        title='Confronto tra Vendite stimate, Piazzamento e Prezzo per i primi 10 ASIN per Vendite stimate',
-        xaxis_title='ASIN',
-        yaxis_title='Vendite/Piazzamento',
-        yaxis2=dict(
-            title='Prezzo',
-            overlaying='y',
-            side='right'))
+                # Imposta i titoli degli assi e del grafico
+                fig6.update_layout(
+                    title=f'Confronto tra Vendite stimate, Piazzamento e Prezzo per i primi {n_top} ASIN per Vendite stimate',
+                    xaxis_title='ASIN',
+                    yaxis_title='Vendite/Piazzamento',
+                    yaxis2=dict(
+                        title='Prezzo',
+                        overlaying='y',
+                        side='right'))
+                return fig6
 
-    # Visualizza il grafico
-    st.plotly_chart(fig6, use_container_width=True)
+            # Visualizza il grafico
+            # Nella voce "Altri" le vendite si sommano, il Piazzamento (come il Prezzo) è la media
+            grafico_memorizzato("brand_confronto_vendite", chiave_grafici, costruisci_fig6, aggregazione={"Piazzamento": "mean"},
+                                use_container_width=True)
 
+        sezione_rank()
 
 
 
 
 
 
-    st.subheader("_Analisi scostamento Sales rank da BSR 30_", divider ="orange")
 
+    if sezione("_Analisi scostamento Sales rank da BSR 30_", "bsr"):
+        @frammento("bsr")
+        def sezione_bsr():
+            import plotly.express as px
 
-    # GRAFICO VARIAZIONE % PIAZZAMENTO E BSR 30
-    col13, col14 =st.columns(2)
-    # Crea un nuovo DataFrame con le colonne desiderate
-    df_variazione = df_cleaned[["ASIN", "Nome prodotto", "Piazzamento", "BSR 30"]]
 
-    # Calcola la percentuale di variazione tra "Piazzamento" e "BSR 30"
-    df_variazione["Variazione %"] = ((df_variazione["Piazzamento"] - df_variazione["BSR 30"]) / df_variazione["BSR 30"]) * 100
+            # GRAFICO VARIAZIONE % PIAZZAMENTO E BSR 30
+            col13, col14 =st.columns(2)
+            # Calcola la percentuale di variazione tra "Piazzamento" e "BSR 30" (ordinata per Piazzamento)
+            # Con la curva rank -> vendite della categoria si stima anche quante unità vale lo spostamento in classifica
+            df_variazione = memorizza("brand_variazione", chiave_tabelle, tabella_variazione, df_cleaned, COLONNE_VARIAZIONE,
+                                      load_modello_bsr(impronta_file, df))
 
-    # Ordina il nuovo DataFrame in base alla variazione %
-    df_variazione = df_variazione.sort_values(by="Piazzamento")
+            with col14:
+                tabella_paginata(df_variazione, "brand_variazione", chiave_tabelle, ordina_per="Piazzamento")
 
-    with col14:
-        st.dataframe(df_variazione)
+            # Aggiungi un filtro per il range di valori Variazione %
+            variazione_range = st.slider("Seleziona un range di Variazione %", min_value=-100, max_value=100, value=(-100, 100),
+                                         on_change=segna_interazione, args=("variazione_range", "bsr"))
 
-    # Aggiungi un filtro per il range di valori Variazione %
-    variazione_range = st.slider("Seleziona un range di Variazione %", min_value=-100, max_value=100, value=(-100, 100))
+            def costruisci_fig5_filtered():
+                # Righe nel range selezionato: si estraggono solo quelle da disegnare
+                valori_variazione = df_variazione["Variazione %"].to_numpy()
+                filtered_df_variazione = df_variazione.iloc[np.flatnonzero((valori_variazione >= variazione_range[0]) & (valori_variazione <= variazione_range[1]))]
 
-    # Crea il DataFrame filtrato in base al range selezionato
-    filtered_df_variazione = df_variazione[(df_variazione["Variazione %"] >= variazione_range[0]) & (df_variazione["Variazione %"] <= variazione_range[1])]
+                # Crea il grafico a barre con i dati filtrati
+                fig5_filtered = px.bar(filtered_df_variazione, x="ASIN", y="Variazione %", title="Variazione % tra Piazzamento e BSR 30 per ASIN")
 
-    # Crea il grafico a barre con i dati filtrati
-    fig5_filtered = px.bar(filtered_df_variazione, x="ASIN", y="Variazione %", title="Variazione % tra Piazzamento e BSR 30 per ASIN")
+                # Imposta le etichette degli assi
+                fig5_filtered.update_xaxes(title_text="ASIN")
+                fig5_filtered.update_yaxes(title_text="Variazione %")
 
-    # Imposta le etichette degli assi
-    fig5_filtered.update_xaxes(title_text="ASIN")
-    fig5_filtered.update_yaxes(title_text="Variazione %")
+                # Colora le barre in base al valore di Variazione %
+                colors_filtered = ["green" if val < 0 else "red" for val in filtered_df_variazione["Variazione %"]]
+                fig5_filtered.update_traces(marker=dict(color=colors_filtered))
+                return fig5_filtered
 
-    # Colora le barre in base al valore di Variazione %
-    colors_filtered = ["green" if val < 0 else "red" for val in filtered_df_variazione["Variazione %"]]
-    fig5_filtered.update_traces(marker=dict(color=colors_filtered))
+            # Visualizza il grafico
+            with col13:
+                grafico_memorizzato("brand_variazione", (chiave_tabelle, variazione_range), costruisci_fig5_filtered, aggregazione="mean")
 
-    # Visualizza il grafico
-    with col13:
-        st.plotly_chart(fig5_filtered)
+            #COMMENTO IMPORTANTE!
+            st.markdown("considerazioni importanti:")
+            st.markdown("in merito al confronto tra Sales rank (Piazzamento) e Variazione % è importante ricordarsi che i dati estratti dalla source sono una fotografia del tracciamento. Infatti una discrepanza riscontrata è che per alcuni ASIN è stato rilevato una variazione % positiva del sales rank ma nonostante ciò la stima del venduto è 1 in quanto la posizione in classifica attuale rimane comunque alta.\n\n Se si vuole avere un traciamento più dinamico si potrebbe identificare e confrontare a quanto corrisponde il BSR 30 in termini di vendite con la stima di vendite della posizione attuale così da poter dire che negli ultimi 30gg si è passati da un sales rank a un altro con una variazione di stima di vendite x.")
 
-    #COMMENTO IMPORTANTE!
-    st.markdown("considerazioni importanti:")
-    st.markdown("in merito al confronto tra Sales rank (Piazzamento) e Variazione % è importante ricordarsi che i dati estratti dalla source sono una fotografia del tracciamento. Infatti una discrepanza riscontrata è che per alcuni ASIN è stato rilevato una variazione % positiva del sales rank ma nonostante ciò la stima del venduto è 1 in quanto la posizione in classifica attuale rimane comunque alta.\n\n Se si vuole avere un traciamento più dinamico si potrebbe identificare e confrontare a quanto corrisponde il BSR 30 in termini di vendite con la stima di vendite della posizione attuale così da poter dire che negli ultimi 30gg si è passati da un sales rank a un altro con una variazione di stima di vendite x.")
+            #ANNOTAZIONI IMPORTANTI: Prendere come esempio l'ASIN B0B74RSBQZ BSR 30 56k a Piazzamento attuale 1.2k e dire: nell'ultimo periodo si stima un aumento delle vendite di tot distribuito irregolarmente nel periodo.
 
-    #ANNOTAZIONI IMPORTANTI: Prendere come esempio l'ASIN B0B74RSBQZ BSR 30 56k a Piazzamento attuale 1.2k e dire: nell'ultimo periodo si stima un aumento delle vendite di tot distribuito irregolarmente nel periodo.
+            # ANDAMENTO NEL TEMPO DAI DATI DELLO STORICO
+            # Per i primi ASIN per Vendite stimate si leggono dallo storico Sales rank e vendite di tutte le fotografie salvate.
+            # Ogni ASIN è una traccia del grafico: se ne mostrano al massimo storico.MASSIMO_TRAIETTORIE, qualunque sia il Top N
+            if len(storico.date_disponibili()) > 1:
+                n_traiettorie = min(n_top, storico.MASSIMO_TRAIETTORIE)
+                storia = storico.traiettorie(primi_n(df_cleaned, n_traiettorie, "Vendite stimate")["ASIN"])
 
+                col_storia1, col_storia2 = st.columns(2)
 
-    st.subheader("_Analisi Entrate stimate e Recensioni_", divider ="orange")
+                fig_storia_rank = px.line(storia, x="Data", y="Piazzamento", color="ASIN", markers=True,
+                                          title=f"Andamento del Sales rank dei primi {n_traiettorie} ASIN per Vendite stimate")
+                fig_storia_rank.update_yaxes(autorange="reversed")
 
+                fig_storia_vendite = px.line(storia, x="Data", y="Vendite stimate", color="ASIN", markers=True,
+                                             title=f"Andamento delle Vendite stimate dei primi {n_traiettorie} ASIN")
 
+                with col_storia1:
+                    mostra_grafico(fig_storia_rank, use_container_width=True)
+                with col_storia2:
+                    mostra_grafico(fig_storia_vendite, use_container_width=True)
 
-    # GRAFICO RPR CONFRONTO ENTRATE STIMATE E NUMERO DI REVIEWS
-    # Ordina il DataFrame per "Entrate stimate" in ordine decrescente e prendi i primi 10 ASIN
-    df = df_cleaned.sort_values(by="Entrate stimate", ascending=False).head(10)
+        sezione_bsr()
 
-    # Crea il grafico a barre per "Entrate stimate" e "# di recensioni"
-    fig7 = go.Figure()
 
-    fig7.add_trace(go.Bar(x=df["ASIN"], y=df["Entrate stimate"], name="Entrate stimate"))
-    fig7.add_trace(go.Bar(x=df["ASIN"], y=df["# di recensioni"], name="# di recensioni"))
+    if sezione("_Analisi Entrate stimate e Recensioni_", "recensioni"):
+        @frammento("recensioni")
+        def sezione_recensioni():
+            import plotly.graph_objects as go
 
-    # Aggiungi il grafico a linea per "RPR"
-    fig7.add_trace(go.Scatter(x=df["ASIN"], y=df["RPR"], mode="lines", name="RPR", yaxis="y2"))
 
-    # Imposta le etichette degli assi
-    fig7.update_layout(
-        xaxis=dict(title="ASIN"),
-        yaxis=dict(title="Valore", titlefont=dict(color="blue"), tickfont=dict(color="blue")),
-        yaxis2=dict(title="RPR", titlefont=dict(color="red"), tickfont=dict(color="red"),
-                    overlaying="y", side="right"))
 
-    # Imposta il titolo del grafico
-    fig7.update_layout(title="Confronto tra Entrate stimate, # di recensioni e RPR Top 10 ASIN per Entrate stimate")
+            # GRAFICO RPR CONFRONTO ENTRATE STIMATE E NUMERO DI REVIEWS
+            def costruisci_fig7():
+                # Prendi i primi N ASIN per "Entrate stimate" in ordine decrescente
+                df_top_entrate = primi_n(df_cleaned, n_top, "Entrate stimate")
 
-    # Mostra il grafico
-    st.plotly_chart(fig7, use_container_width=True)
+                # Crea il grafico a barre per "Entrate stimate" e "# di recensioni"
+                fig7 = go.Figure()
 
+                fig7.add_trace(go.Bar(x=df_top_entrate["ASIN"], y=df_top_entrate["Entrate stimate"], name="Entrate stimate"))
+                fig7.add_trace(go.Bar(x=df_top_entrate["ASIN"], y=df_top_entrate["# di recensioni"], name="# di recensioni"))
 
-    st.subheader("_Conteggi_", divider ="orange")
+                # Aggiungi il grafico a linea per "RPR"
+                fig7.add_trace(go.Scatter(x=df_top_entrate["ASIN"], y=df_top_entrate["RPR"], mode="lines", name="RPR", yaxis="y2"))
 
+                # Imposta le etichette degli assi
+                fig7.update_layout(
+                    xaxis=dict(title="ASIN"),
+                    yaxis=dict(title="Valore", titlefont=dict(color="blue"), tickfont=dict(color="blue")),
+                    yaxis2=dict(title="RPR", titlefont=dict(color="red"), tickfont=dict(color="red"),
+                                overlaying="y", side="right"))
 
-    # Raggruppa i dati per la colonna "Varianti" e conta il numero di occorrenze
-    varianti_counts = df_cleaned['Varianti'].value_counts().reset_index()
-    varianti_counts.columns = ['Varianti', 'Count']
+                # Imposta il titolo del grafico
+                fig7.update_layout(title=f"Confronto tra Entrate stimate, # di recensioni e RPR Top {n_top} ASIN per Entrate stimate")
+                return fig7
 
-    # Crea il grafico a barre
-    fig8 = px.bar(varianti_counts, x='Varianti', y='Count', title='Conteggio delle Varianti')
-    fig8.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+            # Mostra il grafico
+            grafico_memorizzato("brand_recensioni", chiave_grafici, costruisci_fig7, use_container_width=True)
 
-    # Visualizza il grafico
-    st.plotly_chart(fig8, use_container_width=True)
+        sezione_recensioni()
 
-    # Raggruppa i dati per la colonna "Categoria" e conta il numero di occorrenze
-    categoria_counts = df_cleaned['Categoria'].value_counts().reset_index()
-    categoria_counts.columns = ['Categoria', 'Count']
 
-    # Crea il grafico a barre
-    fig9 = px.bar(categoria_counts, x='Categoria', y='Count', title='Conteggio delle Categorie')
-    fig9.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+    if sezione("_Conteggi_", "conteggi"):
+        @frammento("conteggi")
+        def sezione_conteggi():
+            import plotly.express as px
 
-    # Visualizza il grafico
-    st.plotly_chart(fig9, use_container_width=True)
+
+            def costruisci_fig8():
+                # Raggruppa i dati per la colonna "Varianti" e conta il numero di occorrenze
+                varianti_counts = memorizza("brand_conteggi_varianti", chiave_tabelle, conteggi, df_cleaned, 'Varianti')
+
+                # Crea il grafico a barre
+                fig8 = px.bar(varianti_counts, x='Varianti', y='Count', title='Conteggio delle Varianti')
+                fig8.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+                return fig8
+
+            # Visualizza il grafico (non dipende dal Top N)
+            grafico_memorizzato("brand_conteggi_varianti", chiave_tabelle, costruisci_fig8, use_container_width=True)
+
+            def costruisci_fig9():
+                # Raggruppa i dati per la colonna "Categoria" e conta il numero di occorrenze
+                categoria_counts = memorizza("brand_conteggi_categorie", chiave_tabelle, conteggi, df_cleaned, 'Categoria')
+
+                # Crea il grafico a barre
+                fig9 = px.bar(categoria_counts, x='Categoria', y='Count', title='Conteggio delle Categorie')
+                fig9.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+                return fig9
+
+            # Visualizza il grafico
+            grafico_memorizzato("brand_conteggi_categorie", chiave_tabelle, costruisci_fig9, use_container_width=True)
+
+        sezione_conteggi()
 
 #---------------------------------------------------------------------------------------------------------------------------------------------------------------------
 #---------------------------------------------------------------BLOCCO CODICE ANALISI CATEGORIA-----------------------------------------------------------------------
@@ -418,33 +628,21 @@ if analisi_type == "RISULTATO BRAND":
 
 elif analisi_type == "RISULTATO CATEGORIA":
     # Blocco di codice per l'analisi della categoria
-    # Rimuovi le colonne specifiche
-    columns_to_remove = ["Netto", "Commissioni FBA", "Margine netto", "LQS", "Peso"]
-    df_cleaned = df.drop(columns=columns_to_remove, axis=1)
-
-    # Formatta la colonna "Disponibile da" come data
-    df_cleaned["Disponibile da"] = pd.to_datetime(df_cleaned["Disponibile da"], errors="coerce").dt.strftime("%d/%m/%Y")
-
-    # Rimuovi i duplicati basati sulla colonna "ASIN"
-    df_cleaned = df_cleaned.drop_duplicates(subset=["ASIN"])
-
-    # Converte le celle vuote in "Vendite stimate" in 1 se "Entrate stimate" contiene un valore
-    mask = (df_cleaned["Vendite stimate"].isna()) & (df_cleaned["Entrate stimate"].notna())
-    df_cleaned.loc[mask, "Vendite stimate"] = 1
-
-    # Rimuovi le righe in cui entrambe le colonne sono vuote
-    df_cleaned = df_cleaned.dropna(subset=["Vendite stimate", "Entrate stimate"], how="all")
+    # Il DataFrame caricato è già pulito (vedi pulizia.pulisci_dati)
+    df_cleaned = df
 
     # Espandi il DataFrame pulito per la visualizzazione
     with st.expander("Anteprima dei dati puliti"):
-        st.dataframe(df_cleaned)
+        tabella_paginata(df_cleaned, "categoria_anteprima", impronta_file)
 
     
     #KPIS
     # KPIs
-    total_Revenue = df_cleaned["Entrate stimate"].sum()
-    total_Sales = df_cleaned["Vendite stimate"].sum()
-    asp = df_cleaned["Prezzo"].mean()
+    # Sull'intero dataset i risultati dipendono solo dal file caricato
+    indicatori = memorizza("categoria_kpi", impronta_file, kpi, df_cleaned)
+    total_Revenue = indicatori["Total Revenue"]
+    total_Sales = indicatori["Total Sales"]
+    asp = indicatori["Average Selling Price"]
 
     formatted_total_revenues = "{:,.2f}".format(total_Revenue).replace(",", "X").replace(".", ",").replace("X", ".")
     formatted_total_units = "{:,.2f}".format(total_Sales).replace(",", "X").replace(".", ",").replace("X", ".")
@@ -470,13 +668,13 @@ elif analisi_type == "RISULTATO CATEGORIA":
 
     #FULFILLMENT KPIS
 
-    fatturato_FBA = df_cleaned[df['Venditore'] == 'FBA']['Entrate stimate'].sum()
-    fatturato_MFN = df_cleaned[df['Venditore'] == 'MCH']['Entrate stimate'].sum()
-    fatturato_AMZ = df_cleaned[df['Venditore'] == 'AMZ']['Entrate stimate'].sum()
+    # Entrate, vendite e ASIN per Marca e gestione fulfillment in un solo raggruppamento, poi i totali per gestione
+    fulfillment_marca = memorizza("categoria_fulfillment", impronta_file, fulfillment_per_marca, df_cleaned)
+    ripartizione = ripartizione_fulfillment(fulfillment_marca)
 
-    incidenza_FBA = (fatturato_FBA / total_Revenue) * 100
-    incidenza_MFN = ( fatturato_MFN / total_Revenue) * 100
-    incidenza_AMZ = (fatturato_AMZ / total_Revenue) * 100
+    incidenza_FBA = ripartizione.loc["FBA", "Quota (%)"]
+    incidenza_MFN = ripartizione.loc["MCH/FBM", "Quota (%)"]
+    incidenza_AMZ = ripartizione.loc["AMZ", "Quota (%)"]
 
     col4, col5, col6 = st.columns(3)
 
@@ -495,13 +693,20 @@ elif analisi_type == "RISULTATO CATEGORIA":
         st.metric(
             label="AMZ",
             value="{:.2f} %".format(incidenza_AMZ))
+
+    # Codici Venditore diversi da FBA, MCH e AMZ: non rientrano nelle tre metriche, quindi si segnalano
+    altri_venditori = venditori_non_riconosciuti(ripartizione)
+    if len(altri_venditori):
+        st.warning("Fatturato con codici Venditore non riconosciuti: " + ", ".join(
+            "{} ({:.2f} %, {} ASIN)".format(codice, riga["Quota (%)"], int(riga["Conteggio ASIN"]))
+            for codice, riga in altri_venditori.iterrows()))
         
 
     colA, colB= st.columns(2)
 
     # Calcola il conteggio di ASIN e Marca
-    count_asin = df_cleaned["ASIN"].nunique()
-    count_brand = df_cleaned["Marca"].nunique()
+    count_asin = indicatori["Conteggio ASIN"]
+    count_brand = indicatori["Conteggio BRAND"]
 
     with colA:
         st.metric("Conteggio ASIN", count_asin, "ASIN")
@@ -511,289 +716,492 @@ elif analisi_type == "RISULTATO CATEGORIA":
         
 
 
-    st.subheader("_Visualizzazione TOP BRAND per Revenue e Unita'_", divider ="orange")
-    #GRAFICO DEI BRANDS
-    col7, col8 = st.columns(2)
+    # I grafici dipendono dal dataset e dal Top N (più gli eventuali widget della sezione):
+    # con la stessa chiave vengono serviti dalla cache delle figure senza ricostruirli
+    chiave_grafici = (impronta_file, n_top)
+
+    report_completo(df_cleaned, impronta_file)
+
+    # Le sezioni seguenti vengono calcolate solo se aperte
+    if sezione("_Visualizzazione TOP BRAND per Revenue e Unita'_", "top", aperta=True):
+        @frammento("top")
+        def sezione_top():
+            import plotly.express as px
+
+            #GRAFICO DEI BRANDS
+            col7, col8 = st.columns(2)
 
     
-    #GRAFICO 1
-    Brand_revenues = df_cleaned.groupby("Marca").sum().nlargest(10, "Entrate stimate")
+            #GRAFICO 1
+            # Somme per Marca lette dalle aggregazioni precalcolate
+            somme_marca = aggregati["Marca"]["sum"]
 
-    fig1 = px.bar(Brand_revenues,
-                x=Brand_revenues.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
-                y="Entrate stimate",
-                title="Top 10 Brands by Revenue")
+            def costruisci_fig1():
+                Brand_revenues = primi_n(somme_marca, n_top, "Entrate stimate")
 
-    with col7:
-        st.plotly_chart(fig1)
+                return px.bar(Brand_revenues,
+                            x=Brand_revenues.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
+                            y="Entrate stimate",
+                            title=f"Top {n_top} Brands by Revenue")
 
-    Brand_units = df_cleaned.groupby("Marca").sum().nlargest(10, "Vendite stimate")
+            with col7:
+                grafico_memorizzato("categoria_brand_revenues", chiave_grafici, costruisci_fig1)
 
-    fig2 = px.bar(Brand_units,
-                x=Brand_units.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
-                y="Vendite stimate",
-                title="Top 10 Brands by Units")
+            def costruisci_fig2():
+                Brand_units = primi_n(somme_marca, n_top, "Vendite stimate")
 
-    with col8:
-        st.plotly_chart(fig2)
+                return px.bar(Brand_units,
+                            x=Brand_units.index,  # Utilizza l'indice del DataFrame invece del nome della colonna
+                            y="Vendite stimate",
+                            title=f"Top {n_top} Brands by Units")
 
-    st.subheader("_Quote di mercato e Prezzo_", divider ="orange")
+            with col8:
+                grafico_memorizzato("categoria_brand_units", chiave_grafici, costruisci_fig2)
 
-    col9, col10 =st.columns(2)
+        sezione_top()
 
-   # Calcola le quote di mercato percentuali per i primi 10 ASIN
-    top_10_ASIN = df_cleaned.groupby("Marca")["Entrate stimate"].sum().nlargest(10)
-    ASIN_market_share_percentage = top_10_ASIN / top_10_ASIN.sum() * 100
+    if sezione("_Quote di mercato e Prezzo_", "quote"):
+        @frammento("quote")
+        def sezione_quote():
+            import plotly.express as px
+            import plotly.graph_objects as go
 
-    # Crea un DataFrame con le quote di mercato percentuali
-    market_share_df = pd.DataFrame({
-        "Marca": top_10_ASIN.index,
-        "Market Share (%)": ASIN_market_share_percentage.values})
-    
-    # Crea il grafico a torta per i primi 10 brand
-    fig_pie = px.pie(market_share_df,
-                 names="Marca",
-                 values="Market Share (%)",
-                 title="Quote di Mercato dei Top 10 Brand")
+            col9, col10 =st.columns(2)
 
-    with col9:
-        st.plotly_chart(fig_pie)
+           # Calcola le quote di mercato percentuali e il prezzo medio per i primi N brand (solo se i grafici non sono in cache)
+            def quote_marche():
+                return top_n(aggregati, "Marca", "Entrate stimate", n_top).reset_index()
 
+            # Crea il grafico a torta per i primi N brand
+            def costruisci_fig_pie():
+                market_share_df = quote_marche()
+                return px.pie(market_share_df,
+                             names="Marca",
+                             values="Market Share (%)",
+                             title=f"Quote di Mercato dei Top {n_top} Brand")
 
+            with col9:
+                grafico_memorizzato("categoria_quote_torta", chiave_grafici, costruisci_fig_pie)
 
-    # Crea il sottografo con due assi y
-    fig3 = go.Figure()
 
-    # Aggiungi il grafico a barre per le quote di mercato sull'asse y sinistra
-    fig3.add_trace(go.Bar(x=market_share_df["Marca"], y=market_share_df["Market Share (%)"], name="Quote di Mercato (%)"))
 
-    # Crea un secondo asse y per i valori in colonna "Prezzo"
-    fig3.update_layout(yaxis=dict(title="Quote di Mercato (%)", titlefont=dict(color="blue")),
-                    yaxis2=dict(title="Prezzo", titlefont=dict(color="red"), overlaying="y", side="right"))
-    fig3.add_trace(go.Scatter(x=market_share_df["Marca"], y=[df_cleaned[df_cleaned["Marca"] == asin]["Prezzo"].mean() for asin in top_10_ASIN.index],
-                         mode="lines+markers", name="Prezzo", yaxis="y2"))
+            def costruisci_fig3():
+                market_share_df = quote_marche()
 
-    # Imposta il titolo del grafico
-    fig3.update_layout(title="Quote di Mercato e Prezzo dei Top 10 Brand")
+                # Crea il sottografo con due assi y
+                fig3 = go.Figure()
 
-    # Imposta le etichette degli assi
-    fig3.update_xaxes(title_text="Brand")
+                # Aggiungi il grafico a barre per le quote di mercato sull'asse y sinistra
+                fig3.add_trace(go.Bar(x=market_share_df["Marca"], y=market_share_df["Market Share (%)"], name="Quote di Mercato (%)"))
 
-    with col10:
-        st.plotly_chart(fig3, use_container_width=True)
+                # Crea un secondo asse y per i valori in colonna "Prezzo"
+                fig3.update_layout(yaxis=dict(title="Quote di Mercato (%)", titlefont=dict(color="blue")),
+                                yaxis2=dict(title="Prezzo", titlefont=dict(color="red"), overlaying="y", side="right"))
+                fig3.add_trace(go.Scatter(x=market_share_df["Marca"], y=market_share_df["Prezzo medio"],
+                                     mode="lines+markers", name="Prezzo", yaxis="y2"))
 
+                # Imposta il titolo del grafico
+                fig3.update_layout(title=f"Quote di Mercato e Prezzo dei Top {n_top} Brand")
 
-    st.subheader("_Analisi Sales Rank / Vendite stimate_", divider ="orange")
+                # Imposta le etichette degli assi
+                fig3.update_xaxes(title_text="Brand")
+                return fig3
 
-    #GRAFICO RANKS
-    # Filtro per la colonna "Marca"
-    selected_brand = st.selectbox("Seleziona un Brand", df_cleaned["Marca"].unique())
-    col11, col12 = st.columns([1, 1])
+            with col10:
+                grafico_memorizzato("categoria_quote_prezzo", chiave_grafici, costruisci_fig3, use_container_width=True)
 
-    # Filtra il DataFrame in base alla Marca selezionata
-    filtered_df = df_cleaned[df_cleaned["Marca"] == selected_brand]
+        sezione_quote()
 
-    ASIN_ratings = filtered_df.groupby("ASIN").sum().nsmallest(10, "Piazzamento")
 
-    # Rimuovi le righe in cui "Piazzamento" è vuoto o uguale a zero
-    ASIN_ratings = ASIN_ratings.dropna(subset=["Piazzamento"])
-    ASIN_ratings = ASIN_ratings[ASIN_ratings["Piazzamento"] > 0]
+    if sezione("_Analisi Sales Rank / Vendite stimate_", "rank"):
+        @frammento("rank")
+        def sezione_rank():
+            import plotly.express as px
+            import plotly.graph_objects as go
 
-    # Ordina il DataFrame in modo crescente in base al "Piazzamento"
-    ASIN_ratings = ASIN_ratings.sort_values(by="Piazzamento")
+            #GRAFICO RANKS
+            # Filtro per la colonna "Marca"
+            selected_brand = st.selectbox("Seleziona un Brand", df_cleaned["Marca"].unique().tolist(),
+                                          on_change=segna_interazione, args=("selected_brand", "rank"))
+            col11, col12 = st.columns([1, 1])
 
-    fig4 = px.bar(
-        ASIN_ratings,
-        x="Piazzamento",
-        y=ASIN_ratings.index,
-        title="Top 10 ASIN by Sales Rank",
-        orientation="h")
+            # Righe della Marca selezionata (posizioni in df_cleaned, senza copiarne le colonne)
+            righe_brand = righe_marche(df_cleaned, [selected_brand])
 
-    fig4.update_traces(marker_color="lightblue", marker_line_width=1.5)
+            def costruisci_fig4():
+                somme_ASIN_brand = per_asin(aggregati, "sum", [selected_brand])
 
-    fig4.update_layout(
-        xaxis_title="Piazzamento",
-        yaxis_title="ASIN",
-        yaxis=dict(autorange="reversed"))
+                # Rimuovi le righe in cui "Piazzamento" è vuoto o uguale a zero, poi prendi gli N migliori (in ordine crescente)
+                ASIN_ratings = primi_n(somme_ASIN_brand[somme_ASIN_brand["Piazzamento"] > 0], n_top, "Piazzamento", crescente=True)
 
-    with col11:
-        st.plotly_chart(fig4)
+                fig4 = px.bar(
+                    ASIN_ratings,
+                    x="Piazzamento",
+                    y=ASIN_ratings.index,
+                    title=f"Top {n_top} ASIN by Sales Rank",
+                    orientation="h")
 
-    preview_table3 = filtered_df[["ASIN", "Nome prodotto", "Piazzamento", "Vendite stimate"]]
+                fig4.update_traces(marker_color="lightblue", marker_line_width=1.5)
 
-    with col12:
-        st.dataframe(preview_table3)
+                fig4.update_layout(
+                    xaxis_title="Piazzamento",
+                    yaxis_title="ASIN",
+                    yaxis=dict(autorange="reversed"))
+                return fig4
 
+            with col11:
+                # Oltre il limite di punti i Sales rank degli ASIN esclusi si riassumono con la media (una somma di rank non ha senso)
+                grafico_memorizzato("categoria_sales_rank", (chiave_grafici, selected_brand), costruisci_fig4, aggregazione="mean")
 
-    #GRAFICO CONFRONTO PIAZZAMENTO VENDITE E PREZZO
-    # Seleziona i primi 10 ASIN in base alle Vendite stimate
+            with col12:
+                tabella_paginata(df_cleaned, "categoria_sales_rank", (impronta_file, selected_brand),
+                                 colonne=["ASIN", "Nome prodotto", "Piazzamento", "Vendite stimate"], righe=righe_brand)
 
-    filtered_df = df_cleaned[df_cleaned["Marca"] == selected_brand]
 
-    # Seleziona i primi 10 ASIN in base alle Vendite stimate
-    top_10_ASIN = filtered_df.nlargest(10, 'Vendite stimate')
+            #GRAFICO CONFRONTO PIAZZAMENTO VENDITE E PREZZO
+            def costruisci_fig5():
+                # Seleziona i primi N ASIN della Marca in base alle Vendite stimate
+                top_ASIN = primi_n(df_cleaned, n_top, 'Vendite stimate', righe=righe_brand)
 
-    fig5 = go.Figure()
+                fig5 = go.Figure()
 
-    # Aggiungi le barre per Vendite stimate e Piazzamento sull'asse y sinistra
-    fig5.add_trace(go.Bar(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Vendite stimate'], name='Vendite stimate', yaxis='y', marker_color='blue'))
-    fig5.add_trace(go.Bar(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Piazzamento'], name='Piazzamento', yaxis='y', marker_color='lightblue'))
+                # Aggiungi le barre per Vendite stimate e Piazzamento sull'asse y sinistra
+                fig5.add_trace(go.Bar(x=top_ASIN['ASIN'], y=top_ASIN['Vendite stimate'], name='Vendite stimate', yaxis='y', marker_color='blue'))
+                fig5.add_trace(go.Bar(x=top_ASIN['ASIN'], y=top_ASIN['Piazzamento'], name='Piazzamento', yaxis='y', marker_color='lightblue'))
 
-    # Aggiungi il Prezzo come linea sull'asse y destra
-    fig5.add_trace(go.Scatter(x=top_10_ASIN['ASIN'], y=top_10_ASIN['Prezzo'], name='Prezzo', yaxis='y2', mode='lines+markers', line=dict(color='green')))
+                # Aggiungi il Prezzo come linea sull'asse y destra
+                fig5.add_trace(go.Scatter(x=top_ASIN['ASIN'], y=top_ASIN['Prezzo'], name='Prezzo', yaxis='y2', mode='lines+markers', line=dict(color='green')))
 
-    # Imposta i titoli degli assi e del grafico
-    fig5.update_layout(
-        title=f'Confronto tra Vendite stimate, Piazzamento e Prezzo per i primi 10 ASIN per {selected_brand}',
-        xaxis_title='ASIN',
-        yaxis_title='Vendite/Piazzamento',
-        yaxis2=dict(
-            title='Prezzo',
-            overlaying='y',
-            side='right'))
+                # Imposta i titoli degli assi e del grafico
+                fig5.update_layout(
+                    title=f'Confronto tra Vendite stimate, Piazzamento e Prezzo per i primi {n_top} ASIN per {selected_brand}',
+                    xaxis_title='ASIN',
+                    yaxis_title='Vendite/Piazzamento',
+                    yaxis2=dict(
+                        title='Prezzo',
+                        overlaying='y',
+                        side='right'))
+                return fig5
 
-    # Visualizza il grafico
-    st.plotly_chart(fig5, use_container_width=True)
+            # Visualizza il grafico
+            # Nella voce "Altri" le vendite si sommano, il Piazzamento (come il Prezzo) è la media
+            grafico_memorizzato("categoria_confronto_vendite", (chiave_grafici, selected_brand), costruisci_fig5,
+                                aggregazione={"Piazzamento": "mean"}, use_container_width=True)
 
+        sezione_rank()
 
 
-    st.subheader("_Analisi scostamento Sales rank da BSR 30_", divider ="orange")
 
-    # GRAFICO VARIAZIONE % PIAZZAMENTO E BSR 30
-    # Aggiungi un filtro multiplo per "Marca"
-    selected_brands = st.multiselect("Seleziona una o più Brands", df_cleaned["Marca"].unique(), default=df_cleaned["Marca"].unique())
-    col13, col14 = st.columns(2)
+    if sezione("_Analisi scostamento Sales rank da BSR 30_", "bsr"):
+        @frammento("bsr")
+        def sezione_bsr():
+            import plotly.express as px
 
-    # Crea un nuovo DataFrame con le colonne desiderate
-    df_variazione = df_cleaned[["ASIN", "Nome prodotto", "Piazzamento", "BSR 30", "Marca"]]
+            # GRAFICO VARIAZIONE % PIAZZAMENTO E BSR 30
+            # Aggiungi un filtro multiplo per "Marca"
+            selected_brands = st.multiselect("Seleziona una o più Brands", df_cleaned["Marca"].unique().tolist(), default=df_cleaned["Marca"].unique().tolist(),
+                                             on_change=segna_interazione, args=("selected_brands", "bsr"))
+            col13, col14 = st.columns(2)
 
-    # Filtra il DataFrame in base alle Marcas selezionate
-    df_variazione = df_variazione[df_variazione["Marca"].isin(selected_brands)]
+            # La percentuale di variazione tra "Piazzamento" e "BSR 30" si calcola una volta per dataset (ordinata per Piazzamento);
+            # il filtro sulle Marche selezionate sceglie le righe mantenendone l'ordine
+            df_variazione = memorizza("categoria_variazione", impronta_file, tabella_variazione, df_cleaned,
+                                      COLONNE_VARIAZIONE + ["Marca"], load_modello_bsr(impronta_file, df))
+            righe_variazione = righe_marche(df_variazione, selected_brands)
 
-    # Calcola la percentuale di variazione tra "Piazzamento" e "BSR 30"
-    df_variazione["Variazione %"] = ((df_variazione["Piazzamento"] - df_variazione["BSR 30"]) / df_variazione["BSR 30"]) * 100
+            with col14:
+                tabella_paginata(df_variazione, "categoria_variazione", (impronta_file, tuple(selected_brands)), ordina_per="Piazzamento",
+                                 righe=righe_variazione)
 
-    # Ordina il nuovo DataFrame in base alla variazione %
-    df_variazione = df_variazione.sort_values(by="Piazzamento")
+            # Aggiungi un filtro per il range di valori Variazione %
+            variazione_range = st.slider("Seleziona un range di Variazione %", min_value=-100, max_value=100, value=(-100, 100),
+                                         on_change=segna_interazione, args=("variazione_range", "bsr"))
 
-    with col14:
-        st.dataframe(df_variazione)
+            def costruisci_fig6_filtered():
+                # Righe delle Marche selezionate nel range scelto: si estraggono solo quelle da disegnare
+                valori_variazione = df_variazione["Variazione %"].to_numpy()[righe_variazione]
+                filtered_df_variazione = df_variazione.iloc[righe_variazione[(valori_variazione >= variazione_range[0]) & (valori_variazione <= variazione_range[1])]]
 
-    # Aggiungi un filtro per il range di valori Variazione %
-    variazione_range = st.slider("Seleziona un range di Variazione %", min_value=-100, max_value=100, value=(-100, 100))
+                # Crea il grafico a barre con i dati filtrati
+                fig6_filtered = px.bar(filtered_df_variazione, x="ASIN", y="Variazione %", title="Variazione % tra Piazzamento e BSR 30 per ASIN")
 
-    # Crea il DataFrame filtrato in base al range selezionato
-    filtered_df_variazione = df_variazione[(df_variazione["Variazione %"] >= variazione_range[0]) & (df_variazione["Variazione %"] <= variazione_range[1])]
+                # Imposta le etichette degli assi
+                fig6_filtered.update_xaxes(title_text="ASIN")
+                fig6_filtered.update_yaxes(title_text="Variazione %")
 
-    # Crea il grafico a barre con i dati filtrati
-    fig6_filtered = px.bar(filtered_df_variazione, x="ASIN", y="Variazione %", title="Variazione % tra Piazzamento e BSR 30 per ASIN")
+                # Colora le barre in base al valore di Variazione %
+                colors_filtered = ["green" if val < 0 else "red" for val in filtered_df_variazione["Variazione %"]]
+                fig6_filtered.update_traces(marker=dict(color=colors_filtered))
+                return fig6_filtered
 
-    # Imposta le etichette degli assi
-    fig6_filtered.update_xaxes(title_text="ASIN")
-    fig6_filtered.update_yaxes(title_text="Variazione %")
+            # Visualizza il grafico
+            with col13:
+                grafico_memorizzato("categoria_variazione", (impronta_file, tuple(selected_brands), variazione_range), costruisci_fig6_filtered,
+                                    aggregazione="mean")
 
-    # Colora le barre in base al valore di Variazione %
-    colors_filtered = ["green" if val < 0 else "red" for val in filtered_df_variazione["Variazione %"]]
-    fig6_filtered.update_traces(marker=dict(color=colors_filtered))
+        sezione_bsr()
 
-    # Visualizza il grafico
-    with col13:
-        st.plotly_chart(fig6_filtered)
 
 
 
+    if sezione("_Analisi Entrate stimate e Recensioni_", "recensioni"):
+        @frammento("recensioni")
+        def sezione_recensioni():
+            import plotly.graph_objects as go
 
-    st.subheader("_Analisi Entrate stimate e Recensioni_", divider ="orange")
 
+            # Aggiungi un filtro per "BRAND"
+            selected_brands2 = st.multiselect("Seleziona una o più Brand", df_cleaned["Marca"].unique().tolist(), default=df_cleaned["Marca"].unique().tolist(),
+                                              on_change=segna_interazione, args=("selected_brands2", "recensioni"))
 
-    # Aggiungi un filtro per "BRAND"
-    selected_brands2 = st.multiselect("Seleziona una o più Brand", df["Marca"].unique(), default=df["Marca"].unique())
+            col14, col15 = st.columns(2)
 
-    col14, col15 = st.columns(2)
+            # GRAFICO RPR CONFRONTO ENTRATE STIMATE E NUMERO DI REVIEWS
+            # Righe dei Brand selezionati (posizioni in df_cleaned, usate anche dalla tabella)
+            # e primi N ASIN tra quelle righe per "Entrate stimate" in ordine decrescente
+            righe_brands2 = righe_marche(df_cleaned, selected_brands2)
+            def costruisci_fig7():
+                df_top_entrate = primi_n(df_cleaned, n_top, "Entrate stimate", righe=righe_brands2)
 
-    # GRAFICO RPR CONFRONTO ENTRATE STIMATE E NUMERO DI REVIEWS
-    # Ordina il DataFrame per "Entrate stimate" in ordine decrescente e prendi i primi 10 ASIN
-    df = df.sort_values(by="Entrate stimate", ascending=False)
-    
+                # Crea il grafico a barre per "Entrate stimate" e "# di recensioni"
+                fig7 = go.Figure()
 
-    # Filtra il DataFrame in base ai Brand selezionati
-    df = df[df["Marca"].isin(selected_brands2)]
+                fig7.add_trace(go.Bar(x=df_top_entrate["ASIN"], y=df_top_entrate["Entrate stimate"], name="Entrate stimate"))
+                fig7.add_trace(go.Bar(x=df_top_entrate["ASIN"], y=df_top_entrate["# di recensioni"], name="# di recensioni"))
 
-    # Crea il grafico a barre per "Entrate stimate" e "# di recensioni"
-    fig7 = go.Figure()
+                # Aggiungi il grafico a linea per "RPR"
+                fig7.add_trace(go.Scatter(x=df_top_entrate["ASIN"], y=df_top_entrate["RPR"], mode="lines", name="RPR", yaxis="y2"))
 
-    fig7.add_trace(go.Bar(x=df["ASIN"], y=df["Entrate stimate"], name="Entrate stimate"))
-    fig7.add_trace(go.Bar(x=df["ASIN"], y=df["# di recensioni"], name="# di recensioni"))
+                # Imposta le etichette degli assi
+                fig7.update_layout(
+                    xaxis=dict(title="ASIN"),
+                    yaxis=dict(title="Valore", titlefont=dict(color="blue"), tickfont=dict(color="blue")),
+                    yaxis2=dict(title="RPR", titlefont=dict(color="red"), tickfont=dict(color="red"),
+                                overlaying="y", side="right"))
 
-    # Aggiungi il grafico a linea per "RPR"
-    fig7.add_trace(go.Scatter(x=df["ASIN"], y=df["RPR"], mode="lines", name="RPR", yaxis="y2"))
+                # Imposta il titolo del grafico
+                fig7.update_layout(title=f"Confronto tra Entrate stimate, # di recensioni e RPR Top {n_top} ASIN per Entrate stimate")
+                return fig7
 
-    # Imposta le etichette degli assi
-    fig7.update_layout(
-        xaxis=dict(title="ASIN"),
-        yaxis=dict(title="Valore", titlefont=dict(color="blue"), tickfont=dict(color="blue")),
-        yaxis2=dict(title="RPR", titlefont=dict(color="red"), tickfont=dict(color="red"),
-                    overlaying="y", side="right"))
+            # Mostra il grafico
+            with col14:
+                grafico_memorizzato("categoria_recensioni", (chiave_grafici, tuple(selected_brands2)), costruisci_fig7, use_container_width=True)
 
-    # Imposta il titolo del grafico
-    fig7.update_layout(title="Confronto tra Entrate stimate, # di recensioni e RPR Top 10 ASIN per Entrate stimate")
+            # La tabella paginata mostra le righe dei Brand selezionati e le ordina in base alle Entrate stimate
+            with col15:
+                tabella_paginata(df_cleaned, "categoria_rpr", (impronta_file, tuple(selected_brands2)), ordina_per="Entrate stimate",
+                                 colonne=COLONNE_RECENSIONI, righe=righe_brands2)
 
-    # Mostra il grafico
-    with col14:
-        st.plotly_chart(fig7, use_container_width=True)
+        sezione_recensioni()
 
-    df_tab = df_cleaned[["ASIN", "Nome prodotto", "Entrate stimate", "# di recensioni", "RPR"]]
 
-    # Filtra il DataFrame in base alle Marcas selezionate
-    df_tab = df_tab[df_cleaned["Marca"].isin(selected_brands2)]
+    if sezione("_Distribuzione fatturato tra le gestioni fulfillment_", "fulfillment"):
+        @frammento("fulfillment")
+        def sezione_fulfillment():
+            import plotly.express as px
 
+            def costruisci_fig8():
+                top_brands = primi_n(aggregati["Marca"]["sum"], n_top, "Entrate stimate")["Entrate stimate"]
 
-    # Ordina il nuovo DataFrame in base alla variazione %
-    df_tab = df_tab.sort_values(by="Entrate stimate")
+                # Fatturato per Marca e gestione fulfillment dei primi N brand, dalla stessa ripartizione delle metriche in alto
+                filtered_df = fulfillment_marca[fulfillment_marca.index.get_level_values("Marca").isin(top_brands.index)].reset_index()
 
-    with col15:
-        st.dataframe(df_tab)
+                # Definisci un set personalizzato di colori per le colonne
+                color_discrete_map = {
+                    "FBA": "blue",  # Cambia i colori a tuo piacimento
+                    "MCH/FBM": "lightgreen",
+                    "AMZ": "orange"}
 
+                # Crea un grafico a barre raggruppato con il set di colori personalizzato
+                fig8 = px.bar(filtered_df, x="Marca", y="Entrate stimate", color="Venditore", title=f"Fatturato per FBA, MCH/FBM e AMZ dei Top {n_top} Brand",
+                            barmode="group", color_discrete_map=color_discrete_map)
+                return fig8
 
-    st.subheader("_Distribuzione fatturato tra le gestioni fulfillment_", divider ="orange")
+            # Visualizza il grafico con larghezza adattabile
+            grafico_memorizzato("categoria_fulfillment", chiave_grafici, costruisci_fig8, use_container_width=True)
 
-    top_10_brands = df_cleaned.groupby("Marca")["Entrate stimate"].sum().nlargest(10)
-    filtered_df = df_cleaned[df_cleaned["Marca"].isin(top_10_brands.index)]
+        sezione_fulfillment()
 
-    # Definisci un set personalizzato di colori per le colonne
-    color_discrete_map = {
-        "FBA": "blue",  # Cambia i colori a tuo piacimento
-        "MCH/FBM": "lightgreen",
-        "AMZ": "orange"}
 
-    # Crea un grafico a barre raggruppato con il set di colori personalizzato
-    fig8 = px.bar(filtered_df, x="Marca", y="Entrate stimate", color="Venditore", title="Fatturato per FBA, MCH/FBM e AMZ dei Top 10 Brand",
-                barmode="group", color_discrete_map=color_discrete_map)
+    if sezione("_Conteggi_", "conteggi"):
+        @frammento("conteggi")
+        def sezione_conteggi():
+            import plotly.express as px
 
-    # Visualizza il grafico con larghezza adattabile
-    st.plotly_chart(fig8, use_container_width=True)
+            # Raggruppa i dati per la colonna "Varianti" e conta il numero di occorrenze
+            def costruisci_fig9():
+                varianti_counts = memorizza("categoria_conteggi_varianti", impronta_file, conteggi, df_cleaned, 'Varianti')
 
+                # Crea il grafico a barre
+                fig9 = px.bar(varianti_counts, x='Varianti', y='Count', title='Conteggio delle Varianti')
+                fig9.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+                return fig9
 
-    st.subheader("_Conteggi_", divider ="orange")
+            # Visualizza il grafico (non dipende dal Top N)
+            grafico_memorizzato("categoria_conteggi_varianti", impronta_file, costruisci_fig9, use_container_width=True)
 
-    # Raggruppa i dati per la colonna "Varianti" e conta il numero di occorrenze
-    varianti_counts = df_cleaned['Varianti'].value_counts().reset_index()
-    varianti_counts.columns = ['Varianti', 'Count']
+            # Raggruppa i dati per la colonna "Categoria" e conta il numero di occorrenze
+            def costruisci_fig10():
+                categoria_counts = memorizza("categoria_conteggi_categorie", impronta_file, conteggi, df_cleaned, 'Categoria')
 
-    # Crea il grafico a barre
-    fig9 = px.bar(varianti_counts, x='Varianti', y='Count', title='Conteggio delle Varianti')
-    fig9.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+                # Crea il grafico a barre
+                fig10 = px.bar(categoria_counts, x='Categoria', y='Count', title='Conteggio delle Categorie')
+                fig10.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+                return fig10
 
-    # Visualizza il grafico
-    st.plotly_chart(fig9, use_container_width=True)
+            # Visualizza il grafico
+            grafico_memorizzato("categoria_conteggi_categorie", impronta_file, costruisci_fig10, use_container_width=True)
 
-    # Raggruppa i dati per la colonna "Categoria" e conta il numero di occorrenze
-    categoria_counts = df_cleaned['Categoria'].value_counts().reset_index()
-    categoria_counts.columns = ['Categoria', 'Count']
+        sezione_conteggi()
 
-    # Crea il grafico a barre
-    fig10 = px.bar(categoria_counts, x='Categoria', y='Count', title='Conteggio delle Categorie')
-    fig10.update_xaxes(categoryorder='total ascending')  # Ordina le etichette x in ordine crescente
+elif analisi_type == "CONFRONTO":
+    # L'export caricato sopra è quello attuale; qui si carica quello con cui confrontarlo (es. il mese precedente)
+    file_precedente = st.sidebar.file_uploader("Export precedente da confrontare", type=["xlsx", "xlsm", "csv", "parquet"],
+                                               key="export_precedente")
 
-    # Visualizza il grafico
-    st.plotly_chart(fig10, use_container_width=True)
+    if file_precedente is None:
+        rilascia_dataset("_dataset_precedente")
+        st.info("Carica tramite il menu laterale l'export precedente da confrontare con quello attuale")
+    else:
+        with profilazione.fase("confronto", "calcolo"):
+            impronta_precedente = impronta_upload(file_precedente)
+            df_precedente, _ = load_data("_dataset_precedente", impronta_precedente, file_precedente)
+            differenze, marche_confronto, riepilogo = load_confronto(impronta_precedente, impronta_file, df_precedente, df)
+        chiave_confronto = (impronta_precedente, impronta_file)
+
+        # Tabelle mostrate con ASIN e Marca come colonne, copiate una volta per confronto:
+        # le tabelle delle sezioni ne mostrano le righe di alcuni stati attraverso le posizioni, senza copiarle a ogni rerun
+        def tabelle_confronto():
+            return (memorizza("confronto_tabella_asin", chiave_confronto, pd.DataFrame.reset_index, differenze),
+                    memorizza("confronto_tabella_marche", chiave_confronto, pd.DataFrame.reset_index, marche_confronto))
+
+        def righe_asin(stati):
+            return memorizza("confronto_righe_asin", chiave_confronto + (tuple(stati),), righe_con_stato, differenze, stati)
+
+        def righe_marche(stati):
+            return memorizza("confronto_righe_marche", chiave_confronto + (tuple(stati),), righe_con_stato,
+                             marche_confronto, stati)
+
+        def formatta_numero(valore):
+            return "{:,.2f}".format(valore).replace(",", "X").replace(".", ",").replace("X", ".")
+
+        # KPIs dell'export attuale con la differenza rispetto al precedente
+        col1, col2, col3 = st.columns(3)
+        for colonna, (nome, unita) in zip([col1, col2, col3], [("Total Revenue", " €"), ("Total Sales", ""),
+                                                              ("Average Selling Price", " €")]):
+            prima, dopo = riepilogo[nome]
+            with colonna:
+                st.metric(label=nome, value=f"{formatta_numero(dopo)}{unita}", delta=f"{formatta_numero(dopo - prima)}{unita}")
+
+        col4, col5, col6, col7 = st.columns(4)
+        with col4:
+            prima, dopo = riepilogo["Conteggio ASIN"]
+            st.metric("Conteggio ASIN", dopo, int(dopo - prima))
+        with col5:
+            prima, dopo = riepilogo["Conteggio BRAND"]
+            st.metric("Conteggio BRAND", dopo, int(dopo - prima))
+        with col6:
+            st.metric("ASIN entrati / usciti", f"{riepilogo['ASIN entrati']} / {riepilogo['ASIN usciti']}")
+        with col7:
+            st.metric("BRAND entrati / usciti", f"{riepilogo['BRAND entrati']} / {riepilogo['BRAND usciti']}")
+
+        misure_confronto = COLONNE_CONFRONTO + [COLONNA_QUOTA]
+
+        if sezione("_Variazioni per ASIN_", "confronto_asin", aperta=True):
+            @frammento("confronto_asin")
+            def sezione_confronto_asin():
+                import plotly.express as px
+
+                misura = st.selectbox("Misura", misure_confronto, key="confronto_misura_asin",
+                                      on_change=segna_interazione, args=("confronto_misura_asin", "confronto_asin"))
+                delta = PREFISSO_DELTA + misura
+
+                # Variazioni più grandi in aumento e in diminuzione, senza ordinare tutte le righe
+                col8, col9 = st.columns(2)
+                def costruisci_fig1():
+                    aumenti = primi_n(differenze, n_top, delta)
+                    return px.bar(aumenti, x=aumenti.index, y=delta, color="Stato",
+                                  title=f"Top {n_top} ASIN per aumento di {misura}")
+
+                def costruisci_fig2():
+                    diminuzioni = primi_n(differenze, n_top, delta, crescente=True)
+                    return px.bar(diminuzioni, x=diminuzioni.index, y=delta, color="Stato",
+                                  title=f"Top {n_top} ASIN per diminuzione di {misura}")
+
+                with col8:
+                    grafico_memorizzato("confronto_asin_aumenti", (chiave_confronto, n_top, misura), costruisci_fig1, use_container_width=True)
+                with col9:
+                    grafico_memorizzato("confronto_asin_diminuzioni", (chiave_confronto, n_top, misura), costruisci_fig2, use_container_width=True)
+
+                # Tabella di tutte le righe del confronto, filtrabile per stato
+                stati = st.multiselect("Stato degli ASIN", [ENTRATO, USCITO, PRESENTE], default=[ENTRATO, USCITO, PRESENTE],
+                                       key="confronto_stati", on_change=segna_interazione,
+                                       args=("confronto_stati", "confronto_asin"))
+                tabella_asin, _ = tabelle_confronto()
+                colonne = ["ASIN", "Marca", "Stato", misura + SUFFISSO_PRIMA, misura + SUFFISSO_DOPO, delta]
+                tabella_paginata(tabella_asin, "confronto_asin", chiave_confronto + (tuple(stati), misura),
+                                 ordina_per=delta, crescente=False, colonne=colonne, righe=righe_asin(stati))
+
+            sezione_confronto_asin()
+
+
+        if sezione("_Variazioni per BRAND_", "confronto_marche"):
+            @frammento("confronto_marche")
+            def sezione_confronto_marche():
+                import plotly.express as px
+
+                # Per Marca si confrontano solo i totali: entrate, vendite e quota di mercato
+                opzioni = [nome for nome in misure_confronto if PREFISSO_DELTA + nome in marche_confronto.columns]
+                misura = st.selectbox("Misura", opzioni, index=opzioni.index(COLONNA_QUOTA), key="confronto_misura_marche",
+                                      on_change=segna_interazione, args=("confronto_misura_marche", "confronto_marche"))
+                delta = PREFISSO_DELTA + misura
+
+                col10, col11 = st.columns(2)
+                def costruisci_fig3():
+                    aumenti = primi_n(marche_confronto, n_top, delta)
+                    return px.bar(aumenti, x=aumenti.index, y=delta, title=f"Top {n_top} Brand per aumento di {misura}")
+
+                def costruisci_fig4():
+                    diminuzioni = primi_n(marche_confronto, n_top, delta, crescente=True)
+                    return px.bar(diminuzioni, x=diminuzioni.index, y=delta, title=f"Top {n_top} Brand per diminuzione di {misura}")
+
+                with col10:
+                    grafico_memorizzato("confronto_marche_aumenti", (chiave_confronto, n_top, misura), costruisci_fig3, use_container_width=True)
+                with col11:
+                    grafico_memorizzato("confronto_marche_diminuzioni", (chiave_confronto, n_top, misura), costruisci_fig4, use_container_width=True)
+
+                _, tabella_marche = tabelle_confronto()
+                tabella_paginata(tabella_marche, "confronto_marche", chiave_confronto, ordina_per=delta, crescente=False)
+
+            sezione_confronto_marche()
+
+
+        if sezione("_ASIN e BRAND entrati e usciti_", "confronto_entrati"):
+            @frammento("confronto_entrati")
+            def sezione_confronto_entrati():
+                tabella_asin, tabella_marche = tabelle_confronto()
+                colonne = ["ASIN", "Marca", "Entrate stimate" + SUFFISSO_PRIMA, "Entrate stimate" + SUFFISSO_DOPO]
+                col12, col13 = st.columns(2)
+                with col12:
+                    st.markdown(f"**ASIN entrati** ({riepilogo['ASIN entrati']})")
+                    tabella_paginata(tabella_asin, "asin_entrati", chiave_confronto, ordina_per="Entrate stimate" + SUFFISSO_DOPO,
+                                     crescente=False, colonne=colonne, righe=righe_asin([ENTRATO]))
+                    st.markdown(f"**BRAND entrati** ({riepilogo['BRAND entrati']})")
+                    tabella_paginata(tabella_marche, "marche_entrate", chiave_confronto, ordina_per="Entrate stimate" + SUFFISSO_DOPO,
+                                     crescente=False, colonne=["Marca", "ASIN dopo", "Entrate stimate" + SUFFISSO_DOPO],
+                                     righe=righe_marche([ENTRATO]))
+                with col13:
+                    st.markdown(f"**ASIN usciti** ({riepilogo['ASIN usciti']})")
+                    tabella_paginata(tabella_asin, "asin_usciti", chiave_confronto, ordina_per="Entrate stimate" + SUFFISSO_PRIMA,
+                                     crescente=False, colonne=colonne, righe=righe_asin([USCITO]))
+                    st.markdown(f"**BRAND usciti** ({riepilogo['BRAND usciti']})")
+                    tabella_paginata(tabella_marche, "marche_uscite", chiave_confronto, ordina_per="Entrate stimate" + SUFFISSO_PRIMA,
+                                     crescente=False, colonne=["Marca", "ASIN prima", "Entrate stimate" + SUFFISSO_PRIMA],
+                                     righe=righe_marche([USCITO]))
+
+            sezione_confronto_entrati()
+
+# Tempo di risposta delle interazioni che hanno rieseguito tutto lo script (widget nella barra laterale,
+# oppure tutti i widget se la versione di Streamlit non supporta i frammenti)
+registra_interazione()
+pannello_profilazione()
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from aggregati import per_asin, primi_n, top_n
+
+# Calcoli dell'analisi a 30 giorni senza dipendenze da Streamlit:
+# li usano sia la dashboard (amzscout30gg.py) sia i report generati in batch (report.py)
+
+COLONNE_VARIAZIONE = ["ASIN", "Nome prodotto", "Piazzamento", "BSR 30"]
+COLONNE_RECENSIONI = ["ASIN", "Nome prodotto", "Entrate stimate", "# di recensioni", "RPR"]
+COLONNA_VARIAZIONE_UNITA = "Variazione unità stimate"
+
+# Codici della colonna Venditore e gestione fulfillment corrispondente (etichetta mostrata nelle metriche e nei grafici).
+# Gli altri codici restano con il proprio nome e vengono segnalati, le righe senza Venditore con VENDITORE_MANCANTE
+GESTIONI_FULFILLMENT = {"FBA": "FBA", "MCH": "MCH/FBM", "AMZ": "AMZ"}
+VENDITORE_MANCANTE = "(non indicato)"
+
+
+# Totali e conteggi mostrati nelle metriche in cima all'analisi
+def kpi(df_cleaned):
+    return {
+        "Total Revenue": df_cleaned["Entrate stimate"].sum(),
+        "Total Sales": df_cleaned["Vendite stimate"].sum(),
+        "Average Selling Price": df_cleaned["Prezzo"].mean(),
+        "Conteggio ASIN": df_cleaned["ASIN"].nunique(),
+        "Conteggio BRAND": df_cleaned["Marca"].nunique(),
+    }
+
+
+# Entrate, vendite e numero di ASIN per Marca e gestione fulfillment, con un solo raggruppamento sulle righe pulite.
+# Dopo la pulizia ogni ASIN compare una volta, quindi il conteggio delle righe è il numero di ASIN
+def fulfillment_per_marca(df_cleaned):
+    tabella = df_cleaned.groupby(["Marca", "Venditore"], dropna=False, observed=True).agg(**{
+        "Entrate stimate": ("Entrate stimate", "sum"),
+        "Vendite stimate": ("Vendite stimate", "sum"),
+        "Conteggio ASIN": ("ASIN", "count"),
+    }).reset_index()
+    venditore = tabella["Venditore"].astype(object)
+    tabella["Venditore"] = venditore.map(GESTIONI_FULFILLMENT).fillna(venditore).fillna(VENDITORE_MANCANTE)
+    return tabella.set_index(["Marca", "Venditore"])
+
+
+# Totali per gestione fulfillment (FBA, MCH/FBM, AMZ sempre presenti, poi gli eventuali codici non riconosciuti)
+# con la quota sul fatturato totale
+def ripartizione_fulfillment(per_marca):
+    totali = per_marca.groupby(level="Venditore").sum()
+    ordine = list(GESTIONI_FULFILLMENT.values()) + sorted(set(totali.index) - set(GESTIONI_FULFILLMENT.values()))
+    totali = totali.reindex(ordine, fill_value=0)
+    totali["Quota (%)"] = totali["Entrate stimate"] / totali["Entrate stimate"].sum() * 100
+    return totali
+
+
+# Righe della ripartizione con codici Venditore diversi da FBA, MCH e AMZ (o senza Venditore)
+def venditori_non_riconosciuti(ripartizione):
+    altri = ripartizione.drop(index=list(GESTIONI_FULFILLMENT.values()))
+    return altri[altri["Conteggio ASIN"] > 0]
+
+
+# Posizioni delle righe delle marche indicate, nell'ordine del DataFrame: i filtri sulle marche delle sezioni
+# scelgono le righe del dataset senza copiarne le colonne
+def righe_marche(df_cleaned, marche):
+    return np.flatnonzero(df_cleaned["Marca"].isin(marche).to_numpy())
+
+
+# Colonna limitata alle righe indicate (posizioni, tutte se None)
+def _colonna(df_cleaned, colonna, righe):
+    return df_cleaned[colonna] if righe is None else df_cleaned[colonna].take(righe)
+
+
+# Variazione % tra il Sales rank attuale (Piazzamento) e il BSR medio a 30 giorni, per ASIN, in ordine di Piazzamento.
+# Con il modello rank -> vendite (modello_bsr) si aggiunge la variazione corrispondente in unità vendute.
+# Le variazioni si calcolano prima di creare la tabella (i temporanei del modello non si sommano alla tabella),
+# poi si ordina la sola colonna Piazzamento e si estraggono una volta le colonne richieste nelle righe indicate
+# (posizioni, tutte se None). La dashboard la calcola una volta per dataset e filtra le marche con righe_marche,
+# che mantiene l'ordine
+def tabella_variazione(df_cleaned, colonne=COLONNE_VARIAZIONE, modello=None, righe=None):
+    righe = None if righe is None else np.asarray(righe)
+    piazzamento = _colonna(df_cleaned, "Piazzamento", righe)
+    bsr = _colonna(df_cleaned, "BSR 30", righe)
+    derivate = {"Variazione %": ((piazzamento - bsr) / bsr * 100).to_numpy()}
+    if modello is not None:
+        derivate[COLONNA_VARIAZIONE_UNITA] = np.asarray(modello.variazione_unita(
+            _colonna(df_cleaned, "Categoria", righe), piazzamento, bsr))
+
+    ordine = piazzamento.reset_index(drop=True).sort_values(kind="stable", na_position="last").index.to_numpy()
+    posizioni = ordine if righe is None else righe[ordine]
+    tabella = pd.DataFrame({colonna: df_cleaned[colonna].take(posizioni) for colonna in colonne}, copy=False)
+    for colonna, valori in derivate.items():
+        tabella[colonna] = valori[ordine]
+    return tabella
+
+
+def variazione_bsr(df_cleaned, marche=None, colonne=COLONNE_VARIAZIONE, modello=None):
+    righe = None if marche is None else righe_marche(df_cleaned, marche)
+    return tabella_variazione(df_cleaned, colonne, modello, righe)
+
+
+# Entrate stimate, recensioni e RPR di tutti gli ASIN nelle righe indicate (posizioni, tutte se None),
+# in ordine crescente di Entrate stimate come la tabella della dashboard.
+# Come per tabella_variazione si ordina la sola colonna e si estraggono una volta le colonne richieste
+def tabella_recensioni(df_cleaned, righe=None):
+    entrate = _colonna(df_cleaned, "Entrate stimate", righe)
+    ordine = entrate.reset_index(drop=True).sort_values(kind="stable", na_position="last").index.to_numpy()
+    posizioni = ordine if righe is None else np.asarray(righe)[ordine]
+    return pd.DataFrame({colonna: df_cleaned[colonna].take(posizioni) for colonna in COLONNE_RECENSIONI}, copy=False)
+
+
+# Numero di righe per valore della colonna (es. Varianti, Categoria).
+# Le colonne categoriche riportano anche i valori assenti nei dati filtrati: si tengono solo quelli presenti
+def conteggi(df_cleaned, colonna):
+    risultato = df_cleaned[colonna].value_counts().loc[lambda conteggi: conteggi > 0].reset_index()
+    risultato.columns = [colonna, "Count"]
+    return risultato
+
+
+# Tabelle di ciascuna sezione di un'analisi, come nella dashboard: per ASIN se sono indicate le marche
+# (RISULTATO BRAND), per Marca sull'intero dataset altrimenti (RISULTATO CATEGORIA).
+# df_cleaned deve essere già filtrato sulle marche indicate
+def _sezione_fulfillment(df_cleaned, aggregati, n_top, marche, modello):
+    per_marca = fulfillment_per_marca(df_cleaned)
+    tabelle = {"Ripartizione fulfillment": ripartizione_fulfillment(per_marca)}
+    if marche is None:
+        primi_brand = primi_n(aggregati["Marca"]["sum"], n_top, "Entrate stimate").index
+        tabelle["Fatturato per fulfillment dei Top Brand"] = per_marca[
+            per_marca.index.get_level_values("Marca").isin(primi_brand)]
+    return tabelle
+
+
+def _sezione_top(df_cleaned, aggregati, n_top, marche, modello):
+    if marche is not None:
+        somme = per_asin(aggregati, "sum", marche)
+        return {"Top ASIN by Revenue": primi_n(somme, n_top, "Entrate stimate")[["Entrate stimate"]],
+                "Top ASIN by Units": primi_n(somme, n_top, "Vendite stimate")[["Vendite stimate"]]}
+    somme = aggregati["Marca"]["sum"]
+    return {"Top Brands by Revenue": primi_n(somme, n_top, "Entrate stimate")[["Entrate stimate"]],
+            "Top Brands by Units": primi_n(somme, n_top, "Vendite stimate")[["Vendite stimate"]]}
+
+
+def _sezione_quote(df_cleaned, aggregati, n_top, marche, modello):
+    if marche is not None:
+        return {"Quote di mercato": top_n(aggregati, "ASIN", "Entrate stimate", n_top, marche)}
+    return {"Quote di mercato": top_n(aggregati, "Marca", "Entrate stimate", n_top)}
+
+
+def _sezione_rank(df_cleaned, aggregati, n_top, marche, modello):
+    if marche is None:
+        return {}
+    somme = per_asin(aggregati, "sum", marche)
+    return {"Top ASIN by Sales Rank": primi_n(somme[somme["Piazzamento"] > 0], n_top, "Piazzamento",
+                                              crescente=True)[["Piazzamento"]]}
+
+
+def _sezione_bsr(df_cleaned, aggregati, n_top, marche, modello):
+    colonne = COLONNE_VARIAZIONE if marche is not None else COLONNE_VARIAZIONE + ["Marca"]
+    return {"Variazione BSR 30": variazione_bsr(df_cleaned, colonne=colonne, modello=modello)}
+
+
+def _sezione_recensioni(df_cleaned, aggregati, n_top, marche, modello):
+    return {"Entrate stimate e Recensioni": primi_n(df_cleaned, n_top, "Entrate stimate")[COLONNE_RECENSIONI]}
+
+
+def _sezione_conteggi(df_cleaned, aggregati, n_top, marche, modello):
+    return {"Conteggio delle Varianti": conteggi(df_cleaned, "Varianti"),
+            "Conteggio delle Categorie": conteggi(df_cleaned, "Categoria")}
+
+
+# Sezioni nell'ordine della dashboard: ciascuna si può calcolare (e misurare) da sola
+SEZIONI_ANALISI = {
+    "fulfillment": _sezione_fulfillment,
+    "top": _sezione_top,
+    "quote": _sezione_quote,
+    "rank": _sezione_rank,
+    "bsr": _sezione_bsr,
+    "recensioni": _sezione_recensioni,
+    "conteggi": _sezione_conteggi,
+}
+
+
+# Tutte le tabelle di un'analisi
+def tabelle_analisi(df_cleaned, aggregati, n_top, marche=None, modello=None):
+    tabelle = {}
+    for calcolo in SEZIONI_ANALISI.values():
+        tabelle.update(calcolo(df_cleaned, aggregati, n_top, marche, modello))
+    return tabelle
@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import cache_disco
+import profilazione
+from aggregati import costruisci_aggregati, primi_n
+from analisi import SEZIONI_ANALISI
+from confronto import confronta, confronta_marche, riepilogo_confronto
+from ingestione import leggi_export
+from modello_bsr import costruisci_modello
+from pulizia import pulisci_dati, compatta_dati
+from rendering import limita_figura
+from report import figura
+from ricerca import IndiceRicerca
+
+# Benchmark senza interfaccia su export sintetici con le stesse colonne degli export AMZScout:
+# lettura per formato, pulizia, cache su disco, aggregazioni, ogni sezione dell'analisi (CATEGORIA e BRAND)
+# e costruzione e serializzazione dei grafici, con tempi, picchi di memoria e byte inviati al browser.
+# I risultati si confrontano con una baseline salvata: se una misura peggiora oltre la tolleranza
+# il benchmark elenca le regressioni ed esce con codice 1.
+# Uso:
+#   python benchmark.py [--dimensioni 1k 100k 1M] [--formati xlsx csv parquet] [--ripetizioni 3]
+#   python benchmark.py --aggiorna-baseline      salva i risultati come nuova baseline
+#   python benchmark.py --dimensioni              solo il controllo del tempo di avvio
+
+DIMENSIONI = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+FORMATI = ["xlsx", "csv", "parquet"]
+
+# Oltre questa dimensione l'export Excel non viene generato: scriverlo con openpyxl richiede troppo tempo
+MASSIMO_RIGHE_EXCEL = 200_000
+
+# Da incrementare quando cambia il generatore: i file generati con la versione precedente vengono ricreati
+VERSIONE_GENERATORE = 1
+
+CARTELLA_BENCHMARK = os.environ.get("AMZSCOUT_BENCHMARK_DIR", os.path.join(tempfile.gettempdir(), "amzscout_benchmark"))
+BASELINE = os.environ.get("AMZSCOUT_BENCHMARK_BASELINE",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"))
+
+# Peggioramento tollerato rispetto alla baseline (rapporto) e differenza minima perché conti come regressione:
+# sotto la differenza minima la variazione è rumore di misura
+TOLLERANZE = {
+    "secondi": (1.5, 0.05),
+    "picco_mb": (1.25, 2.0),
+    "byte": (1.1, 1024),
+}
+
+N_TOP = 10
+
+# Avvio a freddo della dashboard: gli import in cima ad amzscout30gg.py devono stare entro il budget
+# e non devono caricare i moduli elencati (installazione di pacchetti, librerie usate solo dalle sezioni)
+SCRIPT_DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "amzscout30gg.py")
+BUDGET_AVVIO_SECONDI = float(os.environ.get("AMZSCOUT_BUDGET_AVVIO", "2.0"))
+MODULI_VIETATI_ALL_AVVIO = ["pip", "requests", "plotly.express", "plotly.subplots"]
+
+CATEGORIE = ["Casa e cucina", "Giardino e giardinaggio", "Sport e tempo libero", "Fai da te", "Giochi e giocattoli",
+             "Salute e cura della persona", "Bellezza", "Elettronica", "Prima infanzia", "Prodotti per animali domestici",
+             "Auto e Moto", "Cancelleria e prodotti per ufficio"]
+
+
+# Export sintetico con le colonne dell'export AMZScout (anche quelle che la dashboard non legge).
+# Le marche seguono una distribuzione di Zipf (poche marche con molti ASIN, una lunga coda con pochi),
+# le vendite stimate decrescono con il Sales rank come nelle curve reali e il BSR 30 oscilla attorno al Piazzamento
+def genera_export(righe, seme=0):
+    rng = np.random.default_rng(seme)
+    numero_marche = max(20, righe // 25)
+    pesi_marche = 1 / np.arange(1, numero_marche + 1) ** 1.1
+    marche = rng.choice(numero_marche, righe, p=pesi_marche / pesi_marche.sum())
+    pesi_categorie = 1 / np.arange(1, len(CATEGORIE) + 1)
+    categorie = rng.choice(len(CATEGORIE), righe, p=pesi_categorie / pesi_categorie.sum())
+
+    piazzamento = np.floor(np.exp(rng.uniform(0, np.log(800_000), righe))) + 1
+    bsr_30 = np.maximum(1, np.round(piazzamento * rng.lognormal(0, 0.35, righe)))
+    vendite = np.round(25_000 * piazzamento ** -0.8 * rng.lognormal(0, 0.3, righe) * (1 + categorie / 6)) + 1
+    vendite[rng.random(righe) < 0.05] = np.nan
+    prezzo = np.round(rng.lognormal(np.log(25), 0.7, righe), 2)
+    recensioni = rng.geometric(0.002, righe) - 1
+
+    venditore = rng.choice(np.array(["FBA", "MCH", "AMZ", "FBM", None], dtype=object), righe,
+                           p=[0.6, 0.25, 0.13, 0.01, 0.01])
+    # Circa l'1% degli ASIN compare due volte, come negli export che ripetono le varianti
+    asin = rng.integers(0, 16 ** 8, righe)
+    asin[rng.random(righe) < 0.01] = asin[0]
+    codici_marca = np.array([f"Marca {i:05d}" for i in range(numero_marche)], dtype=object)
+
+    return pd.DataFrame({
+        "ASIN": [f"B0{numero:08X}" for numero in asin],
+        "Nome prodotto": [f"{codici_marca[marca]} articolo {i} per {CATEGORIE[categoria].lower()}, confezione da {i % 6 + 1}"
+                          for i, (marca, categoria) in enumerate(zip(marche, categorie))],
+        "Marca": codici_marca[marche],
+        "Categoria": np.array(CATEGORIE, dtype=object)[categorie],
+        "Prezzo": prezzo,
+        "Venditore": venditore,
+        "Entrate stimate": np.round(vendite * prezzo, 2),
+        "Vendite stimate": vendite,
+        "Piazzamento": piazzamento,
+        "BSR 30": bsr_30,
+        "RPR": np.round(prezzo * vendite / np.maximum(recensioni, 1), 2),
+        "# di recensioni": recensioni,
+        "Varianti": rng.geometric(0.5, righe),
+        "Disponibile da": pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 2500, righe), unit="D"),
+        "Netto": np.round(prezzo * 0.55, 2),
+        "Commissioni FBA": np.round(prezzo * 0.15 + 2.5, 2),
+        "Margine netto": np.round(rng.uniform(0.05, 0.6, righe), 2),
+        "LQS": rng.integers(1, 11, righe),
+        "Peso": np.round(rng.lognormal(-0.5, 0.8, righe), 2),
+    })
+
+
+# Export successivo a quello indicato, per il confronto: il 95% degli ASIN resta con entrate, vendite, prezzo
+# e posizione variati, il resto esce ed entrano altrettanti ASIN nuovi
+def export_successivo(df_cleaned, seme=1):
+    rng = np.random.default_rng(seme)
+    rimasti = df_cleaned[rng.random(len(df_cleaned)) < 0.95]
+    variazioni = {colonna: rimasti[colonna] * rng.lognormal(0, 0.2, len(rimasti))
+                  for colonna in ["Entrate stimate", "Vendite stimate", "Prezzo", "Piazzamento"]}
+    nuovi = pulisci_dati(genera_export(max(1, len(df_cleaned) // 20), seme))
+    return compatta_dati(pd.concat([rimasti.assign(**variazioni), nuovi], ignore_index=True))
+
+
+# Percorso dell'export sintetico nel formato indicato, generato solo la prima volta
+def export_sintetico(righe, formato, seme=0, cartella=CARTELLA_BENCHMARK):
+    percorso = os.path.join(cartella, f"export_{righe}_{seme}_v{VERSIONE_GENERATORE}.{formato}")
+    if os.path.exists(percorso):
+        return percorso
+
+    os.makedirs(cartella, exist_ok=True)
+    data = genera_export(righe, seme)
+    # Il file temporaneo mantiene l'estensione, da cui pandas sceglie il formato
+    temporaneo = os.path.join(cartella, f"tmp{os.getpid()}_{os.path.basename(percorso)}")
+    if formato == "xlsx":
+        data.to_excel(temporaneo, index=False, engine="openpyxl")
+    elif formato == "csv":
+        data.to_csv(temporaneo, index=False)
+    else:
+        data.to_parquet(temporaneo, index=False)
+    os.replace(temporaneo, percorso)
+    return percorso
+
+
+# Una sezione dell'analisi: calcolo delle tabelle, poi per ogni tabella costruzione del grafico
+# e serializzazione in JSON come in st.plotly_chart
+def _misura_sezione(prefisso, nome, calcolo, df_cleaned, aggregati, marche, modello):
+    with profilazione.fase(f"{prefisso}/sezione {nome}", "sezione"):
+        tabelle = calcolo(df_cleaned, aggregati, N_TOP, marche, modello)
+    for titolo, tabella in tabelle.items():
+        with profilazione.fase(f"{prefisso}/grafico {titolo}", "grafico"):
+            fig, _ = limita_figura(figura(titolo, tabella, N_TOP),
+                                   aggregazione="mean" if titolo == "Variazione BSR 30" else None)
+        with profilazione.fase(f"{prefisso}/serializzazione {titolo}", "invio"):
+            testo = fig.to_json()
+        profilazione.payload("plotly_chart", f"{prefisso}/serializzazione {titolo}", len(testo.encode()))
+
+
+# Un passaggio completo del benchmark su un export sintetico; le misure finiscono nel profilatore attivo
+def _esegui(righe, formati, cartella):
+    percorsi = {formato: export_sintetico(righe, formato, cartella=cartella) for formato in formati}
+    letti = None
+    for formato, percorso in percorsi.items():
+        with profilazione.fase(f"ingestione {formato}", "ingestione"):
+            letti, _ = leggi_export(percorso)
+
+    with profilazione.fase("pulizia", "ingestione"):
+        df_cleaned = pulisci_dati(letti)
+    cartella_cache = os.path.join(cartella, "cache")
+    # Export di dimensioni diverse non condividono mai la voce in cache
+    chiave_cache = cache_disco.chiave(f"benchmark-{righe}", VERSIONE_GENERATORE)
+    with profilazione.fase("scrittura cache", "ingestione"):
+        cache_disco.scrivi(chiave_cache, df_cleaned, cartella_cache)
+    with profilazione.fase("lettura cache", "ingestione"):
+        df_cleaned = cache_disco.leggi(chiave_cache, cartella_cache)
+
+    with profilazione.fase("aggregazioni", "calcolo"):
+        aggregati = costruisci_aggregati(df_cleaned)
+    with profilazione.fase("indice marche", "calcolo"):
+        indice = IndiceRicerca(df_cleaned["Marca"])
+    with profilazione.fase("modello bsr", "calcolo"):
+        modello = costruisci_modello(df_cleaned)
+
+    for nome, calcolo in SEZIONI_ANALISI.items():
+        _misura_sezione("categoria", nome, calcolo, df_cleaned, aggregati, None, modello)
+
+    # RISULTATO BRAND sulla marca con il fatturato più alto, filtrata con l'indice come nella dashboard
+    marca = primi_n(aggregati["Marca"]["sum"], 1, "Entrate stimate").index[0]
+    with profilazione.fase("filtro brand", "calcolo"):
+        identificativi = indice.identificativi(str(marca))
+        df_brand = df_cleaned.iloc[indice.righe_di(identificativi)]
+    marche = list(indice.distinti[identificativi])
+    for nome, calcolo in SEZIONI_ANALISI.items():
+        _misura_sezione("brand", nome, calcolo, df_brand, aggregati, marche, modello)
+
+    # CONFRONTO con un export successivo delle stesse dimensioni
+    successivo = export_successivo(df_cleaned)
+    with profilazione.fase("confronto", "calcolo"):
+        differenze = confronta(df_cleaned, successivo)
+        riepilogo_confronto(differenze, confronta_marche(differenze))
+
+
+_riscaldato = False
+
+
+# Il primo grafico di un processo carica modelli e validatori di plotly: un passaggio non misurato
+# su un export piccolo evita che questo costo finisca nelle misure della prima dimensione eseguita
+def _riscalda(cartella):
+    global _riscaldato
+    if not _riscaldato:
+        _esegui(DIMENSIONI["1k"], ["parquet"], cartella)
+        _riscaldato = True
+
+
+# Misure di un export sintetico: per ogni fase il tempo migliore tra le ripetizioni e il picco di memoria
+# (misurato in un passaggio a parte, perché tracemalloc rallenta il codice misurato), più i byte dei grafici
+def misura(righe, formati=FORMATI, ripetizioni=3, cartella=CARTELLA_BENCHMARK):
+    formati = [formato for formato in formati if formato != "xlsx" or righe <= MASSIMO_RIGHE_EXCEL]
+    risultati = {}
+    _riscalda(cartella)
+
+    profilazione.avvia(memoria=True)
+    try:
+        _esegui(righe, formati, cartella)
+    finally:
+        profilatore = profilazione.termina()
+    for fase in profilatore.fasi:
+        risultati.setdefault(fase["nome"], {})["picco_mb"] = round(fase["picco_mb"] - fase["memoria_iniziale_mb"], 2)
+    for voce in profilatore.payload:
+        risultati.setdefault(voce["nome"], {})["byte"] = voce["byte"]
+
+    for _ in range(ripetizioni):
+        profilazione.avvia(memoria=False)
+        try:
+            _esegui(righe, formati, cartella)
+        finally:
+            profilatore = profilazione.termina()
+        for fase in profilatore.fasi:
+            misure = risultati.setdefault(fase["nome"], {})
+            misure["secondi"] = round(min(misure.get("secondi", float("inf")), fase["secondi"]), 4)
+    return risultati
+
+
+# Tempo di avvio della dashboard, ciascuno in un interprete nuovo (vale il migliore): lo script viene eseguito
+# con AppTest senza file caricati, quindi tutto il codice a livello di modulo fino a st.stop() (import, configurazione
+# della pagina, immagini, eventuali operazioni pesanti aggiunte in cima). Restituisce i secondi e i moduli vietati
+# caricati dallo script (non quelli già caricati da Streamlit); un'eccezione all'avvio fa fallire la misura
+def misura_avvio(ripetizioni=3, script=SCRIPT_DASHBOARD):
+    codice = "\n".join([
+        "import json, sys, time",
+        "from streamlit.testing.v1 import AppTest",
+        "gia_caricati = set(sys.modules)",
+        f"app = AppTest.from_file({script!r}, default_timeout=60)",
+        "inizio = time.perf_counter()",
+        "app.run()",
+        "secondi = time.perf_counter() - inizio",
+        "if app.exception:",
+        "    sys.exit('eccezione all\\'avvio della dashboard: ' + app.exception[0].value)",
+        f"vietati = [m for m in {MODULI_VIETATI_ALL_AVVIO!r} if m in sys.modules and m not in gia_caricati]",
+        "print(json.dumps({'secondi': secondi, 'vietati': vietati}))",
+    ])
+
+    migliore = None
+    for _ in range(ripetizioni):
+        uscita = subprocess.run([sys.executable, "-c", codice], cwd=os.path.dirname(script), capture_output=True,
+                                text=True, check=True)
+        misura_corrente = json.loads(uscita.stdout.strip().splitlines()[-1])
+        if migliore is None or misura_corrente["secondi"] < migliore["secondi"]:
+            migliore = misura_corrente
+    return round(migliore["secondi"], 4), migliore["vietati"]
+
+
+# Misure peggiorate rispetto alla baseline oltre la tolleranza: (dimensione, fase, misura, baseline, valore)
+def regressioni(risultati, baseline, tolleranze=TOLLERANZE):
+    trovate = []
+    for dimensione, fasi in risultati.items():
+        for nome, misure in fasi.items():
+            riferimento = baseline.get(dimensione, {}).get(nome, {})
+            for misura_nome, valore in misure.items():
+                if misura_nome not in riferimento or misura_nome not in tolleranze:
+                    continue
+                rapporto, differenza_minima = tolleranze[misura_nome]
+                base = riferimento[misura_nome]
+                if valore > base * rapporto and valore - base > differenza_minima:
+                    trovate.append((dimensione, nome, misura_nome, base, valore))
+    return trovate
+
+
+def leggi_baseline(percorso=BASELINE):
+    try:
+        with open(percorso, encoding="utf-8") as f:
+            return json.load(f)["risultati"]
+    except FileNotFoundError:
+        return None
+
+
+def scrivi_baseline(risultati, percorso=BASELINE):
+    # Le misure dipendono dalla macchina: si salva anche l'ambiente in cui sono state prese
+    ambiente = {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                "macchina": platform.machine(), "processore": platform.processor(), "cpu": os.cpu_count()}
+    with open(percorso, "w", encoding="utf-8") as f:
+        json.dump({"ambiente": ambiente, "risultati": risultati}, f, ensure_ascii=False, indent=2)
+
+
+def _formatta(misure):
+    parti = []
+    if "secondi" in misure:
+        parti.append(f"{misure['secondi']:9.4f} s")
+    if "picco_mb" in misure:
+        parti.append(f"{misure['picco_mb']:9.2f} MB")
+    if "byte" in misure:
+        parti.append(f"{misure['byte']:>10,} byte".replace(",", "."))
+    return "  ".join(parti)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark della dashboard su export sintetici")
+    parser.add_argument("--dimensioni", nargs="*", default=list(DIMENSIONI), choices=list(DIMENSIONI))
+    parser.add_argument("--formati", nargs="+", default=FORMATI, choices=FORMATI)
+    parser.add_argument("--ripetizioni", type=int, default=3, help="passaggi misurati (vale il tempo migliore)")
+    parser.add_argument("--baseline", default=BASELINE, help="file della baseline")
+    parser.add_argument("--aggiorna-baseline", action="store_true", help="salva i risultati come nuova baseline")
+    parser.add_argument("--risultati", default=None, help="salva anche i risultati in questo file JSON")
+    argomenti = parser.parse_args()
+
+    # L'avvio si controlla sempre: il budget vale anche senza baseline
+    secondi_avvio, vietati = misura_avvio()
+    risultati = {"avvio": {"avvio dashboard": {"secondi": secondi_avvio}}}
+    print(f"== avvio\n  {'avvio dashboard':<66} {_formatta(risultati['avvio']['avvio dashboard'])}")
+    errori_avvio = []
+    if secondi_avvio > BUDGET_AVVIO_SECONDI:
+        errori_avvio.append(f"avvio della dashboard in {secondi_avvio:.2f} s, oltre il budget di {BUDGET_AVVIO_SECONDI:.2f} s")
+    if vietati:
+        errori_avvio.append("moduli caricati all'avvio: " + ", ".join(vietati))
+
+    for dimensione in argomenti.dimensioni:
+        print(f"== {dimensione} righe")
+        risultati[dimensione] = misura(DIMENSIONI[dimensione], argomenti.formati, argomenti.ripetizioni)
+        for nome, misure in risultati[dimensione].items():
+            print(f"  {nome:<66} {_formatta(misure)}")
+
+    if argomenti.risultati:
+        with open(argomenti.risultati, "w", encoding="utf-8") as f:
+            json.dump(risultati, f, ensure_ascii=False, indent=2)
+
+    if errori_avvio:
+        print("\nBUDGET DI AVVIO NON RISPETTATO:")
+        for errore in errori_avvio:
+            print(f"  {errore}")
+        sys.exit(1)
+
+    if argomenti.aggiorna_baseline:
+        # Le dimensioni non misurate in questo giro restano quelle della baseline precedente
+        scrivi_baseline({**(leggi_baseline(argomenti.baseline) or {}), **risultati}, argomenti.baseline)
+        print(f"Baseline aggiornata: {argomenti.baseline}")
+        sys.exit(0)
+
+    baseline = leggi_baseline(argomenti.baseline)
+    if baseline is None:
+        print(f"Nessuna baseline in {argomenti.baseline}: eseguire con --aggiorna-baseline per crearla")
+        sys.exit(0)
+
+    trovate = regressioni(risultati, baseline)
+    if trovate:
+        print(f"\n{len(trovate)} REGRESSIONI rispetto a {argomenti.baseline}:")
+        for dimensione, nome, misura_nome, base, valore in trovate:
+            print(f"  [{dimensione}] {nome}: {misura_nome} {base} -> {valore} ({valore / base:.2f}x)")
+        sys.exit(1)
+    print("Nessuna regressione rispetto alla baseline")
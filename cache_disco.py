@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Cartella e dimensione massima della cache su disco, configurabili da variabili d'ambiente
+# (utile per condividere la stessa cartella tra più repliche dell'app)
+CARTELLA_CACHE = os.environ.get("AMZSCOUT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "amzscout_cache"))
+DIMENSIONE_MASSIMA_MB = float(os.environ.get("AMZSCOUT_CACHE_MB", "2048"))
+
+ESTENSIONE = ".arrow"
+
+
+# Impronta SHA-256 del contenuto del file caricato (o di un percorso su disco), letto a blocchi
+def impronta(sorgente, blocco=1 << 20):
+    sha = hashlib.sha256()
+    if hasattr(sorgente, "read"):
+        posizione = sorgente.tell()
+        sorgente.seek(0)
+        for dati in iter(lambda: sorgente.read(blocco), b""):
+            sha.update(dati)
+        sorgente.seek(posizione)
+    else:
+        with open(sorgente, "rb") as f:
+            for dati in iter(lambda: f.read(blocco), b""):
+                sha.update(dati)
+    return sha.hexdigest()
+
+
+# La chiave combina il contenuto del file e la versione della pipeline che ha prodotto i dati:
+# cambiando la pipeline le voci vecchie non vengono più lette e finiscono eliminate dall'LRU.
+# L'impronta viene sempre ridotta all'hash SHA-256 dell'intero testo ricevuto (impronte, etichette, liste di impronte):
+# la chiave resta un nome di file valido e impronte diverse non danno mai la stessa chiave
+def chiave(impronta_file, versione):
+    return f"{hashlib.sha256(str(impronta_file).encode()).hexdigest()}-v{versione}"
+
+
+def _percorso(chiave_cache, cartella):
+    return os.path.join(cartella, chiave_cache + ESTENSIONE)
+
+
+# Restituisce il DataFrame salvato con questa chiave, o None se non presente.
+# Il file Arrow IPC (non compresso) viene mappato in memoria invece di essere letto e decodificato
+def leggi(chiave_cache, cartella=CARTELLA_CACHE):
+    percorso = _percorso(chiave_cache, cartella)
+    try:
+        sorgente = pa.memory_map(percorso, "r")
+    except FileNotFoundError:
+        return None
+
+    try:
+        tabella = ipc.open_file(sorgente).read_all()
+    except pa.ArrowInvalid:
+        # File troncato o scritto da una versione incompatibile: si ricalcola
+        sorgente.close()
+        _elimina(percorso)
+        return None
+
+    # Aggiorna la data di ultimo utilizzo, su cui si basa l'eliminazione LRU
+    try:
+        os.utime(percorso)
+    except OSError:
+        pass
+    return tabella.to_pandas(split_blocks=True)
+
+
+# Salva il DataFrame in formato colonnare e poi riporta la cartella entro la dimensione massima
+def scrivi(chiave_cache, data, cartella=CARTELLA_CACHE, dimensione_massima_mb=DIMENSIONE_MASSIMA_MB):
+    try:
+        tabella = pa.Table.from_pandas(data)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colonne con tipi misti non rappresentabili in Arrow: il file semplicemente non viene messo in cache
+        return False
+
+    os.makedirs(cartella, exist_ok=True)
+    percorso = _percorso(chiave_cache, cartella)
+
+    # Scrittura su file temporaneo e rinomina atomica: un'altra replica non legge mai un file a metà
+    descrittore, temporaneo = tempfile.mkstemp(dir=cartella, suffix=".tmp")
+    try:
+        with os.fdopen(descrittore, "wb") as f:
+            with ipc.new_file(f, tabella.schema) as scrittore:
+                scrittore.write_table(tabella)
+        # mkstemp crea il file leggibile solo dal proprietario: la cache deve essere leggibile anche dalle altre repliche
+        os.chmod(temporaneo, 0o644)
+        os.replace(temporaneo, percorso)
+    except BaseException:
+        _elimina(temporaneo)
+        raise
+
+    sfoltisci(cartella, dimensione_massima_mb, da_tenere=percorso)
+    return True
+
+
+def _elimina(percorso):
+    try:
+        os.remove(percorso)
+    except OSError:
+        # Su Windows un file ancora mappato da un'altra sessione non può essere eliminato: verrà rimosso al giro successivo
+        pass
+
+
+# Eliminazione LRU: si rimuovono i file usati meno di recente finché la cartella non rientra nella dimensione massima
+def sfoltisci(cartella=CARTELLA_CACHE, dimensione_massima_mb=DIMENSIONE_MASSIMA_MB, da_tenere=None):
+    try:
+        voci = [voce for voce in os.scandir(cartella) if voce.name.endswith(ESTENSIONE)]
+    except FileNotFoundError:
+        return
+
+    file_cache = []
+    for voce in voci:
+        try:
+            info = voce.stat()
+        except FileNotFoundError:
+            continue
+        file_cache.append((info.st_mtime, info.st_size, voce.path))
+
+    totale = sum(dimensione for _, dimensione, _ in file_cache)
+    limite = dimensione_massima_mb * 2**20
+    for _, dimensione, percorso in sorted(file_cache):
+        if totale <= limite:
+            break
+        if percorso == da_tenere:
+            continue
+        _elimina(percorso)
+        totale -= dimensione
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Confronto tra due export puliti (es. il mese precedente e quello attuale), ASIN per ASIN.
+# Gli ASIN dell'export precedente vanno in una tabella hash (pd.Index) e ogni ASIN dell'export attuale
+# vi cerca la propria riga: un solo passaggio vettoriale, senza ordinare né unire i DataFrame
+
+COLONNE_CONFRONTO = ["Entrate stimate", "Vendite stimate", "Prezzo", "Piazzamento"]
+# Colonne che per un ASIN assente valgono zero (il confronto conta tutto il fatturato perso o guadagnato);
+# prezzo e posizione di un ASIN assente restano mancanti
+COLONNE_ADDITIVE = ["Entrate stimate", "Vendite stimate"]
+COLONNA_QUOTA = "Quota di mercato (%)"
+
+ENTRATO = "entrato"
+USCITO = "uscito"
+PRESENTE = "presente"
+
+SUFFISSO_PRIMA = " prima"
+SUFFISSO_DOPO = " dopo"
+PREFISSO_DELTA = "Δ "
+
+
+def _asin(df_cleaned):
+    return pd.Index(df_cleaned["ASIN"].astype(object))
+
+
+# Una riga per ASIN presente in almeno uno dei due export: Marca, stato (entrato, uscito, presente),
+# valore prima, dopo e differenza per COLONNE_CONFRONTO e per la quota di mercato (in punti percentuali).
+# Prima le righe dell'export attuale nel suo ordine, poi gli ASIN usciti
+def confronta(precedente, attuale):
+    asin_prima = _asin(precedente)
+    asin_dopo = _asin(attuale)
+    posizioni = asin_prima.get_indexer(asin_dopo)
+    trovati = posizioni >= 0
+    usciti = np.ones(len(asin_prima), dtype=bool)
+    usciti[posizioni[trovati]] = False
+
+    def prima_e_dopo(colonna, riempimento):
+        valori_prima = precedente[colonna].to_numpy(dtype="float64", na_value=np.nan)
+        valori_dopo = attuale[colonna].to_numpy(dtype="float64", na_value=np.nan)
+        allineati = np.where(trovati, valori_prima[np.where(trovati, posizioni, 0)], riempimento)
+        prima = np.concatenate([allineati, valori_prima[usciti]])
+        dopo = np.concatenate([valori_dopo, np.full(usciti.sum(), riempimento)])
+        return prima, dopo
+
+    colonne = {
+        "Marca": np.concatenate([attuale["Marca"].to_numpy(dtype=object), precedente["Marca"].to_numpy(dtype=object)[usciti]]),
+        "Stato": np.concatenate([np.where(trovati, PRESENTE, ENTRATO), np.full(usciti.sum(), USCITO)]),
+    }
+    for colonna in COLONNE_CONFRONTO:
+        prima, dopo = prima_e_dopo(colonna, 0.0 if colonna in COLONNE_ADDITIVE else np.nan)
+        colonne[colonna + SUFFISSO_PRIMA] = prima
+        colonne[colonna + SUFFISSO_DOPO] = dopo
+        colonne[PREFISSO_DELTA + colonna] = dopo - prima
+
+    entrate_prima = colonne["Entrate stimate" + SUFFISSO_PRIMA]
+    entrate_dopo = colonne["Entrate stimate" + SUFFISSO_DOPO]
+    quota_prima = entrate_prima / max(np.nansum(entrate_prima), np.finfo("float64").tiny) * 100
+    quota_dopo = entrate_dopo / max(np.nansum(entrate_dopo), np.finfo("float64").tiny) * 100
+    colonne[COLONNA_QUOTA + SUFFISSO_PRIMA] = quota_prima
+    colonne[COLONNA_QUOTA + SUFFISSO_DOPO] = quota_dopo
+    colonne[PREFISSO_DELTA + COLONNA_QUOTA] = quota_dopo - quota_prima
+
+    indice = asin_dopo.append(asin_prima[usciti]).rename("ASIN")
+    differenze = pd.DataFrame(colonne, index=indice)
+    return differenze.astype({"Marca": "category", "Stato": "category"})
+
+
+# Totali per Marca sulle righe del confronto: entrate, vendite e quota prima e dopo, ASIN presenti in ciascun export.
+# Una marca è entrata se non aveva ASIN nell'export precedente, uscita se non ne ha in quello attuale
+def confronta_marche(differenze):
+    nell_export_prima = differenze["Stato"] != ENTRATO
+    nell_export_dopo = differenze["Stato"] != USCITO
+    colonne = [colonna + suffisso for colonna in COLONNE_ADDITIVE + [COLONNA_QUOTA]
+               for suffisso in (SUFFISSO_PRIMA, SUFFISSO_DOPO)]
+    marche = differenze[colonne].assign(**{"ASIN prima": nell_export_prima, "ASIN dopo": nell_export_dopo}).groupby(
+        differenze["Marca"], dropna=False, observed=True).sum()
+    for colonna in COLONNE_ADDITIVE + [COLONNA_QUOTA]:
+        marche[PREFISSO_DELTA + colonna] = marche[colonna + SUFFISSO_DOPO] - marche[colonna + SUFFISSO_PRIMA]
+    marche["Stato"] = np.select([marche["ASIN prima"] == 0, marche["ASIN dopo"] == 0], [ENTRATO, USCITO], PRESENTE)
+    return marche
+
+
+# Posizioni delle righe (del confronto per ASIN o per Marca) con uno degli stati indicati
+def righe_con_stato(tabella, stati):
+    return np.flatnonzero(tabella["Stato"].isin(stati).to_numpy())
+
+
+# KPI dei due export e loro differenza, come nelle metriche in cima alle analisi
+def riepilogo_confronto(differenze, marche):
+    riepilogo = {}
+    for nome, colonna in [("Total Revenue", "Entrate stimate"), ("Total Sales", "Vendite stimate")]:
+        riepilogo[nome] = (differenze[colonna + SUFFISSO_PRIMA].sum(), differenze[colonna + SUFFISSO_DOPO].sum())
+    riepilogo["Average Selling Price"] = (differenze["Prezzo" + SUFFISSO_PRIMA].mean(),
+                                          differenze["Prezzo" + SUFFISSO_DOPO].mean())
+    stati = differenze["Stato"].value_counts()
+    riepilogo["Conteggio ASIN"] = (len(differenze) - stati.get(ENTRATO, 0), len(differenze) - stati.get(USCITO, 0))
+    stati_marche = marche["Stato"].value_counts()
+    riepilogo["Conteggio BRAND"] = (len(marche) - stati_marche.get(ENTRATO, 0), len(marche) - stati_marche.get(USCITO, 0))
+    riepilogo["ASIN entrati"] = stati.get(ENTRATO, 0)
+    riepilogo["ASIN usciti"] = stati.get(USCITO, 0)
+    riepilogo["BRAND entrati"] = stati_marche.get(ENTRATO, 0)
+    riepilogo["BRAND usciti"] = stati_marche.get(USCITO, 0)
+    return riepilogo
@@ -0,0 +1,321 @@
+import os
+import sys
+import time
+import tracemalloc
+import zipfile
+from contextlib import contextmanager
+from xml.etree import ElementTree
+from xml.etree.ElementTree import iterparse
+
+import pandas as pd
+
+# Colonne dell'export AMZScout effettivamente usate dalla dashboard, con il tipo esplicito di ciascuna.
+# Tutte le altre colonne (Netto, Commissioni FBA, Margine netto, LQS, Peso, ...) non vengono nemmeno lette.
+COLONNE_DASHBOARD = {
+    "ASIN": "object",
+    "Nome prodotto": "object",
+    "Marca": "object",
+    "Categoria": "object",
+    "Venditore": "object",
+    "Prezzo": "float64",
+    "Entrate stimate": "float64",
+    "Vendite stimate": "float64",
+    "Piazzamento": "float64",
+    "BSR 30": "float64",
+    "RPR": "float64",
+    "# di recensioni": "float64",
+    "Varianti": "float64",
+    "Disponibile da": "datetime64[ns]",
+}
+
+FORMATI_EXCEL = (".xlsx", ".xlsm")
+FORMATI_CSV = (".csv", ".txt")
+FORMATI_PARQUET = (".parquet", ".pq")
+
+
+# Riconosce il formato dell'export dall'estensione del nome o, in mancanza, dai primi byte del file
+def rileva_formato(sorgente):
+    nome = getattr(sorgente, "name", sorgente)
+    estensione = os.path.splitext(str(nome))[1].lower() if isinstance(nome, (str, os.PathLike)) else ""
+
+    if estensione in FORMATI_EXCEL:
+        return "excel"
+    if estensione in FORMATI_CSV:
+        return "csv"
+    if estensione in FORMATI_PARQUET:
+        return "parquet"
+
+    intestazione = _leggi_intestazione(sorgente, 4)
+    if intestazione == b"PAR1":
+        return "parquet"
+    if intestazione.startswith(b"PK"):
+        return "excel"
+    return "csv"
+
+
+def _leggi_intestazione(sorgente, n):
+    if hasattr(sorgente, "read"):
+        posizione = sorgente.tell()
+        dati = sorgente.read(n)
+        sorgente.seek(posizione)
+        return dati if isinstance(dati, bytes) else dati.encode()
+    with open(sorgente, "rb") as f:
+        return f.read(n)
+
+
+def _riavvolgi(sorgente):
+    if hasattr(sorgente, "seek"):
+        sorgente.seek(0)
+
+
+# Converte una colonna grezza nel tipo dichiarato; i valori non convertibili diventano NaN/NaT
+def _converti(valori, tipo):
+    serie = valori if isinstance(valori, pd.Series) else pd.Series(valori, dtype=object)
+    if tipo == "float64":
+        return pd.to_numeric(serie, errors="coerce").astype("float64")
+    if tipo.startswith("datetime64"):
+        return pd.to_datetime(serie, errors="coerce")
+    return serie.astype(tipo)
+
+
+# Namespace degli XML che compongono un file .xlsx
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_TAG_RIGA = _NS + "row"
+_TAG_VALORE = _NS + "v"
+_TAG_TESTO = _NS + "t"
+
+
+# "AB12" -> 27 (indice della colonna a partire da 0)
+def _indice_colonna(riferimento):
+    indice = 0
+    for carattere in riferimento:
+        if carattere <= "9":
+            break
+        indice = indice * 26 + ord(carattere) - 64
+    return indice - 1
+
+
+# Individua il primo foglio del workbook (lo stesso letto da pd.read_excel) e il sistema di date usato
+def _primo_foglio(archivio):
+    workbook = ElementTree.fromstring(archivio.read("xl/workbook.xml"))
+    proprieta = workbook.find(_NS + "workbookPr")
+    data_1904 = proprieta is not None and proprieta.get("date1904") in ("1", "true")
+
+    foglio = workbook.find(f"{_NS}sheets/{_NS}sheet")
+    relazioni = ElementTree.fromstring(archivio.read("xl/_rels/workbook.xml.rels"))
+    for relazione in relazioni.iter(_NS_PKG + "Relationship"):
+        if relazione.get("Id") == foglio.get(_NS_REL + "id"):
+            destinazione = relazione.get("Target")
+            break
+    else:
+        destinazione = "worksheets/sheet1.xml"
+
+    percorso = destinazione.lstrip("/") if destinazione.startswith("/") else "xl/" + destinazione
+    return percorso, data_1904
+
+
+def _stringhe_condivise(archivio):
+    if "xl/sharedStrings.xml" not in archivio.namelist():
+        return []
+    stringhe = []
+    with archivio.open("xl/sharedStrings.xml") as flusso:
+        for _, elemento in iterparse(flusso):
+            if elemento.tag == _NS + "si":
+                # Testo semplice (<si><t>) o formattato (<si><r><t>); le annotazioni fonetiche (<rPh>) sono escluse
+                for fonetica in elemento.findall(_NS + "rPh"):
+                    elemento.remove(fonetica)
+                stringhe.append("".join(testo.text or "" for testo in elemento.iter(_TAG_TESTO)))
+                elemento.clear()
+    return stringhe
+
+
+# I numeri restano testo: la conversione avviene poi in blocco, colonna per colonna, secondo il tipo dichiarato.
+# Le stringhe vuote (in linea senza testo o condivise vuote) diventano None, come le celle vuote di pd.read_excel
+def _valore_cella(cella, condivise):
+    tipo = cella.get("t")
+    if tipo == "inlineStr":
+        return "".join(testo.text or "" for testo in cella.iter(_TAG_TESTO)) or None
+    valore = cella.find(_TAG_VALORE)
+    if valore is None or valore.text is None or tipo == "e":
+        return None
+    if tipo == "s":
+        return condivise[int(valore.text)] or None
+    return valore.text
+
+
+# Nelle celle Excel le date sono numeri seriali; le date scritte come testo vengono interpretate come in pd.to_datetime
+def _converti_data_excel(valori, data_1904):
+    serie = pd.Series(valori, dtype=object)
+    seriali = pd.to_numeric(serie, errors="coerce")
+    origine = "1904-01-01" if data_1904 else "1899-12-30"
+    date = pd.to_datetime(seriali, unit="D", origin=origine, errors="coerce")
+    testuali = seriali.isna() & serie.notna()
+    if testuali.any():
+        date[testuali] = pd.to_datetime(serie[testuali], errors="coerce")
+    return date.astype("datetime64[ns]")
+
+
+# Lettura in streaming del primo foglio direttamente dall'XML del file .xlsx:
+# le righe vengono scorse una volta sola, si decodificano soltanto le celle delle colonne richieste
+# e ogni riga viene liberata appena letta, così la memoria non cresce con la larghezza del foglio
+def _leggi_excel(sorgente, colonne):
+    with zipfile.ZipFile(sorgente) as archivio:
+        percorso, data_1904 = _primo_foglio(archivio)
+        condivise = _stringhe_condivise(archivio)
+
+        intestazione = None
+        indici = richiesti = None
+        valori = []
+        with archivio.open(percorso) as flusso:
+            for _, elemento in iterparse(flusso):
+                if elemento.tag != _TAG_RIGA:
+                    continue
+
+                riga = {}
+                posizione = 0
+                for cella in elemento:
+                    riferimento = cella.get("r")
+                    if riferimento:
+                        posizione = _indice_colonna(riferimento)
+                    if richiesti is None or posizione in richiesti:
+                        riga[posizione] = _valore_cella(cella, condivise)
+                    posizione += 1
+                elemento.clear()
+
+                if intestazione is None:
+                    # La prima riga è l'intestazione: si tiene la prima occorrenza di ciascuna colonna richiesta
+                    intestazione = {}
+                    for indice in sorted(riga):
+                        nome = riga[indice]
+                        if nome in colonne and nome not in intestazione:
+                            intestazione[nome] = indice
+                    indici = list(intestazione.values())
+                    richiesti = set(indici)
+                    continue
+
+                # Le righe completamente vuote (tipicamente in coda al foglio) vengono scartate
+                if any(valore is not None for valore in riga.values()):
+                    valori.append(tuple(riga.get(indice) for indice in indici))
+
+    nomi = list(intestazione or {})
+    colonne_grezze = list(zip(*valori)) if valori else [()] * len(nomi)
+    data = {}
+    for nome, grezza in zip(nomi, colonne_grezze):
+        if colonne[nome].startswith("datetime64"):
+            data[nome] = _converti_data_excel(grezza, data_1904)
+        else:
+            data[nome] = _converti(list(grezza), colonne[nome])
+    return pd.DataFrame(data, columns=nomi)
+
+
+def _leggi_csv(sorgente, colonne):
+    # Gli export italiani usano spesso ";" come separatore e la virgola come separatore decimale
+    prima_riga = _leggi_intestazione(sorgente, 4096).split(b"\n", 1)[0]
+    separatore = ";" if prima_riga.count(b";") > prima_riga.count(b",") else ","
+    decimale = "," if separatore == ";" else "."
+
+    testuali = {nome: object for nome, tipo in colonne.items() if tipo == "object"}
+    data = pd.read_csv(sorgente, sep=separatore, decimal=decimale, usecols=lambda nome: nome in colonne,
+                       dtype=testuali, low_memory=False)
+    for nome in data.columns:
+        if colonne[nome] != "object":
+            data[nome] = _converti(data[nome], colonne[nome])
+    return data
+
+
+def _leggi_parquet(sorgente, colonne):
+    import pyarrow.parquet as pq
+
+    file_parquet = pq.ParquetFile(sorgente)
+    nomi = [nome for nome in file_parquet.schema_arrow.names if nome in colonne]
+    data = file_parquet.read(columns=nomi).to_pandas()
+    for nome in data.columns:
+        if str(data[nome].dtype) != colonne[nome]:
+            data[nome] = _converti(data[nome], colonne[nome])
+    return data
+
+
+_LETTORI = {
+    "excel": _leggi_excel,
+    "csv": _leggi_csv,
+    "parquet": _leggi_parquet,
+}
+
+
+# Misura durata e (opzionalmente) picco di memoria allocata dal blocco di codice
+@contextmanager
+def misura(misura_memoria):
+    misurazione = {"secondi": None, "picco_memoria_mb": None}
+    gia_attivo = tracemalloc.is_tracing()
+    if misura_memoria:
+        if gia_attivo:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+    inizio = time.perf_counter()
+    try:
+        yield misurazione
+    finally:
+        misurazione["secondi"] = time.perf_counter() - inizio
+        if misura_memoria:
+            misurazione["picco_memoria_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            if not gia_attivo:
+                tracemalloc.stop()
+
+
+def crea_statistiche(formato, data, misurazione):
+    secondi = misurazione["secondi"]
+    return {
+        "formato": formato,
+        "righe": len(data),
+        "colonne": data.shape[1],
+        "secondi": secondi,
+        "righe_al_secondo": len(data) / secondi if secondi else float("inf"),
+        "picco_memoria_mb": misurazione["picco_memoria_mb"],
+    }
+
+
+# Legge un export AMZScout (Excel, CSV o Parquet) caricando solo le colonne della dashboard.
+# Restituisce il DataFrame e le statistiche di lettura (righe/secondo e, se richiesto, picco di memoria)
+def leggi_export(sorgente, colonne=COLONNE_DASHBOARD, misura_memoria=False):
+    formato = rileva_formato(sorgente)
+    _riavvolgi(sorgente)
+    with misura(misura_memoria) as misurazione:
+        data = _LETTORI[formato](sorgente, colonne)
+    return data, crea_statistiche(formato, data, misurazione)
+
+
+# Percorso di lettura precedente (pd.read_excel su tutte le colonne), tenuto come riferimento per i confronti
+def leggi_con_read_excel(sorgente, misura_memoria=False):
+    _riavvolgi(sorgente)
+    with misura(misura_memoria) as misurazione:
+        data = pd.read_excel(sorgente)
+    return data, crea_statistiche("excel (pd.read_excel)", data, misurazione)
+
+
+def formatta_statistiche(statistiche):
+    testo = "{righe:,} righe, {colonne} colonne in {secondi:.2f}s ({righe_al_secondo:,.0f} righe/s)".format(**statistiche)
+    if statistiche["picco_memoria_mb"] is not None:
+        testo += ", picco memoria {:.1f} MB".format(statistiche["picco_memoria_mb"])
+    if statistiche.get("memoria_mb") is not None:
+        testo += ", dati in memoria {:.1f} MB".format(statistiche["memoria_mb"])
+        if statistiche.get("memoria_mb_prima") is not None:
+            testo += " (prima della compattazione {:.1f} MB)".format(statistiche["memoria_mb_prima"])
+    if statistiche.get("duplicati_rimossi"):
+        testo += ", {:,} ASIN duplicati tra i file rimossi".format(statistiche["duplicati_rimossi"])
+    return f"[{statistiche['formato']}] {testo}"
+
+
+# Uso: python ingestione.py export.xlsx [altro_export.csv ...]
+# Confronta il lettore colonnare con pd.read_excel sugli stessi file
+if __name__ == "__main__":
+    for percorso in sys.argv[1:]:
+        print(percorso)
+        _, statistiche = leggi_export(percorso, misura_memoria=True)
+        print("  " + formatta_statistiche(statistiche))
+        if rileva_formato(percorso) == "excel":
+            _, statistiche = leggi_con_read_excel(percorso, misura_memoria=True)
+            print("  " + formatta_statistiche(statistiche))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Curva Sales rank -> vendite stimate per Categoria, ricavata dalle coppie Piazzamento / Vendite stimate dell'export.
+# La curva è una tabella: per ogni categoria le vendite stimate (in log) su una griglia comune di rank in scala
+# logaritmica. Stimare le vendite di un rank è un'interpolazione lineare tra due celle della tabella,
+# fatta con operazioni su array per tutte le righe insieme
+
+# Punti della griglia di rank (uniformi in log10) e coppie minime perché una categoria abbia una curva propria:
+# sotto questa soglia si usa la curva di tutte le categorie insieme
+PUNTI_GRIGLIA = 128
+MINIMO_COPPIE = 50
+
+TUTTE_LE_CATEGORIE = "(tutte)"
+
+
+class ModelloBSR:
+
+    def __init__(self, categorie, log_rank_massimo, tabella):
+        # categorie: Index con una voce per riga della tabella; l'ultima riga è la curva di tutte le categorie
+        self.categorie = categorie
+        self.log_rank_massimo = log_rank_massimo
+        self.tabella = tabella
+
+    # Vendite stimate per ciascun rank, con la curva della rispettiva categoria
+    def stima(self, categorie, rank):
+        righe = self.categorie.get_indexer(pd.Index(categorie, dtype=object))
+        righe[righe < 0] = len(self.categorie) - 1
+
+        log_rank = np.log10(np.clip(np.asarray(rank, dtype="float64"), 1, None))
+        mancanti = np.isnan(log_rank)
+        posizione = np.clip(np.nan_to_num(log_rank) / self.log_rank_massimo * (PUNTI_GRIGLIA - 1), 0, PUNTI_GRIGLIA - 1)
+        sinistra = np.minimum(posizione.astype(np.int64), PUNTI_GRIGLIA - 2)
+        peso = posizione - sinistra
+
+        log_unita = self.tabella[righe, sinistra] * (1 - peso) + self.tabella[righe, sinistra + 1] * peso
+        stime = 10 ** log_unita
+        stime[mancanti] = np.nan
+        return stime
+
+    # Differenza di vendite stimate tra il rank attuale e il BSR medio a 30 giorni:
+    # positiva se con il rank attuale l'ASIN vende più che nella media degli ultimi 30 giorni
+    def variazione_unita(self, categorie, rank_attuale, rank_30):
+        return self.stima(categorie, rank_attuale) - self.stima(categorie, rank_30)
+
+
+def _curva(log_rank, log_unita, punti, log_rank_massimo):
+    # Mediana delle vendite (in log) per ogni cella della griglia, poi interpolazione sulle celle vuote
+    celle = np.clip(np.rint(log_rank / log_rank_massimo * (punti - 1)).astype(np.int64), 0, punti - 1)
+    mediane = pd.Series(log_unita).groupby(celle).median()
+    curva = np.interp(np.arange(punti), mediane.index.to_numpy(), mediane.to_numpy())
+    # Le vendite non possono crescere al peggiorare del rank
+    return np.minimum.accumulate(curva)
+
+
+# Costruisce il modello dalle righe con Piazzamento e Vendite stimate positivi
+def costruisci_modello(df_cleaned, punti=PUNTI_GRIGLIA, minimo_coppie=MINIMO_COPPIE):
+    coppie = df_cleaned[["Categoria", "Piazzamento", "Vendite stimate"]]
+    coppie = coppie[(coppie["Piazzamento"] > 0) & (coppie["Vendite stimate"] > 0)]
+    log_rank = np.log10(coppie["Piazzamento"].to_numpy(dtype="float64"))
+    log_unita = np.log10(coppie["Vendite stimate"].to_numpy(dtype="float64"))
+    # La griglia copre anche i BSR 30 più alti dei Piazzamento osservati (oltre l'ultimo punto la curva resta piatta)
+    rank_massimo = np.nanmax(df_cleaned[["Piazzamento", "BSR 30"]].to_numpy(dtype="float64"), initial=10)
+    log_rank_massimo = max(np.log10(rank_massimo), 1.0)
+
+    if len(coppie) == 0:
+        return ModelloBSR(pd.Index([TUTTE_LE_CATEGORIE], dtype=object), log_rank_massimo,
+                          np.full((1, punti), np.nan, dtype="float32"))
+
+    categorie, curve = [], []
+    codici, valori = pd.factorize(coppie["Categoria"].astype(object))
+    for codice, categoria in enumerate(valori):
+        selezione = codici == codice
+        if selezione.sum() >= minimo_coppie:
+            categorie.append(categoria)
+            curve.append(_curva(log_rank[selezione], log_unita[selezione], punti, log_rank_massimo))
+    categorie.append(TUTTE_LE_CATEGORIE)
+    curve.append(_curva(log_rank, log_unita, punti, log_rank_massimo))
+
+    return ModelloBSR(pd.Index(categorie, dtype=object), log_rank_massimo, np.vstack(curve).astype("float32"))
@@ -0,0 +1,171 @@
+import contextvars
+import io
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+try:
+    import resource
+except ImportError:
+    # Non disponibile su Windows: si rinuncia al picco di memoria del processo
+    resource = None
+
+# Profilazione su richiesta di un'esecuzione della dashboard (o di un report, di un benchmark):
+# durata e picco di memoria allocata per fase e per sezione, dimensione dei dati inviati al browser
+# da ogni st.plotly_chart / st.dataframe. Senza un profilatore attivo fase() e payload() non fanno nulla,
+# quindi le chiamate possono restare nel codice senza costi.
+# Il picco di memoria è quello misurato da tracemalloc (allocazioni Python e numpy/pandas, non Arrow):
+# tracemalloc è unico per processo, quindi con più sessioni attive insieme i picchi includono anche le altre
+ATTIVA_DI_DEFAULT = os.environ.get("AMZSCOUT_PROFILAZIONE", "") not in ("", "0")
+
+_corrente = contextvars.ContextVar("profilatore", default=None)
+
+
+def _picco_processo_mb():
+    if resource is None:
+        return None
+    # ru_maxrss è in KB su Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+class Profilatore:
+
+    def __init__(self, memoria=True):
+        self.memoria = memoria
+        self.fasi = []
+        self.payload = []
+        self.inizio = time.perf_counter()
+        self.fine = None
+        self._aperte = []
+        self._avviato_tracemalloc = False
+        if memoria:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._avviato_tracemalloc = True
+        self.memoria_iniziale_mb = tracemalloc.get_traced_memory()[0] / 2**20 if memoria else None
+        self.picco_mb = self.memoria_iniziale_mb
+
+    # Riporta il picco misurato da tracemalloc dall'ultimo controllo su tutte le fasi aperte, poi lo azzera:
+    # così anche le fasi annidate hanno ciascuna il proprio picco
+    def _aggiorna_picchi(self):
+        if not self.memoria:
+            return
+        picco = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.reset_peak()
+        for fase in self._aperte:
+            fase["picco_mb"] = max(fase["picco_mb"], picco)
+        self.picco_mb = max(self.picco_mb, picco)
+
+    @contextmanager
+    def fase(self, nome, categoria="fase"):
+        self._aggiorna_picchi()
+        memoria = tracemalloc.get_traced_memory()[0] / 2**20 if self.memoria else None
+        fase = {"nome": nome, "categoria": categoria, "inizio": time.perf_counter() - self.inizio,
+                "secondi": None, "memoria_iniziale_mb": memoria, "picco_mb": memoria or 0.0,
+                "thread": threading.get_ident()}
+        self._aperte.append(fase)
+        try:
+            yield fase
+        finally:
+            self._aggiorna_picchi()
+            self._aperte.remove(fase)
+            fase["secondi"] = time.perf_counter() - self.inizio - fase["inizio"]
+            if not self.memoria:
+                fase["picco_mb"] = None
+            self.fasi.append(fase)
+
+    def registra_payload(self, tipo, nome, byte):
+        self.payload.append({"tipo": tipo, "nome": nome, "byte": byte,
+                             "fase": self._aperte[-1]["nome"] if self._aperte else None})
+
+    def chiudi(self):
+        if self.fine is None:
+            self._aggiorna_picchi()
+            self.fine = time.perf_counter()
+            if self._avviato_tracemalloc:
+                tracemalloc.stop()
+
+    def riepilogo(self):
+        fine = self.fine or time.perf_counter()
+        return {
+            "secondi": fine - self.inizio,
+            "memoria_iniziale_mb": self.memoria_iniziale_mb,
+            "picco_memoria_mb": self.picco_mb,
+            "picco_processo_mb": _picco_processo_mb(),
+            "payload_byte": sum(voce["byte"] for voce in self.payload),
+            "fasi": sorted(self.fasi, key=lambda fase: fase["inizio"]),
+            "payload": self.payload,
+        }
+
+    def esporta_json(self, **extra):
+        return json.dumps({**self.riepilogo(), **extra}, ensure_ascii=False, indent=2, default=str)
+
+    # Formato Trace Event (chrome://tracing, Perfetto): un evento completo ("X") per fase, in microsecondi
+    def esporta_traccia(self):
+        eventi = [{"name": fase["nome"], "cat": fase["categoria"], "ph": "X", "pid": os.getpid(), "tid": fase["thread"],
+                   "ts": round(fase["inizio"] * 1e6), "dur": round(fase["secondi"] * 1e6),
+                   "args": {"picco_mb": fase["picco_mb"]}}
+                  for fase in self.fasi]
+        eventi += [{"name": f"{voce['tipo']}: {voce['nome']}", "cat": "payload", "ph": "C", "pid": os.getpid(),
+                    "ts": round(((self.fine or time.perf_counter()) - self.inizio) * 1e6), "args": {"byte": voce["byte"]}}
+                   for voce in self.payload]
+        return json.dumps({"traceEvents": eventi, "displayTimeUnit": "ms"})
+
+
+# Attiva un nuovo profilatore per il codice eseguito da qui in poi nello stesso thread (una esecuzione dello script)
+def avvia(memoria=True):
+    termina()
+    profilatore = Profilatore(memoria)
+    _corrente.set(profilatore)
+    return profilatore
+
+
+# Chiude il profilatore attivo e lo restituisce (None se la profilazione non era attiva)
+def termina():
+    profilatore = _corrente.get()
+    if profilatore is not None:
+        profilatore.chiudi()
+        _corrente.set(None)
+    return profilatore
+
+
+def corrente():
+    return _corrente.get()
+
+
+# Misura il blocco di codice come fase del profilatore attivo; senza profilatore non fa nulla
+@contextmanager
+def fase(nome, categoria="fase"):
+    profilatore = _corrente.get()
+    if profilatore is None:
+        yield None
+        return
+    with profilatore.fase(nome, categoria) as misurazione:
+        yield misurazione
+
+
+def payload(tipo, nome, byte):
+    profilatore = _corrente.get()
+    if profilatore is not None:
+        profilatore.registra_payload(tipo, nome, byte)
+
+
+# Byte inviati al browser da st.plotly_chart: la figura serializzata in JSON
+def byte_figura(fig):
+    return len(fig.to_json().encode())
+
+
+# Byte inviati al browser da st.dataframe: la tabella serializzata in Arrow IPC
+def byte_tabella(df):
+    tabella = pa.Table.from_pandas(df)
+    uscita = io.BytesIO()
+    with pa.ipc.new_stream(uscita, tabella.schema) as scrittore:
+        scrittore.write_table(tabella)
+    return uscita.tell()
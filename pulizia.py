@@ -0,0 +1,162 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import cache_disco
+import profilazione
+from ingestione import leggi_export, crea_statistiche, COLONNE_DASHBOARD
+
+# Da incrementare ogni volta che cambia il risultato della pulizia (o le colonne lette in ingestione):
+# fa parte della chiave della cache su disco, quindi i dati puliti con la versione precedente non vengono più usati
+VERSIONE_PIPELINE = 2
+
+COLONNE_DA_RIMUOVERE = ["Netto", "Commissioni FBA", "Margine netto", "LQS", "Peso"]
+
+# Colonne testuali da codificare come categorie (dizionario dei valori distinti + codici interi)
+# quando i valori distinti sono al massimo QUOTA_MASSIMA_CATEGORIE delle righe:
+# per colonne quasi tutte diverse (es. ASIN dopo la rimozione dei duplicati) la codifica non fa risparmiare memoria
+COLONNE_TESTUALI = ["ASIN", "Nome prodotto", "Marca", "Venditore", "Categoria"]
+QUOTA_MASSIMA_CATEGORIE = 0.5
+
+# Colonne numeriche a valori interi (posizioni e conteggi) che possono passare a float32 senza perdere precisione.
+# Entrate, vendite e prezzi restano float64 perché vengono sommati su tutto il dataset
+COLONNE_INTERE = ["Piazzamento", "BSR 30", "# di recensioni", "Varianti"]
+
+# Colonna aggiunta quando si uniscono più export: nome del file da cui proviene la riga
+COLONNA_ORIGINE = "Origine"
+
+
+# Pulizia dell'export, identica per RISULTATO BRAND e RISULTATO CATEGORIA
+def pulisci_dati(df):
+    # Rimuovi le colonne specifiche
+    df_cleaned = df.drop(columns=COLONNE_DA_RIMUOVERE, errors="ignore")
+
+    # Converte la colonna "Disponibile da" in data (la formattazione gg/mm/aaaa avviene solo in visualizzazione)
+    df_cleaned["Disponibile da"] = pd.to_datetime(df_cleaned["Disponibile da"], errors="coerce")
+
+    # Rimuovi i duplicati basati sulla colonna "ASIN"
+    df_cleaned = df_cleaned.drop_duplicates(subset=["ASIN"])
+
+    # Converte le celle vuote in "Vendite stimate" in 1 se "Entrate stimate" contiene un valore
+    mask = (df_cleaned["Vendite stimate"].isna()) & (df_cleaned["Entrate stimate"].notna())
+    df_cleaned.loc[mask, "Vendite stimate"] = 1
+
+    # Rimuovi le righe in cui entrambe le colonne sono vuote
+    df_cleaned = df_cleaned.dropna(subset=["Vendite stimate", "Entrate stimate"], how="all")
+
+    return compatta_dati(df_cleaned)
+
+
+# Rappresentazione compatta: categorie per i testi ripetuti, float32 per le colonne a valori interi
+def compatta_dati(df_cleaned):
+    tipi = {}
+    for colonna in COLONNE_TESTUALI:
+        if colonna in df_cleaned.columns and df_cleaned[colonna].dtype == object:
+            if df_cleaned[colonna].nunique() <= QUOTA_MASSIMA_CATEGORIE * len(df_cleaned):
+                tipi[colonna] = "category"
+
+    for colonna in COLONNE_INTERE:
+        if colonna in df_cleaned.columns and df_cleaned[colonna].dtype == "float64":
+            valori = df_cleaned[colonna].to_numpy()
+            valori = valori[~np.isnan(valori)]
+            if (valori == np.round(valori)).all() and np.abs(valori).max(initial=0) < 2**24:
+                tipi[colonna] = "float32"
+
+    return df_cleaned.astype(tipi)
+
+
+# Memoria occupata dal DataFrame, compresi i testi
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+# Legge e pulisce un export passando dalla cache su disco: se lo stesso file è già stato pulito
+# (anche da un'altra sessione, replica o prima di un riavvio) non viene più letto né ripulito.
+# Se l'impronta del file è già nota può essere passata per non rileggerne il contenuto
+def carica_export_pulito(sorgente, usa_cache=True, impronta_file=None):
+    if usa_cache:
+        chiave = cache_disco.chiave(impronta_file or cache_disco.impronta(sorgente), VERSIONE_PIPELINE)
+        inizio = time.perf_counter()
+        data = cache_disco.leggi(chiave)
+        if data is not None:
+            statistiche = crea_statistiche("cache", data, {"secondi": time.perf_counter() - inizio,
+                                                            "picco_memoria_mb": None})
+            statistiche["memoria_mb"] = memoria_mb(data)
+            return data, statistiche
+
+    with profilazione.fase("lettura export", "ingestione"):
+        data, statistiche = leggi_export(sorgente)
+    statistiche["memoria_mb_prima"] = memoria_mb(data)
+    with profilazione.fase("pulizia", "ingestione"):
+        data = pulisci_dati(data)
+    statistiche["memoria_mb"] = memoria_mb(data)
+
+    if usa_cache:
+        with profilazione.fase("scrittura cache su disco", "ingestione"):
+            cache_disco.scrivi(chiave, data)
+    return data, statistiche
+
+
+# Un file aperto non può essere passato a un altro processo: se ne invia il contenuto; un percorso va bene così com'è
+def _trasferibile(sorgente):
+    if hasattr(sorgente, "getvalue"):
+        return sorgente.getvalue()
+    if hasattr(sorgente, "read"):
+        sorgente.seek(0)
+        return sorgente.read()
+    return sorgente
+
+
+# Lettura di un export nel processo del pool: il file caricato arriva come bytes, un percorso così com'è
+def _carica_in_processo(sorgente, impronta_file):
+    if isinstance(sorgente, bytes):
+        sorgente = io.BytesIO(sorgente)
+    return carica_export_pulito(sorgente, impronta_file=impronta_file)
+
+
+# Unisce gli export già puliti (es. uno per categoria o marketplace) in un unico DataFrame:
+# stesse colonne per tutti, colonna Origine con il nome del file e un solo record per ASIN
+# (a parità di ASIN vale il primo file in elenco)
+def unisci_export(dati, nomi):
+    colonne = [colonna for colonna in COLONNE_DASHBOARD if colonna not in COLONNE_DA_RIMUOVERE]
+    parti = [data.reindex(columns=colonne).assign(**{COLONNA_ORIGINE: nome}) for data, nome in zip(dati, nomi)]
+    # Le categorie diverse tra un file e l'altro diventano testo nella concatenazione: si ricompatta alla fine
+    unito = pd.concat(parti, ignore_index=True)
+    righe = len(unito)
+    unito = unito.drop_duplicates(subset=["ASIN"], ignore_index=True)
+    return compatta_dati(unito.astype({COLONNA_ORIGINE: "category"})), righe - len(unito)
+
+
+# Legge, pulisce e unisce più export. I file non ancora nella cache su disco vengono letti in parallelo,
+# uno per processo (la lettura e la pulizia sono limitate dal GIL, quindi i thread non basterebbero).
+# Anche il risultato dell'unione resta nella cache su disco, con una chiave che dipende da tutti i file e dal loro ordine
+def carica_export_multipli(sorgenti, impronte, nomi, processi=None):
+    inizio = time.perf_counter()
+    chiave_unione = cache_disco.chiave("\n".join(impronte), VERSIONE_PIPELINE)
+    data = cache_disco.leggi(chiave_unione)
+    if data is not None:
+        statistiche = crea_statistiche("cache", data, {"secondi": time.perf_counter() - inizio, "picco_memoria_mb": None})
+        statistiche["memoria_mb"] = memoria_mb(data)
+        return data, statistiche
+
+    dati = [cache_disco.leggi(cache_disco.chiave(impronta_file, VERSIONE_PIPELINE)) for impronta_file in impronte]
+    mancanti = [i for i, data in enumerate(dati) if data is None]
+    if len(mancanti) == 1:
+        dati[mancanti[0]], _ = carica_export_pulito(sorgenti[mancanti[0]], impronta_file=impronte[mancanti[0]])
+    elif mancanti:
+        with ProcessPoolExecutor(max_workers=min(len(mancanti), processi or os.cpu_count() or 1)) as pool:
+            lavori = {i: pool.submit(_carica_in_processo, _trasferibile(sorgenti[i]), impronte[i]) for i in mancanti}
+            for i, lavoro in lavori.items():
+                dati[i], _ = lavoro.result()
+
+    data, duplicati = unisci_export(dati, nomi)
+    statistiche = crea_statistiche(f"{len(dati)} file", data, {"secondi": time.perf_counter() - inizio,
+                                                               "picco_memoria_mb": None})
+    statistiche["memoria_mb"] = memoria_mb(data)
+    statistiche["duplicati_rimossi"] = duplicati
+    cache_disco.scrivi(chiave_unione, data)
+    return data, statistiche
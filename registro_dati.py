@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from pulizia import memoria_mb
+
+# Registro dei dataset puliti condiviso da tutte le sessioni del processo.
+# Ogni dataset è identificato dall'impronta del contenuto dei file da cui proviene ed esiste una sola volta
+# in memoria: le sessioni ricevono viste che condividono gli stessi array (resi in sola lettura, quindi
+# una modifica sul posto solleva un errore invece di alterare i dati delle altre sessioni).
+# Il registro conta le sessioni che usano ciascun dataset; quando la memoria occupata supera il budget
+# vengono eliminati, dal meno usato di recente, i soli dataset che nessuna sessione sta usando
+BUDGET_MB = float(os.environ.get("AMZSCOUT_REGISTRO_MB", "4096"))
+
+registro_log = logging.getLogger("amzscout.registro")
+
+
+class _Voce:
+
+    def __init__(self, data, statistiche):
+        self.data = data
+        self.statistiche = statistiche
+        self.mb = memoria_mb(data)
+        self.riferimenti = 0
+        self.ultimo_uso = time.monotonic()
+
+
+def _blocca(valori):
+    vista = valori.view()
+    vista.flags.writeable = False
+    return vista
+
+
+# Nuovo DataFrame sugli stessi array del dataset, attraverso viste in sola lettura (nessuna copia dei dati):
+# per le categorie si bloccano i codici, per numeri e date l'array numpy della colonna.
+# Le colonne con tipi di estensione (es. interi con valori mancanti) restano come sono
+def _sola_lettura(df):
+    colonne = {}
+    for nome, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            colonne[nome] = pd.Categorical.from_codes(_blocca(serie.cat.codes.to_numpy()), dtype=serie.dtype)
+        elif isinstance(serie.dtype, np.dtype):
+            colonne[nome] = _blocca(serie.to_numpy())
+        else:
+            colonne[nome] = serie.array
+    # copy=False tiene un array per colonna: riunire le colonne dello stesso tipo in un blocco sarebbe una copia scrivibile
+    return pd.DataFrame(colonne, index=df.index, copy=False)
+
+
+class RegistroDataset:
+
+    def __init__(self, budget_mb=BUDGET_MB):
+        self.budget_mb = budget_mb
+        self._voci = OrderedDict()
+        self._blocco = threading.Lock()
+        # Un blocco per impronta: due sessioni che caricano lo stesso file lo leggono e puliscono una volta sola
+        self._caricamenti = {}
+
+    # Dataset con questa impronta, caricato con carica() (che restituisce DataFrame e statistiche) se non è
+    # già nel registro. Incrementa il numero di utilizzi: ogni acquisizione va chiusa con rilascia()
+    def acquisisci(self, impronta_file, carica):
+        with self._blocco:
+            blocco_caricamento = self._caricamenti.setdefault(impronta_file, threading.Lock())
+
+        with blocco_caricamento:
+            with self._blocco:
+                voce = self._voci.get(impronta_file)
+            if voce is None:
+                data, statistiche = carica()
+                voce = _Voce(_sola_lettura(data), statistiche)
+
+            with self._blocco:
+                voce = self._voci.setdefault(impronta_file, voce)
+                voce.riferimenti += 1
+                voce.ultimo_uso = time.monotonic()
+                self._voci.move_to_end(impronta_file)
+                self._sfoltisci()
+
+        # Vista della sessione: nuovo contenitore, stessi array in sola lettura
+        return voce.data.copy(deep=False), voce.statistiche
+
+    def rilascia(self, impronta_file):
+        with self._blocco:
+            voce = self._voci.get(impronta_file)
+            if voce is not None and voce.riferimenti > 0:
+                voce.riferimenti -= 1
+                voce.ultimo_uso = time.monotonic()
+                # L'ordine delle voci è quello di ultimo utilizzo: anche il rilascio conta come uso
+                self._voci.move_to_end(impronta_file)
+                self._sfoltisci()
+
+    def _sfoltisci(self):
+        totale = sum(voce.mb for voce in self._voci.values())
+        for impronta_file in [chiave for chiave, voce in self._voci.items() if voce.riferimenti == 0]:
+            if totale <= self.budget_mb:
+                break
+            totale -= self._voci.pop(impronta_file).mb
+            self._caricamenti.pop(impronta_file, None)
+        if totale > self.budget_mb:
+            registro_log.warning("dataset in uso per %.0f MB, oltre il budget di %.0f MB", totale, self.budget_mb)
+
+    # Dataset presenti, memoria occupata e sessioni che li usano
+    def stato(self):
+        with self._blocco:
+            return {"dataset": len(self._voci), "mb": sum(voce.mb for voce in self._voci.values()),
+                    "budget_mb": self.budget_mb, "in_uso": sum(voce.riferimenti > 0 for voce in self._voci.values()),
+                    "riferimenti": sum(voce.riferimenti for voce in self._voci.values())}
+
+
+# Un solo registro per processo, condiviso da tutte le sessioni
+registro = RegistroDataset()
+
+
+# Dataset usato da una sessione: lo rilascia quando la sessione passa a un altro dataset (rilascia())
+# o quando l'oggetto viene eliminato insieme allo stato della sessione
+class Prenotazione:
+
+    def __init__(self, impronta_file, carica, registro_dataset=registro):
+        self.impronta_file = impronta_file
+        self.data, self.statistiche = registro_dataset.acquisisci(impronta_file, carica)
+        self._rilascio = weakref.finalize(self, registro_dataset.rilascia, impronta_file)
+
+    def rilascia(self):
+        self._rilascio()
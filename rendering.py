@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import profilazione
+
+# Numero massimo di punti (barre, fette, marker) inviati al browser per ciascuna traccia
+MASSIMO_PUNTI_TRACCIA = 500
+
+# Memoria massima delle figure serializzate tenute in cache (vedi grafico_memorizzato)
+BUDGET_FIGURE_MB = float(os.environ.get("AMZSCOUT_FIGURE_MB", "64"))
+
+ETICHETTA_ALTRI = "Altri"
+COLORE_ALTRI = "lightgray"
+
+# Proprietà delle tracce che contengono un valore per punto e vanno filtrate insieme ai dati
+_PROPRIETA_PER_PUNTO = ["text", "hovertext", "customdata"]
+
+
+# Asse delle categorie e asse dei valori di una traccia
+def _assi(traccia):
+    if traccia.type == "pie":
+        return "labels", "values"
+    if getattr(traccia, "orientation", None) == "h":
+        return "y", "x"
+    return "x", "y"
+
+
+def _categorica(traccia):
+    if traccia.type in ("bar", "pie"):
+        return True
+    categorie, _ = _assi(traccia)
+    valori = getattr(traccia, categorie)
+    return valori is not None and len(valori) > 0 and not pd.api.types.is_numeric_dtype(pd.Series(valori).infer_objects())
+
+
+def _aggrega(valori, aggregazione):
+    valori = pd.to_numeric(pd.Series(valori), errors="coerce")
+    return valori.mean() if aggregazione == "mean" else valori.sum()
+
+
+# Tiene le prime categorie (nell'ordine in cui compaiono nelle tracce) e raggruppa le restanti in un'unica voce "Altri"
+def _limita_categorie(tracce, massimo_punti, aggregazione):
+    ordine = pd.unique(np.concatenate([np.asarray(getattr(traccia, _assi(traccia)[0]), dtype=object) for traccia in tracce]))
+    if len(ordine) <= massimo_punti:
+        return 0
+
+    tenute = pd.Index(ordine[:massimo_punti - 1])
+    scartati = 0
+    for traccia in tracce:
+        asse_categorie, asse_valori = _assi(traccia)
+        categorie = np.asarray(getattr(traccia, asse_categorie), dtype=object)
+        valori = getattr(traccia, asse_valori)
+        if valori is None:
+            continue
+        valori = np.asarray(valori, dtype=object)
+        mantieni = pd.Index(categorie).isin(tenute)
+        if mantieni.all():
+            continue
+
+        funzione = aggregazione.get(traccia.name, None) if isinstance(aggregazione, dict) else aggregazione
+        funzione = funzione or ("mean" if traccia.type == "scatter" else "sum")
+        resto = valori[~mantieni]
+        scartati += len(resto)
+
+        aggiornamenti = {
+            asse_categorie: list(categorie[mantieni]) + [ETICHETTA_ALTRI],
+            asse_valori: list(valori[mantieni]) + [_aggrega(resto, funzione)],
+        }
+        for proprieta in _PROPRIETA_PER_PUNTO:
+            _filtra_per_punto(getattr(traccia, proprieta, None), len(categorie), mantieni, aggiornamenti, proprieta)
+        if traccia.type != "pie":
+            _filtra_per_punto(traccia.marker.color, len(categorie), mantieni, aggiornamenti, "marker.color", COLORE_ALTRI)
+        for proprieta, nuovi in aggiornamenti.items():
+            traccia[proprieta] = nuovi
+    return scartati
+
+
+def _filtra_per_punto(valori, lunghezza, mantieni, aggiornamenti, proprieta, riempimento=None):
+    if valori is None or isinstance(valori, str) or np.ndim(valori) == 0 or len(valori) != lunghezza:
+        return
+    aggiornamenti[proprieta] = list(np.asarray(valori, dtype=object)[mantieni]) + [riempimento]
+
+
+# Tracce a linee/punti con asse x numerico: oltre il limite i punti vengono raggruppati in blocchi consecutivi
+# (media di x e y per blocco) e la traccia passa a WebGL (Scattergl)
+def _limita_numerica(traccia, massimo_punti):
+    import plotly.graph_objects as go
+
+    x = np.asarray(traccia.x, dtype="float64")
+    y = np.asarray(traccia.y, dtype="float64")
+    blocchi = np.array_split(np.arange(len(x)), massimo_punti)
+    proprieta = traccia.to_plotly_json()
+    proprieta.pop("type", None)
+    for nome in _PROPRIETA_PER_PUNTO:
+        proprieta.pop(nome, None)
+    proprieta["x"] = [np.nanmean(x[blocco]) for blocco in blocchi]
+    proprieta["y"] = [np.nanmean(y[blocco]) for blocco in blocchi]
+    try:
+        return go.Scattergl(proprieta), len(x) - len(blocchi)
+    except ValueError:
+        # Proprietà non supportate da Scattergl: si mantiene la traccia originale con i punti ridotti
+        return go.Scatter(proprieta), len(x) - len(blocchi)
+
+
+# Limita il numero di punti di ogni traccia della figura.
+# aggregazione ("sum" o "mean", oppure un dizionario nome traccia -> funzione) indica come riassumere
+# le categorie in eccesso; di default somma per barre e torte, media per linee.
+# Restituisce la figura (eventualmente nuova) e il numero di punti eliminati
+def limita_figura(fig, massimo_punti=MASSIMO_PUNTI_TRACCIA, aggregazione=None):
+    categoriche = [traccia for traccia in fig.data
+                   if traccia.type in ("bar", "scatter", "pie") and getattr(traccia, _assi(traccia)[0]) is not None
+                   and _categorica(traccia)]
+    scartati = _limita_categorie(categoriche, massimo_punti, aggregazione) if categoriche else 0
+    gia_limitate = {id(traccia) for traccia in categoriche}
+
+    tracce = []
+    sostituite = False
+    for traccia in fig.data:
+        if (traccia.type == "scatter" and id(traccia) not in gia_limitate and traccia.x is not None
+                and len(traccia.x) > massimo_punti):
+            traccia, eliminati = _limita_numerica(traccia, massimo_punti)
+            scartati += eliminati
+            sostituite = True
+        tracce.append(traccia)
+
+    if sostituite:
+        # Import locale: plotly.graph_objects non viene caricato all'avvio della dashboard
+        import plotly.graph_objects as go
+
+        fig = go.Figure(data=tracce, layout=fig.layout)
+    return fig, scartati
+
+
+# Sostituisce st.plotly_chart: limita i punti per traccia e indica quanti ne sono stati aggregati
+def mostra_grafico(fig, massimo_punti=MASSIMO_PUNTI_TRACCIA, aggregazione=None, **kwargs):
+    titolo = fig.layout.title.text or "grafico"
+    with profilazione.fase(f"limita_figura: {titolo}", "grafico"):
+        fig, scartati = limita_figura(fig, massimo_punti, aggregazione)
+    _invia(fig, titolo, scartati, massimo_punti, None, **kwargs)
+
+
+def _invia(fig, titolo, scartati, massimo_punti, byte, **kwargs):
+    # Import locale: limita_figura è usata anche dai report in batch, che non dipendono da Streamlit
+    import streamlit as st
+
+    if profilazione.corrente() is not None:
+        profilazione.payload("plotly_chart", titolo, byte if byte is not None else profilazione.byte_figura(fig))
+    with profilazione.fase(f"plotly_chart: {titolo}", "invio"):
+        st.plotly_chart(fig, **kwargs)
+    if scartati:
+        numero = f"{scartati:,}".replace(",", ".")
+        st.caption(f"{numero} punti oltre il limite di {massimo_punti} per traccia sono riassunti nella voce \"{ETICHETTA_ALTRI}\"")
+
+
+# Figure già limitate e serializzate in JSON, condivise da tutte le sessioni del processo.
+# Ogni figura è identificata dal nome del grafico e da una chiave con tutto ciò da cui dipende (impronta del dataset,
+# Top N, valori dei widget): a parità di chiave la figura non viene né ricostruita né limitata di nuovo.
+# Oltre il budget si eliminano le figure usate meno di recente
+class CacheFigure:
+
+    def __init__(self, budget_mb=BUDGET_FIGURE_MB):
+        self.budget_mb = budget_mb
+        self._voci = OrderedDict()
+        self._byte = 0
+        self._blocco = threading.Lock()
+        self.riusi = 0
+        self.costruzioni = 0
+
+    # JSON della figura (bytes) e punti scartati da limita_figura, None se la figura non è in cache
+    def leggi(self, chiave):
+        with self._blocco:
+            voce = self._voci.get(chiave)
+            if voce is None:
+                self.costruzioni += 1
+                return None
+            self._voci.move_to_end(chiave)
+            self.riusi += 1
+            return voce
+
+    def salva(self, chiave, spec, scartati):
+        with self._blocco:
+            precedente = self._voci.pop(chiave, None)
+            if precedente is not None:
+                self._byte -= len(precedente[0])
+            # Una figura più grande dell'intero budget non viene tenuta
+            if len(spec) > self.budget_mb * 2**20:
+                return
+            self._voci[chiave] = (spec, scartati)
+            self._byte += len(spec)
+            while self._byte > self.budget_mb * 2**20:
+                _, (eliminata, _) = self._voci.popitem(last=False)
+                self._byte -= len(eliminata)
+
+    # Figure presenti, memoria occupata, figure servite dalla cache e ricostruite
+    def stato(self):
+        with self._blocco:
+            return {"figure": len(self._voci), "mb": self._byte / 2**20, "budget_mb": self.budget_mb,
+                    "riusi": self.riusi, "costruzioni": self.costruzioni}
+
+
+# Una sola cache per processo, condivisa da tutte le sessioni
+cache_figure = CacheFigure()
+
+
+def _chiave_aggregazione(aggregazione):
+    return tuple(sorted(aggregazione.items())) if isinstance(aggregazione, dict) else aggregazione
+
+
+# Come mostra_grafico, ma la figura viene costruita (costruisci(*argomenti)) solo se non è già in cache con questa
+# chiave: la chiave deve cambiare quando cambia qualcosa da cui dipende la figura, come in sezioni.memorizza.
+# Dalla cache arriva il JSON già limitato, da cui si ricrea la figura da inviare a st.plotly_chart
+def grafico_memorizzato(nome, chiave, costruisci, *argomenti, massimo_punti=MASSIMO_PUNTI_TRACCIA, aggregazione=None,
+                        **kwargs):
+    chiave_cache = (nome, chiave, massimo_punti, _chiave_aggregazione(aggregazione))
+    voce = cache_figure.leggi(chiave_cache)
+    if voce is None:
+        with profilazione.fase(f"costruzione: {nome}", "grafico"):
+            fig = costruisci(*argomenti)
+        titolo = fig.layout.title.text or nome
+        with profilazione.fase(f"limita_figura: {titolo}", "grafico"):
+            fig, scartati = limita_figura(fig, massimo_punti, aggregazione)
+        with profilazione.fase(f"serializzazione: {titolo}", "grafico"):
+            spec = fig.to_json().encode()
+        cache_figure.salva(chiave_cache, spec, scartati)
+    else:
+        import plotly.graph_objects as go
+
+        spec, scartati = voce
+        with profilazione.fase(f"figura dalla cache: {nome}", "grafico"):
+            # Il JSON è stato prodotto da plotly a partire da una figura già validata: non serve validarlo di nuovo
+            fig = go.Figure(json.loads(spec), _validate=False)
+        titolo = fig.layout.title.text or nome
+    _invia(fig, titolo, scartati, massimo_punti, len(spec), **kwargs)
@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+import pandas as pd
+import plotly.express as px
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+import profilazione
+from aggregati import costruisci_aggregati, primi_n
+from modello_bsr import costruisci_modello
+from analisi import kpi, tabelle_analisi, tabella_recensioni, SEZIONI_ANALISI
+from ingestione import FORMATI_EXCEL, FORMATI_CSV, FORMATI_PARQUET
+from pulizia import carica_export_pulito
+from rendering import limita_figura
+from ricerca import IndiceRicerca
+
+# Generazione dei report a 30 giorni senza server Streamlit: per ogni export di una cartella
+# un report RISULTATO CATEGORIA e, per i brand richiesti, un report RISULTATO BRAND.
+# Ogni report è una cartella con kpi.json, una tabella CSV e un grafico statico per sezione,
+# oppure (--tabelle xlsx o parquet) il report completo scritto da esporta_report.
+# Uso: python report.py CARTELLA_EXPORT --uscita CARTELLA_REPORT [--brand NOME ...] [--top-brand 50] [--tabelle xlsx]
+
+ESTENSIONI_EXPORT = FORMATI_EXCEL + FORMATI_CSV + FORMATI_PARQUET
+
+# Numero di brand per ciascun lavoro inviato al pool: abbastanza da ammortizzare l'invio al processo
+BRAND_PER_LAVORO = 8
+
+COLORI_FULFILLMENT = {"FBA": "blue", "MCH/FBM": "lightgreen", "AMZ": "orange"}
+
+FORMATI_TABELLE = ["csv", "xlsx", "parquet"]
+
+# Righe di un foglio Excel, intestazione compresa: le tabelle più lunghe continuano nei fogli successivi
+RIGHE_FOGLIO = 1_048_576
+
+# Righe convertite e scritte per volta dal report completo: la memoria usata non cresce con la lunghezza della tabella
+RIGHE_PER_BLOCCO = 50_000
+
+# Tabelle intere che la dashboard mostra paginate, esportate nel report completo dopo quelle della sezione (senza grafico)
+TABELLE_INTERE = {"recensioni": {"Recensioni di tutti gli ASIN": tabella_recensioni}}
+
+
+# Export da elaborare: i file indicati e quelli con estensione supportata nelle cartelle indicate
+def trova_export(percorsi):
+    trovati = []
+    for percorso in percorsi:
+        if os.path.isdir(percorso):
+            trovati += sorted(os.path.join(percorso, nome) for nome in os.listdir(percorso)
+                              if os.path.splitext(nome)[1].lower() in ESTENSIONI_EXPORT)
+        else:
+            trovati.append(percorso)
+    return trovati
+
+
+def _nome_file(testo):
+    return re.sub(r"[^\w.-]+", "_", str(testo)).strip("_") or "_"
+
+
+# Dataset pulito, aggregazioni, indice delle marche e modello rank -> vendite, tenuti in memoria dal processo
+# che li ha caricati: i lavori successivi sullo stesso export nello stesso processo non li ricalcolano
+@lru_cache(maxsize=4)
+def _carica(percorso):
+    df_cleaned, _ = carica_export_pulito(percorso)
+    return (df_cleaned, costruisci_aggregati(df_cleaned), IndiceRicerca(df_cleaned["Marca"]),
+            costruisci_modello(df_cleaned))
+
+
+# Grafico di una tabella dell'analisi (nome come in analisi.tabelle_analisi)
+def figura(nome, tabella, n_top):
+    if nome == "Quote di mercato":
+        return px.pie(tabella.reset_index(), names=tabella.index.name, values="Market Share (%)",
+                      title=f"Quote di Mercato dei Top {n_top} {tabella.index.name}")
+    if nome == "Ripartizione fulfillment":
+        return px.pie(tabella.reset_index(), names="Venditore", values="Entrate stimate", title=nome,
+                      color="Venditore", color_discrete_map=COLORI_FULFILLMENT)
+    if nome == "Fatturato per fulfillment dei Top Brand":
+        return px.bar(tabella.reset_index(), x="Marca", y="Entrate stimate", color="Venditore", barmode="group",
+                      title=nome, color_discrete_map=COLORI_FULFILLMENT)
+    if nome == "Top ASIN by Sales Rank":
+        fig = px.bar(tabella, x="Piazzamento", y=tabella.index, orientation="h", title=nome)
+        return fig.update_layout(yaxis=dict(autorange="reversed"))
+    if nome == "Variazione BSR 30":
+        fig = px.bar(tabella, x="ASIN", y="Variazione %", title="Variazione % tra Piazzamento e BSR 30 per ASIN")
+        return fig.update_traces(marker=dict(color=["green" if valore < 0 else "red" for valore in tabella["Variazione %"]]))
+    if nome == "Entrate stimate e Recensioni":
+        return px.bar(tabella, x="ASIN", y=["Entrate stimate", "# di recensioni"], barmode="group", title=nome)
+    if nome.startswith("Conteggio"):
+        fig = px.bar(tabella, x=tabella.columns[0], y="Count", title=nome)
+        return fig.update_xaxes(categoryorder="total ascending")
+    return px.bar(tabella, x=tabella.index, y=tabella.columns[0], title=nome)
+
+
+# Salva la figura come immagine statica (richiede kaleido); senza kaleido come pagina HTML autonoma
+def salva_figura(fig, percorso_base, formato="png"):
+    if formato != "html":
+        try:
+            fig.write_image(f"{percorso_base}.{formato}")
+            return f"{percorso_base}.{formato}"
+        except (ValueError, ImportError):
+            pass
+    fig.write_html(f"{percorso_base}.html", include_plotlyjs="cdn")
+    return f"{percorso_base}.html"
+
+
+# L'indice (ASIN, Marca, ...) si scrive solo quando è una chiave e non una semplice numerazione
+def _con_indice(tabella):
+    return not isinstance(tabella.index, pd.RangeIndex)
+
+
+def _indicatori(df_cleaned):
+    return {nome: (valore.item() if hasattr(valore, "item") else valore) for nome, valore in kpi(df_cleaned).items()}
+
+
+# Grafico di una tabella dell'analisi, limitato nei punti come nella dashboard e salvato su disco
+def _salva_grafico(nome, tabella, n_top, percorso_base, formato):
+    fig, _ = limita_figura(figura(nome, tabella, n_top), aggregazione="mean" if nome == "Variazione BSR 30" else None)
+    return salva_figura(fig, percorso_base, formato)
+
+
+# Scrive un report (KPI, tabelle e grafici) nella cartella indicata e ne restituisce il riepilogo
+def scrivi_report(df_cleaned, aggregati, cartella, n_top=10, marche=None, formato="png", modello=None):
+    inizio = time.perf_counter()
+    os.makedirs(cartella, exist_ok=True)
+
+    indicatori = _indicatori(df_cleaned)
+    with open(os.path.join(cartella, "kpi.json"), "w", encoding="utf-8") as f:
+        json.dump(indicatori, f, ensure_ascii=False, indent=2)
+
+    for nome, tabella in tabelle_analisi(df_cleaned, aggregati, n_top, marche, modello).items():
+        percorso_base = os.path.join(cartella, _nome_file(nome))
+        tabella.to_csv(percorso_base + ".csv", index=_con_indice(tabella))
+        _salva_grafico(nome, tabella, n_top, percorso_base, formato)
+
+    return {"cartella": cartella, "righe": len(df_cleaned), "secondi": round(time.perf_counter() - inizio, 3), **indicatori}
+
+
+# Righe della tabella a blocchi di RIGHE_PER_BLOCCO, con l'indice come prime colonne se è una chiave.
+# Anche una tabella vuota dà un blocco, per scriverne le intestazioni
+def _blocchi(tabella):
+    indice = _con_indice(tabella)
+    for inizio in range(0, max(len(tabella), 1), RIGHE_PER_BLOCCO):
+        blocco = tabella.iloc[inizio:inizio + RIGHE_PER_BLOCCO]
+        yield blocco.reset_index() if indice else blocco
+
+
+# Cartella di lavoro Excel in modalità di sola scrittura: openpyxl scrive le righe di ogni foglio su un file
+# temporaneo man mano che arrivano e le comprime nel file .xlsx alla chiusura, senza tenerle in memoria
+class LibroExcel:
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self._libro = Workbook(write_only=True)
+        self._nomi = set()
+
+    # Nuovo foglio con le intestazioni. I nomi dei fogli hanno al massimo 31 caratteri, senza []:*?/\,
+    # e sono unici senza distinguere maiuscole e minuscole
+    def _foglio(self, nome, intestazioni):
+        base = re.sub(r"[\[\]:*?/\\]", "_", nome)[:31]
+        nome_foglio, numero = base, 1
+        while nome_foglio.lower() in self._nomi:
+            numero += 1
+            suffisso = f" ({numero})"
+            nome_foglio = base[:31 - len(suffisso)] + suffisso
+        self._nomi.add(nome_foglio.lower())
+        foglio = self._libro.create_sheet(nome_foglio)
+        foglio.append(intestazioni)
+        return foglio
+
+    def scrivi(self, nome, tabella):
+        foglio = None
+        for blocco in _blocchi(tabella):
+            if foglio is None:
+                intestazioni = [str(colonna) for colonna in blocco.columns]
+                foglio, righe = self._foglio(nome, intestazioni), 1
+            # Valori Python al posto di categorie e scalari numpy, celle vuote al posto di NaN e NaT
+            for riga in blocco.astype(object).where(blocco.notna(), None).itertuples(index=False, name=None):
+                if righe == RIGHE_FOGLIO:
+                    foglio, righe = self._foglio(nome, intestazioni), 1
+                foglio.append(riga)
+                righe += 1
+        return self.percorso
+
+    def chiudi(self):
+        self._libro.save(self.percorso)
+
+
+# Cartella con un file Parquet per tabella, scritto a gruppi di righe (uno per blocco)
+class CartellaParquet:
+
+    def __init__(self, cartella):
+        self.cartella = cartella
+        os.makedirs(cartella, exist_ok=True)
+
+    def scrivi(self, nome, tabella):
+        percorso = os.path.join(self.cartella, _nome_file(nome) + ".parquet")
+        scrittore = None
+        try:
+            for blocco in _blocchi(tabella):
+                if scrittore is None:
+                    # Lo schema del primo blocco vale per tutti: i blocchi successivi vi vengono convertiti
+                    schema = pa.Schema.from_pandas(blocco, preserve_index=False)
+                    scrittore = pq.ParquetWriter(percorso, schema)
+                scrittore.write_table(pa.Table.from_pandas(blocco, schema=schema, preserve_index=False))
+        finally:
+            if scrittore is not None:
+                scrittore.close()
+        return percorso
+
+    def chiudi(self):
+        pass
+
+
+# Report completo in un solo passaggio: KPI, tutte le tabelle delle sezioni (comprese quelle intere come la
+# variazione BSR 30 e TABELLE_INTERE) e un grafico statico per tabella di sezione. Le tabelle vanno in tabelle.xlsx,
+# un foglio per tabella, o nella cartella tabelle, un file Parquet per tabella; i grafici nella cartella grafici.
+# Le sezioni si calcolano una alla volta e le loro tabelle vengono scritte a blocchi di righe e rilasciate prima
+# della sezione successiva, quindi la memoria dipende dalla sezione più grande e non dall'intero report
+def esporta_report(df_cleaned, aggregati, cartella, n_top=10, marche=None, formato="png", modello=None, tabelle="xlsx"):
+    inizio = time.perf_counter()
+    cartella_grafici = os.path.join(cartella, "grafici")
+    os.makedirs(cartella_grafici, exist_ok=True)
+    if tabelle == "xlsx":
+        scrittore = LibroExcel(os.path.join(cartella, "tabelle.xlsx"))
+    elif tabelle == "parquet":
+        scrittore = CartellaParquet(os.path.join(cartella, "tabelle"))
+    else:
+        raise ValueError(f"Formato delle tabelle non supportato: {tabelle}")
+
+    indicatori = _indicatori(df_cleaned)
+    scrittore.scrivi("KPI", pd.DataFrame({"Indicatore": list(indicatori), "Valore": list(indicatori.values())}))
+    righe = {}
+    for sezione, calcolo in SEZIONI_ANALISI.items():
+        with profilazione.fase(f"report/sezione {sezione}", "sezione"):
+            for nome, tabella in calcolo(df_cleaned, aggregati, n_top, marche, modello).items():
+                scrittore.scrivi(nome, tabella)
+                _salva_grafico(nome, tabella, n_top, os.path.join(cartella_grafici, _nome_file(nome)), formato)
+                righe[nome] = len(tabella)
+            for nome, calcolo_intera in TABELLE_INTERE.get(sezione, {}).items():
+                tabella = calcolo_intera(df_cleaned)
+                scrittore.scrivi(nome, tabella)
+                righe[nome] = len(tabella)
+            # La tabella scritta per ultima non resta in memoria durante il calcolo della sezione successiva
+            tabella = None
+    with profilazione.fase("report/chiusura", "sezione"):
+        scrittore.chiudi()
+
+    return {"cartella": cartella, "righe": len(df_cleaned), "secondi": round(time.perf_counter() - inizio, 3),
+            "tabelle": righe, **indicatori}
+
+
+# Archivio zip di una cartella, letto file per file dal disco
+def comprimi(cartella, percorso_zip):
+    with zipfile.ZipFile(percorso_zip, "w", zipfile.ZIP_DEFLATED) as archivio:
+        for radice, _, nomi in os.walk(cartella):
+            for nome in sorted(nomi):
+                percorso = os.path.join(radice, nome)
+                archivio.write(percorso, os.path.relpath(percorso, cartella))
+    return percorso_zip
+
+
+# Funzione che scrive un report: CSV separati (scrivi_report) o report completo in Excel o Parquet (esporta_report)
+def _scrittore_report(tabelle):
+    return scrivi_report if tabelle == "csv" else partial(esporta_report, tabelle=tabelle)
+
+
+# Lavoro eseguito nel pool: report RISULTATO CATEGORIA di un export.
+# Restituisce anche i primi top_brand brand per fatturato, per i report RISULTATO BRAND successivi
+def _report_categoria(percorso, cartella_uscita, n_top, formato, top_brand, tabelle="csv"):
+    df_cleaned, aggregati, _, modello = _carica(percorso)
+    cartella = os.path.join(cartella_uscita, _nome_file(os.path.splitext(os.path.basename(percorso))[0]))
+    riepilogo = _scrittore_report(tabelle)(df_cleaned, aggregati, os.path.join(cartella, "categoria"), n_top,
+                                           formato=formato, modello=modello)
+    primi_brand = list(primi_n(aggregati["Marca"]["sum"], top_brand, "Entrate stimate").index) if top_brand else []
+    return {"export": percorso, "tipo": "categoria", **riepilogo}, primi_brand
+
+
+# Lavoro eseguito nel pool: report RISULTATO BRAND per un gruppo di brand dello stesso export
+def _report_brand(percorso, marche, cartella_uscita, n_top, formato, tabelle="csv"):
+    df_cleaned, aggregati, indice, modello = _carica(percorso)
+    identificativi = {marca: identificativo for identificativo, marca in enumerate(indice.distinti)}
+    cartella = os.path.join(cartella_uscita, _nome_file(os.path.splitext(os.path.basename(percorso))[0]))
+
+    riepiloghi = []
+    for marca in marche:
+        if marca not in identificativi:
+            riepiloghi.append({"export": percorso, "tipo": "brand", "brand": marca, "errore": "brand non presente"})
+            continue
+        righe = df_cleaned.iloc[indice.righe_di([identificativi[marca]])]
+        riepilogo = _scrittore_report(tabelle)(righe, aggregati, os.path.join(cartella, "brand_" + _nome_file(marca)),
+                                               n_top, marche=[marca], formato=formato, modello=modello)
+        riepiloghi.append({"export": percorso, "tipo": "brand", "brand": marca, **riepilogo})
+    return riepiloghi
+
+
+# Genera i report di tutti gli export su più processi (di default uno per core).
+# brand: nomi esatti dei brand da analizzare in ogni export; top_brand: in più, i primi N brand per fatturato;
+# tabelle: csv per le tabelle separate, xlsx o parquet per il report completo
+def genera_report(percorsi, cartella_uscita, brand=(), top_brand=0, n_top=10, formato="png", processi=None, tabelle="csv"):
+    inizio = time.perf_counter()
+    export = trova_export(percorsi)
+    riepiloghi = []
+
+    with ProcessPoolExecutor(max_workers=processi) as pool:
+        # Prima fase: un lavoro per export (lettura, pulizia, cache su disco e report di categoria)
+        lavori = [pool.submit(_report_categoria, percorso, cartella_uscita, n_top, formato, top_brand, tabelle)
+                  for percorso in export]
+        brand_per_export = {}
+        for percorso, lavoro in zip(export, lavori):
+            riepilogo, primi_brand = lavoro.result()
+            riepiloghi.append(riepilogo)
+            brand_per_export[percorso] = list(dict.fromkeys(list(brand) + primi_brand))
+
+        # Seconda fase: i report per brand, a gruppi, distribuiti su tutti i processi.
+        # Ogni export è già nella cache su disco, quindi i processi lo rileggono senza ripulirlo
+        lavori = [pool.submit(_report_brand, percorso, marche[i:i + BRAND_PER_LAVORO], cartella_uscita, n_top, formato,
+                              tabelle)
+                  for percorso, marche in brand_per_export.items()
+                  for i in range(0, len(marche), BRAND_PER_LAVORO)]
+        for lavoro in lavori:
+            riepiloghi += lavoro.result()
+
+    os.makedirs(cartella_uscita, exist_ok=True)
+    with open(os.path.join(cartella_uscita, "riepilogo.json"), "w", encoding="utf-8") as f:
+        json.dump({"secondi": round(time.perf_counter() - inizio, 3), "report": riepiloghi}, f,
+                  ensure_ascii=False, indent=2, default=str)
+    return riepiloghi
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report AMZScout a 30 giorni senza interfaccia")
+    parser.add_argument("export", nargs="+", help="file di export o cartelle che li contengono")
+    parser.add_argument("--uscita", required=True, help="cartella in cui scrivere i report")
+    parser.add_argument("--brand", action="append", default=[], help="brand da analizzare (ripetibile)")
+    parser.add_argument("--top-brand", type=int, default=0, help="analizza anche i primi N brand per fatturato")
+    parser.add_argument("--top-n", type=int, default=10, help="elementi nelle classifiche")
+    parser.add_argument("--formato", default="png", help="formato dei grafici (png, svg, pdf, html)")
+    parser.add_argument("--tabelle", default="csv", choices=FORMATI_TABELLE,
+                        help="csv: una tabella per file; xlsx o parquet: report completo con tutte le tabelle")
+    parser.add_argument("--processi", type=int, default=None, help="processi in parallelo (default: uno per core)")
+    argomenti = parser.parse_args()
+
+    report = genera_report(argomenti.export, argomenti.uscita, argomenti.brand, argomenti.top_brand,
+                           argomenti.top_n, argomenti.formato, argomenti.processi, argomenti.tabelle)
+    errori = [voce for voce in report if "errore" in voce]
+    print(f"{len(report) - len(errori)} report scritti in {argomenti.uscita}")
+    for voce in errori:
+        print(f"  {voce['export']}: {voce['brand']}: {voce['errore']}")
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Modalità di ricerca: sottostringa (come str.contains), inizio del nome, somiglianza per trigrammi
+CONTIENE = "Contiene"
+INIZIA_CON = "Inizia con"
+SIMILE = "Simile"
+MODALITA = [CONTIENE, INIZIA_CON, SIMILE]
+
+# Somiglianza minima (indice di Jaccard sui trigrammi) per la ricerca approssimata
+SOGLIA_SIMILITUDINE = 0.3
+
+
+# Maiuscole e minuscole si confrontano come in str.contains(case=False, regex=False), che usa upper()
+# (es. "ß" diventa "SS"): così Contiene trova esattamente le stesse righe
+def _normalizza(testo):
+    return str(testo).upper()
+
+
+def _trigrammi(testo):
+    return {testo[i:i + 3] for i in range(len(testo) - 2)}
+
+
+# Indice di ricerca sui valori distinti di una colonna testuale (es. Marca o Nome prodotto).
+# Ogni valore distinto viene scomposto in trigrammi (con spazi ai bordi, per dare peso a inizio e fine);
+# per ogni trigramma si tengono gli identificativi dei valori che lo contengono.
+# Una ricerca legge solo le liste dei trigrammi del testo cercato invece di scorrere tutte le righe,
+# poi le righe corrispondenti si ottengono per posizione
+class IndiceRicerca:
+
+    def __init__(self, valori):
+        codici, distinti = pd.factorize(pd.Series(valori).astype(object), use_na_sentinel=True)
+        self.distinti = np.asarray(distinti, dtype=object)
+        self.normalizzati = np.array([_normalizza(valore) for valore in self.distinti], dtype=object)
+
+        # Righe raggruppate per valore distinto: le righe del valore i sono ordine[confini[i]:confini[i + 1]]
+        validi = np.flatnonzero(codici >= 0)
+        self.ordine = validi[np.argsort(codici[validi], kind="stable")]
+        self.confini = np.searchsorted(codici[self.ordine], np.arange(len(self.distinti) + 1))
+
+        liste = {}
+        self.numero_trigrammi = np.zeros(len(self.distinti), dtype=np.int32)
+        for identificativo, testo in enumerate(self.normalizzati):
+            trigrammi = _trigrammi(f"  {testo} ")
+            self.numero_trigrammi[identificativo] = len(trigrammi)
+            for trigramma in trigrammi:
+                liste.setdefault(trigramma, []).append(identificativo)
+        self.liste = {trigramma: np.array(identificativi, dtype=np.int32) for trigramma, identificativi in liste.items()}
+
+        # Valori normalizzati in ordine alfabetico per la ricerca per prefisso con ricerca binaria
+        self.alfabetico = np.argsort(self.normalizzati.astype(str), kind="stable")
+        self.normalizzati_ordinati = self.normalizzati[self.alfabetico].astype(str)
+
+    def __len__(self):
+        return len(self.distinti)
+
+    # Quanti trigrammi del testo compaiono in ciascun valore distinto
+    def _condivisi(self, trigrammi):
+        liste = [self.liste[trigramma] for trigramma in trigrammi if trigramma in self.liste]
+        if not liste:
+            return np.zeros(len(self.distinti), dtype=np.int64)
+        return np.bincount(np.concatenate(liste), minlength=len(self.distinti))
+
+    def _contiene(self, testo):
+        trigrammi = _trigrammi(testo)
+        if trigrammi:
+            # Candidati: i valori che contengono tutti i trigrammi del testo; la verifica finale esclude i falsi positivi
+            candidati = np.flatnonzero(self._condivisi(trigrammi) == len(trigrammi))
+        else:
+            # Testo di una o due lettere: non ha trigrammi, si verifica su tutti i valori distinti
+            candidati = np.arange(len(self.distinti))
+        return np.array([identificativo for identificativo in candidati if testo in self.normalizzati[identificativo]],
+                        dtype=np.int64)
+
+    def _inizia_con(self, testo):
+        inizio = np.searchsorted(self.normalizzati_ordinati, testo, side="left")
+        fine = np.searchsorted(self.normalizzati_ordinati, testo + "\U0010ffff", side="left")
+        return np.sort(self.alfabetico[inizio:fine])
+
+    def _simile(self, testo, soglia):
+        trigrammi = _trigrammi(f"  {testo} ")
+        condivisi = self._condivisi(trigrammi)
+        unione = self.numero_trigrammi + len(trigrammi) - condivisi
+        punteggi = np.divide(condivisi, unione, out=np.zeros(len(condivisi)), where=unione > 0)
+        trovati = np.flatnonzero(punteggi >= soglia)
+        # Dal più simile al meno simile
+        return trovati[np.argsort(-punteggi[trovati], kind="stable")]
+
+    # Identificativi dei valori distinti che corrispondono al testo cercato (senza distinzione tra maiuscole e minuscole)
+    def identificativi(self, testo, modalita=CONTIENE, soglia=SOGLIA_SIMILITUDINE):
+        testo = _normalizza(testo)
+        if modalita == CONTIENE:
+            return self._contiene(testo)
+        if modalita == INIZIA_CON:
+            return self._inizia_con(testo)
+        if modalita == SIMILE:
+            return self._simile(testo, soglia)
+        raise ValueError(f"Modalità di ricerca non valida: {modalita}")
+
+    # Valori distinti trovati (es. i nomi delle marche)
+    def valori(self, testo, modalita=CONTIENE, soglia=SOGLIA_SIMILITUDINE):
+        return pd.Index(self.distinti[self.identificativi(testo, modalita, soglia)])
+
+    # Posizioni (crescenti) delle righe il cui valore corrisponde al testo cercato, da usare con df.iloc
+    def righe(self, testo, modalita=CONTIENE, soglia=SOGLIA_SIMILITUDINE):
+        return self.righe_di(self.identificativi(testo, modalita, soglia))
+
+    def righe_di(self, identificativi):
+        if len(identificativi) == 0:
+            return np.empty(0, dtype=np.int64)
+        blocchi = [self.ordine[self.confini[i]:self.confini[i + 1]] for i in identificativi]
+        return np.sort(np.concatenate(blocchi))
@@ -0,0 +1,128 @@
+import functools
+import logging
+import time
+
+import pandas as pd
+import streamlit as st
+
+import profilazione
+from registro_dati import registro as registro_dataset
+from rendering import cache_figure
+
+# I tempi delle interazioni finiscono nel log del server (stderr se non è configurato altrimenti)
+registro = logging.getLogger("amzscout.interazioni")
+if not registro.handlers:
+    _gestore = logging.StreamHandler()
+    _gestore.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    registro.addHandler(_gestore)
+    registro.setLevel(logging.INFO)
+
+# Frammenti: una funzione decorata viene rieseguita da sola quando cambia un widget al suo interno,
+# senza rieseguire lo script. st.fragment da Streamlit 1.37, st.experimental_fragment da 1.33;
+# con versioni precedenti le sezioni restano normali funzioni e ogni widget riesegue tutto lo script
+_frammento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+FRAMMENTI_DISPONIBILI = _frammento is not None
+
+# Ultimi tempi di risposta alle interazioni tenuti nella sessione
+MASSIMO_TEMPI = 50
+
+# Sezioni della dashboard calcolate solo se aperte: l'intestazione resta sempre visibile,
+# i calcoli e i grafici della sezione vengono eseguiti solo quando l'interruttore "Mostra" è attivo.
+# Lo stato di ogni sezione resta nella sessione (chiave "sezione_<chiave>")
+def sezione(titolo, chiave, aperta=False):
+    st.subheader(titolo, divider="orange")
+    return st.toggle("Mostra", value=aperta, key=f"sezione_{chiave}")
+
+
+# Risultato di un calcolo memorizzato per nome e chiave: il nome identifica il calcolo (funzione e argomenti fissi),
+# la chiave il dataset e lo stato dei filtri da cui dipende il risultato (es. impronta del file, brand cercato,
+# marche selezionate). Le funzioni e gli argomenti passati non vengono hashati
+@st.cache_resource(max_entries=256)
+def _memorizzato(nome, chiave, _calcolo, _argomenti):
+    return _calcolo(*_argomenti)
+
+
+def memorizza(nome, chiave, calcolo, *argomenti):
+    with profilazione.fase(nome, "calcolo"):
+        return _memorizzato(nome, chiave, calcolo, argomenti)
+
+
+# Callback on_change dei widget: segna quale widget è cambiato, in quale sezione e quando
+def segna_interazione(widget, sezione=None):
+    st.session_state["_interazione"] = (widget, sezione, time.perf_counter())
+
+
+# Registra il tempo tra la modifica del widget e la fine del rerun che ne è seguito.
+# Chiamata alla fine di ogni frammento (per i widget della sua sezione) e alla fine dello script (per tutti gli altri)
+def registra_interazione(sezione=None):
+    interazione = st.session_state.get("_interazione")
+    if interazione is None:
+        return
+    widget, sezione_widget, inizio = interazione
+    if sezione is not None and sezione != sezione_widget:
+        return
+    del st.session_state["_interazione"]
+
+    ambito = f"frammento {sezione}" if sezione is not None else "script intero"
+    secondi = time.perf_counter() - inizio
+    registro.info("%s: rerun (%s) in %.3f s", widget, ambito, secondi)
+    tempi = st.session_state.setdefault("tempi_interazioni", [])
+    tempi.append({"widget": widget, "ambito": ambito, "secondi": secondi})
+    del tempi[:-MASSIMO_TEMPI]
+
+
+# Decoratore per il corpo di una sezione: la rende un frammento (se disponibile) e ne registra i tempi di rerun
+def frammento(sezione):
+    def decoratore(funzione):
+        @functools.wraps(funzione)
+        def eseguita(*args, **kwargs):
+            with profilazione.fase(f"sezione {sezione}", "sezione"):
+                funzione(*args, **kwargs)
+            if FRAMMENTI_DISPONIBILI:
+                registra_interazione(sezione)
+        return _frammento(eseguita) if FRAMMENTI_DISPONIBILI else eseguita
+    return decoratore
+
+
+# Profilazione dell'esecuzione corrente, attivata dal pannello di debug nella barra laterale
+# (o di default con la variabile d'ambiente AMZSCOUT_PROFILAZIONE=1). Va chiamata all'inizio dello script
+def avvia_profilazione():
+    if st.session_state.get("profilazione", profilazione.ATTIVA_DI_DEFAULT):
+        return profilazione.avvia()
+    profilazione.termina()
+    return None
+
+
+# Pannello di debug alla fine dello script: tempi per fase e per sezione, picchi di memoria, byte inviati
+# al browser da ogni grafico e tabella, con l'esportazione in JSON e in formato trace (chrome://tracing, Perfetto)
+def pannello_profilazione():
+    profilatore = profilazione.termina()
+    with st.sidebar.expander("Debug"):
+        stato = registro_dataset.stato()
+        st.caption("Dataset condivisi nel processo: {} ({:.0f} MB su un budget di {:.0f} MB), {} in uso".format(
+            stato["dataset"], stato["mb"], stato["budget_mb"], stato["in_uso"]))
+        stato = cache_figure.stato()
+        st.caption("Figure in cache: {} ({:.1f} MB su un budget di {:.0f} MB), {} servite dalla cache e {} costruite".format(
+            stato["figure"], stato["mb"], stato["budget_mb"], stato["riusi"], stato["costruzioni"]))
+        st.toggle("Profilazione", value=profilazione.ATTIVA_DI_DEFAULT, key="profilazione")
+        if profilatore is None:
+            st.caption("Attiva la profilazione per misurare la prossima esecuzione")
+            return
+
+        riepilogo = profilatore.riepilogo()
+        st.caption("Esecuzione in {:.2f} s, {:,} byte inviati al browser".format(
+            riepilogo["secondi"], riepilogo["payload_byte"]).replace(",", "."))
+        if riepilogo["picco_memoria_mb"] is not None:
+            st.caption("Picco di memoria allocata durante l'esecuzione {:.1f} MB".format(riepilogo["picco_memoria_mb"]))
+        if riepilogo["picco_processo_mb"] is not None:
+            st.caption("Picco di memoria del processo {:.0f} MB".format(riepilogo["picco_processo_mb"]))
+
+        fasi = pd.DataFrame(riepilogo["fasi"], columns=["nome", "categoria", "secondi", "picco_mb"])
+        st.dataframe(fasi.sort_values("secondi", ascending=False), hide_index=True)
+        if riepilogo["payload"]:
+            st.dataframe(pd.DataFrame(riepilogo["payload"]).sort_values("byte", ascending=False), hide_index=True)
+
+        st.download_button("Esporta JSON", profilatore.esporta_json(interazioni=st.session_state.get("tempi_interazioni", [])),
+                           file_name="profilazione.json", mime="application/json")
+        st.download_button("Esporta traccia", profilatore.esporta_traccia(),
+                           file_name="profilazione.trace.json", mime="application/json")
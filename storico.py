@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Storico delle fotografie giornaliere degli export, per seguire Sales rank e vendite di un ASIN nel tempo.
+# Struttura su disco (solo aggiunte, i file scritti non vengono mai riscritti):
+#   <cartella>/manifesto.jsonl                        una riga per export aggiunto (data, impronta, righe)
+#   <cartella>/data=2024-05-01/parte=07/<hash dell'impronta>.arrow
+# Ogni data è divisa in NUMERO_PARTI partizioni per ASIN (hash dell'ASIN); dentro ciascun file le righe
+# sono ordinate per ASIN, quindi la storia di un ASIN si legge aprendo una sola partizione per data
+# e cercando l'ASIN con una ricerca binaria
+CARTELLA_STORICO = os.environ.get("AMZSCOUT_STORICO_DIR", os.path.join(tempfile.gettempdir(), "amzscout_storico"))
+NUMERO_PARTI = 32
+MANIFESTO = "manifesto.jsonl"
+ESTENSIONE = ".arrow"
+
+# ASIN di cui la dashboard mostra l'andamento: una traccia per ASIN, quindi indipendente dal Top N delle classifiche
+MASSIMO_TRAIETTORIE = 15
+
+COLONNE_STORICO = ["ASIN", "Marca", "Categoria", "Piazzamento", "BSR 30", "Vendite stimate", "Entrate stimate", "Prezzo"]
+
+
+def parte_asin(asin):
+    # crc32 e non hash(): deve dare lo stesso risultato in ogni processo e a ogni avvio
+    return zlib.crc32(str(asin).encode()) % NUMERO_PARTI
+
+
+def _cartella_parte(cartella, data, parte):
+    return os.path.join(cartella, f"data={data}", f"parte={parte:02d}")
+
+
+def _leggi_manifesto(cartella):
+    try:
+        with open(os.path.join(cartella, MANIFESTO), encoding="utf-8") as f:
+            return [json.loads(riga) for riga in f if riga.strip()]
+    except FileNotFoundError:
+        return []
+
+
+# Date (in formato ISO) presenti nello storico, in ordine crescente
+def date_disponibili(cartella=CARTELLA_STORICO):
+    return sorted({voce["data"] for voce in _leggi_manifesto(cartella)})
+
+
+def contiene(impronta_file, data, cartella=CARTELLA_STORICO):
+    return any(voce["impronta"] == impronta_file and voce["data"] == str(data) for voce in _leggi_manifesto(cartella))
+
+
+# Nome del file di una fotografia: hash dell'impronta completa, che per più file caricati insieme è "A+B"
+# (un prefisso dell'impronta coinciderebbe con quello del solo export A)
+def _nome_fotografia(impronta_file):
+    return hashlib.sha256(impronta_file.encode()).hexdigest() + ESTENSIONE
+
+
+# Scrive il file senza mai sostituirne uno esistente: il file temporaneo viene collegato al nome definitivo
+# (os.link fallisce se il nome esiste già). Restituisce False se il file c'era già
+def _scrivi(tabella, percorso):
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    descrittore, temporaneo = tempfile.mkstemp(dir=os.path.dirname(percorso), suffix=".tmp")
+    try:
+        with os.fdopen(descrittore, "wb") as f:
+            with ipc.new_file(f, tabella.schema) as scrittore:
+                scrittore.write_table(tabella)
+        os.chmod(temporaneo, 0o644)
+        os.link(temporaneo, percorso)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(temporaneo)
+
+
+# Aggiunge allo storico la fotografia di un export pulito alla data indicata (di default oggi).
+# Un export già aggiunto per la stessa data viene ignorato; più export nella stessa data (es. categorie diverse)
+# vanno in file separati della stessa partizione. I file già scritti non vengono sostituiti: con lo stesso nome
+# (stessa impronta e data) contengono la stessa fotografia, lasciata da un'aggiunta interrotta prima del manifesto.
+# Restituisce il numero di righe scritte
+def aggiungi_snapshot(df_cleaned, impronta_file, data=None, nome=None, cartella=CARTELLA_STORICO):
+    data = str(data or date.today())
+    if contiene(impronta_file, data, cartella):
+        return 0
+
+    colonne = [colonna for colonna in COLONNE_STORICO if colonna in df_cleaned.columns]
+    fotografia = df_cleaned[colonne].dropna(subset=["ASIN"])
+    fotografia = fotografia.assign(ASIN=fotografia["ASIN"].astype(str))
+    parti = np.fromiter((parte_asin(asin) for asin in fotografia["ASIN"]), dtype=np.int32, count=len(fotografia))
+
+    nome_file = _nome_fotografia(impronta_file)
+    for parte in np.unique(parti):
+        righe = fotografia[parti == parte].sort_values("ASIN", kind="stable")
+        tabella = pa.Table.from_pandas(righe, preserve_index=False)
+        _scrivi(tabella, os.path.join(_cartella_parte(cartella, data, parte), nome_file))
+
+    # Il manifesto si aggiorna per ultimo: un'aggiunta interrotta a metà viene semplicemente ripetuta
+    with open(os.path.join(cartella, MANIFESTO), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"data": data, "impronta": impronta_file, "nome": nome, "righe": len(fotografia)}) + "\n")
+    return len(fotografia)
+
+
+# Righe dell'ASIN in un file della partizione, trovate con una ricerca binaria sulla colonna ASIN ordinata
+def _righe_asin(tabella, asin):
+    colonna = tabella.column("ASIN")
+    posizioni = range(len(colonna))
+    inizio = bisect_left(posizioni, asin, key=lambda i: colonna[i].as_py())
+    fine = bisect_right(posizioni, asin, lo=inizio, key=lambda i: colonna[i].as_py())
+    return tabella.slice(inizio, fine - inizio)
+
+
+# Storia degli ASIN indicati: una riga per ASIN e data, con Sales rank, BSR 30, vendite e entrate stimate.
+# Per ogni data si aprono (mappandoli in memoria) solo i file delle partizioni degli ASIN cercati
+def traiettorie(asin, cartella=CARTELLA_STORICO, dal=None, al=None):
+    asin = sorted({str(valore) for valore in asin})
+    per_parte = {}
+    for valore in asin:
+        per_parte.setdefault(parte_asin(valore), []).append(valore)
+
+    risultati = []
+    for data in date_disponibili(cartella):
+        if (dal is not None and data < str(dal)) or (al is not None and data > str(al)):
+            continue
+        for parte, valori in per_parte.items():
+            cartella_parte = _cartella_parte(cartella, data, parte)
+            if not os.path.isdir(cartella_parte):
+                continue
+            for voce in os.scandir(cartella_parte):
+                if not voce.name.endswith(ESTENSIONE):
+                    continue
+                with pa.memory_map(voce.path, "r") as sorgente:
+                    tabella = ipc.open_file(sorgente).read_all()
+                    trovate = [_righe_asin(tabella, valore) for valore in valori]
+                    trovate = [righe for righe in trovate if righe.num_rows]
+                    if trovate:
+                        # Le righe trovate nello stesso file hanno lo stesso schema: una sola conversione per file
+                        righe = pa.concat_tables(trovate).to_pandas()
+                        risultati.append(righe.assign(Data=pd.Timestamp(data)))
+
+    if not risultati:
+        return pd.DataFrame(columns=["Data"] + COLONNE_STORICO)
+    storia = pd.concat(risultati, ignore_index=True)
+    # Due export della stessa data con lo stesso ASIN: vale il primo
+    storia = storia.drop_duplicates(subset=["ASIN", "Data"]).sort_values(["ASIN", "Data"], ignore_index=True)
+    return storia[["Data"] + [colonna for colonna in COLONNE_STORICO if colonna in storia.columns]]
+
+
+# Uso:
+#   python storico.py aggiungi export.xlsx [--data 2024-05-01]
+#   python storico.py asin B0B74RSBQZ [altro ASIN ...]
+if __name__ == "__main__":
+    from cache_disco import impronta
+    from pulizia import carica_export_pulito
+
+    parser = argparse.ArgumentParser(description="Storico delle fotografie giornaliere degli export")
+    comandi = parser.add_subparsers(dest="comando", required=True)
+    aggiungi = comandi.add_parser("aggiungi", help="aggiunge uno o più export allo storico")
+    aggiungi.add_argument("export", nargs="+")
+    aggiungi.add_argument("--data", default=None, help="data della fotografia (AAAA-MM-GG, default oggi)")
+    cerca = comandi.add_parser("asin", help="mostra la storia degli ASIN indicati")
+    cerca.add_argument("asin", nargs="+")
+    argomenti = parser.parse_args()
+
+    if argomenti.comando == "aggiungi":
+        for percorso in argomenti.export:
+            impronta_file = impronta(percorso)
+            df_cleaned, _ = carica_export_pulito(percorso, impronta_file=impronta_file)
+            righe = aggiungi_snapshot(df_cleaned, impronta_file, argomenti.data, os.path.basename(percorso))
+            print(f"{percorso}: {righe:,} righe aggiunte" if righe else f"{percorso}: già presente per questa data")
+    else:
+        print(traiettorie(argomenti.asin).to_string(index=False))
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import profilazione
+
+# Dimensioni di pagina ammesse: al browser non vengono mai inviate più righe di così per tabella
+DIMENSIONI_PAGINA = [25, 50, 100, 250, 500]
+
+NESSUN_ORDINAMENTO = "—"
+
+FORMATO_DATA = "%d/%m/%Y"
+
+
+# Colonna limitata alle righe della tabella (posizioni in df, tutte se None)
+def _colonna(df, colonna, righe):
+    return df[colonna] if righe is None else df[colonna].take(righe)
+
+
+# Ordine delle righe (posizioni tra le righe della tabella) per colonna e direzione, calcolato una volta per tabella
+# e riusato a ogni rerun. chiave_dati identifica il contenuto della tabella (dataset + filtri applicati):
+# _df e _righe non vengono hashati
+@st.cache_resource(max_entries=64)
+def _ordine(chiave_dati, colonna, crescente, _df, _righe):
+    valori = _colonna(_df, colonna, _righe).reset_index(drop=True)
+    try:
+        ordinati = valori.sort_values(ascending=crescente, kind="stable", na_position="last")
+    except TypeError:
+        # Colonne con tipi misti (es. numeri e testo): si ordinano come testo
+        ordinati = valori.astype(str).sort_values(ascending=crescente, kind="stable", na_position="last")
+    return ordinati.index.to_numpy()
+
+
+# Testo su cui cercare: tutte le colonne testuali di ogni riga concatenate e in minuscolo, calcolato una volta per tabella
+@st.cache_resource(max_entries=64)
+def _testo_ricerca(chiave_dati, _df, _colonne, _righe):
+    # Tipi delle colonne mostrate, letti da una selezione vuota per non copiarne i valori
+    testuali = _df.iloc[:0][_colonne].select_dtypes(include=["object", "string", "category"]).columns
+    if len(testuali) == 0:
+        return None
+    testo = _colonna(_df, testuali[0], _righe).astype(str)
+    for colonna in testuali[1:]:
+        testo = testo.str.cat(_colonna(_df, colonna, _righe).astype(str), sep="\x1f")
+    return testo.str.lower().reset_index(drop=True)
+
+
+# Tabella paginata: ordinamento e ricerca avvengono lato server sugli indici precalcolati
+# e a st.dataframe arriva solo la pagina visibile.
+# colonne e righe (posizioni) scelgono la parte di df mostrata senza copiarla: dal DataFrame si estrae solo la pagina.
+# nome distingue i widget di tabelle diverse, chiave_dati deve cambiare quando cambia il contenuto mostrato
+def tabella_paginata(df, nome, chiave_dati, ordina_per=None, crescente=True, colonne=None, righe=None):
+    colonne = list(df.columns) if colonne is None else list(colonne)
+    righe = None if righe is None else np.asarray(righe)
+    col_ordina, col_verso, col_cerca, col_righe, col_pagina = st.columns([3, 2, 3, 2, 2])
+
+    with col_ordina:
+        opzioni = [NESSUN_ORDINAMENTO] + colonne
+        colonna = st.selectbox("Ordina per", opzioni, index=opzioni.index(ordina_per) if ordina_per in colonne else 0,
+                               key=f"{nome}_ordina")
+    with col_verso:
+        crescente = st.toggle("Crescente", value=crescente, key=f"{nome}_crescente")
+    with col_cerca:
+        ricerca = st.text_input("Cerca", key=f"{nome}_cerca")
+    with col_righe:
+        righe_per_pagina = st.selectbox("Righe", DIMENSIONI_PAGINA, key=f"{nome}_righe")
+
+    chiave = (chiave_dati, nome)
+    if colonna == NESSUN_ORDINAMENTO:
+        posizioni = pd.RangeIndex(len(df) if righe is None else len(righe)).to_numpy()
+    else:
+        posizioni = _ordine(chiave, colonna, crescente, df, righe)
+
+    if ricerca:
+        testo = _testo_ricerca(chiave, df, colonne, righe)
+        if testo is not None:
+            trovate = testo.str.contains(ricerca.lower(), regex=False).to_numpy()
+            posizioni = posizioni[trovate[posizioni]]
+
+    totale = len(posizioni)
+    pagine = max(1, -(-totale // righe_per_pagina))
+
+    with col_pagina:
+        # Se i filtri riducono le pagine, la pagina corrente viene riportata nell'intervallo valido
+        if st.session_state.get(f"{nome}_pagina", 1) > pagine:
+            st.session_state[f"{nome}_pagina"] = pagine
+        pagina = st.number_input("Pagina", min_value=1, max_value=pagine, step=1, key=f"{nome}_pagina")
+
+    inizio = (pagina - 1) * righe_per_pagina
+    fine = min(inizio + righe_per_pagina, totale)
+    visibili = posizioni[inizio:fine]
+    pagina_corrente = df.iloc[visibili if righe is None else righe[visibili], df.columns.get_indexer(colonne)]
+
+    # Le date sono tenute come datetime e formattate solo per le righe mostrate
+    date = pagina_corrente.select_dtypes(include="datetime").columns
+    if len(date):
+        pagina_corrente = pagina_corrente.assign(**{colonna: pagina_corrente[colonna].dt.strftime(FORMATO_DATA)
+                                                    for colonna in date})
+    if profilazione.corrente() is not None:
+        profilazione.payload("dataframe", nome, profilazione.byte_tabella(pagina_corrente))
+    with profilazione.fase(f"dataframe: {nome}", "invio"):
+        st.dataframe(pagina_corrente)
+    st.caption(f"Righe {inizio + 1 if totale else 0}–{fine} di {totale:,}".replace(",", "."))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregati import primi_n
+
+
+def _atteso(tabella, n, colonna, crescente, righe=None):
+    if righe is not None:
+        tabella = tabella.iloc[righe]
+    # Riferimento: ordinamento stabile (a parità di valore resta prima la riga precedente), senza i valori mancanti
+    return tabella.dropna(subset=[colonna]).sort_values(colonna, ascending=crescente, kind="stable").head(n)
+
+
+def _tabella(righe, seme):
+    casuale = np.random.default_rng(seme)
+    # Pochi valori distinti, così i pari merito sono frequenti; circa un valore su cinque mancante
+    valori = casuale.integers(0, 6, righe).astype("float64")
+    valori[casuale.random(righe) < 0.2] = np.nan
+    return pd.DataFrame({"Entrate stimate": valori, "Marca": [f"M{i}" for i in range(righe)]},
+                        index=pd.Index([f"A{i}" for i in range(righe)], name="ASIN"))
+
+
+@pytest.mark.parametrize("crescente", [False, True])
+@pytest.mark.parametrize("n", [0, 1, 3, 7, 19, 20, 25, 100])
+@pytest.mark.parametrize("seme", range(5))
+def test_come_sort_values(seme, n, crescente):
+    tabella = _tabella(20, seme)
+
+    pd.testing.assert_frame_equal(primi_n(tabella, n, "Entrate stimate", crescente),
+                                  _atteso(tabella, n, "Entrate stimate", crescente))
+
+
+@pytest.mark.parametrize("crescente", [False, True])
+def test_sottoinsieme_di_righe(crescente):
+    tabella = _tabella(30, 7)
+    righe = np.array([29, 3, 4, 10, 11, 12, 0, 17, 25])
+
+    pd.testing.assert_frame_equal(primi_n(tabella, 4, "Entrate stimate", crescente, righe=righe),
+                                  _atteso(tabella, 4, "Entrate stimate", crescente, righe))
+
+
+def test_pari_merito_e_valori_mancanti():
+    serie = pd.Series([5.0, np.nan, 7.0, 5.0, 7.0, 5.0], index=list("abcdef"))
+
+    assert primi_n(serie, 3).index.tolist() == ["c", "e", "a"]
+    assert primi_n(serie, 4, crescente=True).index.tolist() == ["a", "d", "f", "c"]
+    # n oltre il numero di righe: tutte le righe valide; nlargest invece terrebbe anche il valore mancante in fondo
+    assert primi_n(serie, 10).index.tolist() == ["c", "e", "a", "d", "f"]
+    assert primi_n(serie, 10).index.tolist() == serie.dropna().nlargest(10, keep="first").index.tolist()
+    assert primi_n(serie, 0).empty
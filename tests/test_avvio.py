@@ -0,0 +1,10 @@
+import benchmark
+
+
+# Avvio della dashboard senza file caricati in un interprete nuovo: esegue davvero lo script fino a st.stop(),
+# quindi fallisce anche per operazioni pesanti a livello di modulo, non solo per import lenti
+def test_avvio_nel_budget():
+    secondi, vietati = benchmark.misura_avvio()
+    assert not vietati, "moduli caricati all'avvio: " + ", ".join(vietati)
+    assert secondi <= benchmark.BUDGET_AVVIO_SECONDI, (
+        f"avvio della dashboard in {secondi:.2f} s, oltre il budget di {benchmark.BUDGET_AVVIO_SECONDI:.2f} s")
@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+
+import cache_disco
+
+
+def test_chiavi_distinte_anche_con_prefisso_comune():
+    # Etichette che coincidono nei primi 40 caratteri e differiscono solo dopo
+    base = "benchmark-" + "0" * 40
+    assert cache_disco.chiave(base + "100000", 1) != cache_disco.chiave(base + "1000000", 1)
+    assert cache_disco.chiave("a" * 64, 1) != cache_disco.chiave("a" * 64 + "\n" + "b" * 64, 1)
+    assert cache_disco.chiave("a" * 64, 1) != cache_disco.chiave("a" * 64, 2)
+
+
+def test_chiave_valida_come_nome_di_file(tmp_path):
+    cartella = str(tmp_path)
+    chiave_cache = cache_disco.chiave("origine/export 1.xlsx\nB0001+B0002", 3)
+    data = pd.DataFrame({"ASIN": ["B0001", "B0002"], "Prezzo": [1.5, 2.0]})
+
+    assert cache_disco.scrivi(chiave_cache, data, cartella)
+    assert os.listdir(cartella) == [chiave_cache + cache_disco.ESTENSIONE]
+    pd.testing.assert_frame_equal(cache_disco.leggi(chiave_cache, cartella), data)
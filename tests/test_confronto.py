@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+import confronto
+from confronto import ENTRATO, PRESENTE, USCITO
+
+NAN = np.nan
+
+
+def _export(righe):
+    return pd.DataFrame(righe, columns=["ASIN", "Marca", "Entrate stimate", "Vendite stimate", "Prezzo", "Piazzamento"])
+
+
+# A1 e A5 escono, A4 entra; A3 ha misure mancanti in entrambi gli export, A5 non ha entrate
+PRECEDENTE = _export([
+    ("A1", "M1", 100.0, 10.0, 10.0, 5.0),
+    ("A2", "M1", 50.0, 5.0, 10.0, 8.0),
+    ("A3", "M2", 50.0, NAN, NAN, 20.0),
+    ("A5", "M4", NAN, 1.0, 5.0, 30.0),
+])
+ATTUALE = _export([
+    ("A2", "M1", 80.0, 8.0, 10.0, 6.0),
+    ("A3", "M2", NAN, 4.0, 12.5, NAN),
+    ("A4", "M3", 120.0, 12.0, 10.0, 3.0),
+])
+
+
+def _colonna(differenze, nome):
+    return differenze[nome].to_numpy(dtype="float64")
+
+
+def test_stati_e_ordine_delle_righe():
+    differenze = confronto.confronta(PRECEDENTE, ATTUALE)
+
+    # Prima le righe dell'export attuale nel suo ordine, poi gli usciti nell'ordine dell'export precedente
+    assert differenze.index.tolist() == ["A2", "A3", "A4", "A1", "A5"]
+    assert differenze["Stato"].tolist() == [PRESENTE, PRESENTE, ENTRATO, USCITO, USCITO]
+    assert differenze["Marca"].tolist() == ["M1", "M2", "M3", "M1", "M4"]
+    assert confronto.righe_con_stato(differenze, [USCITO, ENTRATO]).tolist() == [2, 3, 4]
+
+
+def test_colonne_prima_dopo_e_delta():
+    differenze = confronto.confronta(PRECEDENTE, ATTUALE)
+
+    # Le colonne additive valgono zero per l'ASIN assente, prezzo e posizione restano mancanti
+    np.testing.assert_array_equal(_colonna(differenze, "Entrate stimate prima"), [50, 50, 0, 100, NAN])
+    np.testing.assert_array_equal(_colonna(differenze, "Entrate stimate dopo"), [80, NAN, 120, 0, 0])
+    np.testing.assert_array_equal(_colonna(differenze, "Δ Entrate stimate"), [30, NAN, 120, -100, NAN])
+    np.testing.assert_array_equal(_colonna(differenze, "Δ Vendite stimate"), [3, NAN, 12, -10, -1])
+    np.testing.assert_array_equal(_colonna(differenze, "Prezzo prima"), [10, NAN, NAN, 10, 5])
+    np.testing.assert_array_equal(_colonna(differenze, "Δ Prezzo"), [0, NAN, NAN, NAN, NAN])
+    np.testing.assert_array_equal(_colonna(differenze, "Δ Piazzamento"), [-2, NAN, NAN, NAN, NAN])
+
+
+def test_delta_quota_di_mercato():
+    differenze = confronto.confronta(PRECEDENTE, ATTUALE)
+
+    # Quote sul totale delle entrate di ciascun export (200 e 200), ignorando le entrate mancanti
+    np.testing.assert_allclose(_colonna(differenze, "Quota di mercato (%) prima"), [25, 25, 0, 50, NAN])
+    np.testing.assert_allclose(_colonna(differenze, "Quota di mercato (%) dopo"), [40, NAN, 60, 0, 0])
+    np.testing.assert_allclose(_colonna(differenze, "Δ Quota di mercato (%)"), [15, NAN, 60, -50, NAN])
+
+
+def test_quota_con_export_senza_entrate():
+    vuoto = PRECEDENTE.assign(**{"Entrate stimate": NAN})
+    differenze = confronto.confronta(vuoto, ATTUALE)
+
+    # Nessuna divisione per zero: l'ASIN entrato ha quota nulla, le entrate mancanti restano mancanti
+    np.testing.assert_allclose(_colonna(differenze, "Quota di mercato (%) prima"), [NAN, NAN, 0, NAN, NAN])
+    np.testing.assert_allclose(_colonna(differenze, "Quota di mercato (%) dopo"), [40, NAN, 60, 0, 0])
+
+
+def test_confronto_per_marca():
+    marche = confronto.confronta_marche(confronto.confronta(PRECEDENTE, ATTUALE))
+
+    assert marche.index.tolist() == ["M1", "M2", "M3", "M4"]
+    assert marche["Stato"].tolist() == [PRESENTE, PRESENTE, ENTRATO, USCITO]
+    assert marche["ASIN prima"].tolist() == [2, 1, 0, 1]
+    assert marche["ASIN dopo"].tolist() == [1, 1, 1, 0]
+    np.testing.assert_allclose(marche["Δ Entrate stimate"], [-70, -50, 120, 0])
+    np.testing.assert_allclose(marche["Quota di mercato (%) prima"], [75, 25, 0, 0])
+    np.testing.assert_allclose(marche["Δ Quota di mercato (%)"], [-35, -25, 60, 0])
+
+
+def test_riepilogo():
+    differenze = confronto.confronta(PRECEDENTE, ATTUALE)
+    riepilogo = confronto.riepilogo_confronto(differenze, confronto.confronta_marche(differenze))
+
+    assert riepilogo["Total Revenue"] == (200, 200)
+    assert riepilogo["Total Sales"] == (16, 24)
+    np.testing.assert_allclose(riepilogo["Average Selling Price"], (25 / 3, 32.5 / 3))
+    assert riepilogo["Conteggio ASIN"] == (4, 3)
+    assert riepilogo["Conteggio BRAND"] == (3, 3)
+    assert (riepilogo["ASIN entrati"], riepilogo["ASIN usciti"]) == (1, 2)
+    assert (riepilogo["BRAND entrati"], riepilogo["BRAND usciti"]) == (1, 1)
@@ -0,0 +1,75 @@
+import io
+import zipfile
+
+import pandas as pd
+
+from ingestione import leggi_export
+
+_TIPI = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+</Types>"""
+
+_RELAZIONI = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_RELAZIONI_WORKBOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+
+_CONDIVISE = """<?xml version="1.0" encoding="UTF-8"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="2" uniqueCount="2">
+<si><t>MCH</t></si><si><t></t></si>
+</sst>"""
+
+# Venditore con celle in linea vuote (<c t="inlineStr"/> e <is><t/></is>) e una stringa condivisa vuota
+_FOGLIO = """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>
+<row r="1">
+<c r="A1" t="inlineStr"><is><t>ASIN</t></is></c>
+<c r="B1" t="inlineStr"><is><t>Venditore</t></is></c>
+<c r="C1" t="inlineStr"><is><t>Prezzo</t></is></c>
+</row>
+<row r="2"><c r="A2" t="inlineStr"><is><t>B0001</t></is></c><c r="B2" t="inlineStr"><is><t>FBA</t></is></c><c r="C2"><v>10.5</v></c></row>
+<row r="3"><c r="A3" t="inlineStr"><is><t>B0002</t></is></c><c r="B3" t="inlineStr"/><c r="C3"><v>7</v></c></row>
+<row r="4"><c r="A4" t="inlineStr"><is><t>B0003</t></is></c><c r="B4" t="inlineStr"><is><t/></is></c><c r="C4"><v>3.25</v></c></row>
+<row r="5"><c r="A5" t="inlineStr"><is><t>B0004</t></is></c><c r="B5" t="s"><v>0</v></c><c r="C5"><v>1</v></c></row>
+<row r="6"><c r="A6" t="inlineStr"><is><t>B0005</t></is></c><c r="B6" t="s"><v>1</v></c><c r="C6"><v>2</v></c></row>
+</sheetData></worksheet>"""
+
+
+def _export_xlsx():
+    contenuto = io.BytesIO()
+    with zipfile.ZipFile(contenuto, "w") as archivio:
+        archivio.writestr("[Content_Types].xml", _TIPI)
+        archivio.writestr("_rels/.rels", _RELAZIONI)
+        archivio.writestr("xl/workbook.xml", _WORKBOOK)
+        archivio.writestr("xl/_rels/workbook.xml.rels", _RELAZIONI_WORKBOOK)
+        archivio.writestr("xl/sharedStrings.xml", _CONDIVISE)
+        archivio.writestr("xl/worksheets/sheet1.xml", _FOGLIO)
+    contenuto.seek(0)
+    contenuto.name = "export.xlsx"
+    return contenuto
+
+
+def test_celle_vuote_come_read_excel():
+    colonne = {"ASIN": "object", "Venditore": "object", "Prezzo": "float64"}
+    letto, _ = leggi_export(_export_xlsx(), colonne)
+    atteso = pd.read_excel(_export_xlsx(), engine="openpyxl")
+
+    pd.testing.assert_frame_equal(letto, atteso[list(colonne)], check_dtype=False)
+    assert letto["Venditore"].isna().tolist() == [False, True, True, False, True]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+import modello_bsr
+from modello_bsr import costruisci_modello, TUTTE_LE_CATEGORIE
+
+
+def _categoria(nome, coppie, vendite_per_rank=1e5):
+    # Vendite esattamente inverse al rank, su rank distribuiti in scala logaritmica tra 1 e 1000
+    rank = np.logspace(0, 3, coppie)
+    return pd.DataFrame({"Categoria": nome, "Piazzamento": rank, "BSR 30": rank,
+                         "Vendite stimate": vendite_per_rank / rank})
+
+
+def test_soglia_di_coppie_per_categoria():
+    # C ha 60 righe, ma solo 45 con Piazzamento e Vendite stimate positivi
+    c = _categoria("C", 60)
+    c.loc[:14, "Vendite stimate"] = [0.0] * 5 + [np.nan] * 5 + [-1.0] * 5
+    df = pd.concat([_categoria("A", modello_bsr.MINIMO_COPPIE), _categoria("B", modello_bsr.MINIMO_COPPIE - 1), c],
+                   ignore_index=True)
+
+    modello = costruisci_modello(df)
+    assert modello.categorie.tolist() == ["A", TUTTE_LE_CATEGORIE]
+    assert costruisci_modello(df, minimo_coppie=45).categorie.tolist() == ["A", "B", "C", TUTTE_LE_CATEGORIE]
+
+
+def test_categorie_senza_curva_usano_tutte_le_categorie():
+    df = pd.concat([_categoria("A", 80), _categoria("B", 20, vendite_per_rank=1e3)], ignore_index=True)
+    modello = costruisci_modello(df)
+    rank = np.array([1.0, 10.0, 100.0, 500.0])
+
+    attese = modello.stima([TUTTE_LE_CATEGORIE] * 4, rank)
+    np.testing.assert_array_equal(modello.stima(["B"] * 4, rank), attese)
+    np.testing.assert_array_equal(modello.stima(["Sconosciuta", None, np.nan, "B"], rank), attese)
+    # La curva propria di A segue le sue vendite
+    np.testing.assert_allclose(modello.stima(["A"] * 4, rank), 1e5 / rank, rtol=0.05)
+
+
+def test_curve_mai_crescenti():
+    casuale = np.random.default_rng(3)
+    rank = casuale.integers(1, 5000, 400).astype("float64")
+    # Vendite rumorose e in alcuni tratti crescenti con il rank
+    vendite = 1e4 / np.sqrt(rank) * casuale.lognormal(0, 0.8, 400) + np.where(rank > 3000, 500, 0)
+    df = pd.DataFrame({"Categoria": np.where(casuale.random(400) < 0.5, "A", "B"), "Piazzamento": rank,
+                       "BSR 30": rank, "Vendite stimate": vendite})
+
+    modello = costruisci_modello(df)
+    assert len(modello.categorie) == 3
+    assert (np.diff(modello.tabella, axis=1) <= 0).all()
+    stime = modello.stima(["A"] * 200, np.linspace(1, 6000, 200))
+    assert (np.diff(stime) <= 1e-9 * stime[:-1]).all()
+
+
+def test_rank_fuori_dalla_griglia():
+    df = _categoria("A", 80)
+    # Il BSR 30 più alto estende la griglia fino a 10000
+    df.loc[0, "BSR 30"] = 10_000
+    modello = costruisci_modello(df)
+
+    ai_bordi = modello.stima(["A"] * 2, [1.0, 10_000.0])
+    # Rank sotto 1 valgono come rank 1, oltre la griglia la curva resta piatta, rank mancanti restano mancanti
+    stime = modello.stima(["A"] * 5, [0.0, -3.0, 50_000.0, 1e9, np.nan])
+    np.testing.assert_array_equal(stime[:2], ai_bordi[[0, 0]])
+    np.testing.assert_array_equal(stime[2:4], ai_bordi[[1, 1]])
+    assert np.isnan(stime[4])
+    assert np.isfinite(ai_bordi).all()
+
+
+def test_export_senza_coppie():
+    df = _categoria("A", 10).assign(**{"Vendite stimate": 0.0})
+    modello = costruisci_modello(df)
+
+    assert modello.categorie.tolist() == [TUTTE_LE_CATEGORIE]
+    assert np.isnan(modello.stima(["A", "B"], [1.0, 100.0])).all()
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from pulizia import compatta_dati, COLONNE_TESTUALI, COLONNE_INTERE
+
+
+def test_ogni_colonna_ha_un_solo_tipo_compatto():
+    assert not set(COLONNE_TESTUALI) & set(COLONNE_INTERE)
+
+
+def test_tipi_compatti():
+    righe = 10
+    df = pd.DataFrame({"Marca": ["A", "B"] * (righe // 2), "ASIN": [f"B{i:04d}" for i in range(righe)],
+                       "Varianti": np.r_[np.arange(righe - 1, dtype="float64"), np.nan],
+                       "Piazzamento": np.arange(righe, dtype="float64") + 0.5, "Prezzo": np.ones(righe)})
+
+    tipi = compatta_dati(df).dtypes
+    assert tipi["Marca"] == "category"
+    # ASIN tutti diversi: la codifica a categorie non farebbe risparmiare memoria
+    assert tipi["ASIN"] == object
+    assert tipi["Varianti"] == "float32"
+    # Valori non interi e colonne non elencate restano float64
+    assert tipi["Piazzamento"] == "float64"
+    assert tipi["Prezzo"] == "float64"
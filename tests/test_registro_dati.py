@@ -0,0 +1,137 @@
+import gc
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from registro_dati import RegistroDataset, Prenotazione
+
+
+def _dataset(righe=2**16):
+    # 2**16 righe: 0,5 MB di Prezzo, 64 KB di codici per Marca, 0,5 MB di date
+    return pd.DataFrame({"Prezzo": np.arange(righe, dtype="float64"),
+                         "Marca": pd.Categorical(np.where(np.arange(righe) % 2, "A", "B")),
+                         "Data": pd.date_range("2024-01-01", periods=righe, freq="min")})
+
+
+class _Caricamenti:
+
+    def __init__(self):
+        self.chiamate = []
+
+    def __call__(self, impronta_file):
+        def carica():
+            self.chiamate.append(impronta_file)
+            return _dataset(), {"origine": impronta_file}
+        return carica
+
+
+def test_le_sessioni_condividono_gli_array_in_sola_lettura():
+    registro, carica = RegistroDataset(), _Caricamenti()
+    prima, statistiche = registro.acquisisci("a", carica("a"))
+    seconda, _ = registro.acquisisci("a", carica("a"))
+
+    assert carica.chiamate == ["a"]
+    assert statistiche == {"origine": "a"}
+    assert registro.stato()["riferimenti"] == 2
+    assert np.shares_memory(prima["Prezzo"].to_numpy(), seconda["Prezzo"].to_numpy())
+    assert np.shares_memory(prima["Marca"].cat.codes.to_numpy(), seconda["Marca"].cat.codes.to_numpy())
+
+    # Una modifica sul posto solleva un errore invece di cambiare i dati dell'altra sessione
+    for colonna, valore in [("Prezzo", -1.0), ("Marca", "A")]:
+        with pytest.raises(ValueError):
+            prima.iloc[0, prima.columns.get_loc(colonna)] = valore
+    # Per le date si verifica direttamente l'array: pandas 2.0 ritenta la scrittura fino a un RecursionError
+    for colonna, valore in [("Prezzo", -1.0), ("Data", np.datetime64("2000-01-01"))]:
+        with pytest.raises(ValueError):
+            prima[colonna].to_numpy()[0] = valore
+    assert seconda["Prezzo"].iloc[0] == 0.0 and seconda["Marca"].iloc[0] == "B"
+
+    # Una nuova colonna resta nella vista della sessione
+    prima["Doppio"] = prima["Prezzo"] * 2
+    assert "Doppio" not in seconda
+
+
+def test_sola_lettura_senza_copie():
+    originale = _dataset()
+    registro = RegistroDataset()
+    data, _ = registro.acquisisci("a", lambda: (originale, {}))
+
+    assert np.shares_memory(data["Prezzo"].to_numpy(), originale["Prezzo"].to_numpy())
+    assert np.shares_memory(data["Data"].to_numpy(), originale["Data"].to_numpy())
+    pd.testing.assert_frame_equal(data, _dataset())
+
+
+def test_rilascio_ed_eliminazione_dei_dataset_non_usati():
+    # Budget per poco più di un dataset (circa 1 MB ciascuno)
+    registro, carica = RegistroDataset(budget_mb=1.5), _Caricamenti()
+    registro.acquisisci("a", carica("a"))
+    registro.acquisisci("b", carica("b"))
+    # Entrambi in uso: restano oltre il budget
+    assert registro.stato()["dataset"] == 2
+
+    registro.rilascia("a")
+    registro.rilascia("a")
+    assert registro.stato()["riferimenti"] == 1
+    # a non è più usato: viene eliminato appena serve spazio
+    registro.acquisisci("c", carica("c"))
+    assert registro.stato()["dataset"] == 2
+    registro.acquisisci("a", carica("a"))
+    assert carica.chiamate == ["a", "b", "c", "a"]
+
+
+def test_eliminazione_dal_meno_usato_di_recente():
+    registro, carica = RegistroDataset(budget_mb=2.5), _Caricamenti()
+    for impronta_file in ["a", "b"]:
+        registro.acquisisci(impronta_file, carica(impronta_file))
+    registro.rilascia("b")
+    registro.rilascia("a")
+    registro.acquisisci("c", carica("c"))
+    registro.rilascia("c")
+
+    # b è il meno usato di recente tra i dataset liberi
+    registro.acquisisci("a", carica("a"))
+    registro.acquisisci("c", carica("c"))
+    registro.acquisisci("b", carica("b"))
+    assert carica.chiamate == ["a", "b", "c", "b"]
+
+
+def test_prenotazione_rilasciata_con_la_sessione():
+    registro, carica = RegistroDataset(), _Caricamenti()
+    prenotazione = Prenotazione("a", carica("a"), registro)
+    altra = Prenotazione("a", carica("a"), registro)
+    assert registro.stato()["riferimenti"] == 2
+
+    # Rilascio esplicito e poi eliminazione dell'oggetto: il dataset viene rilasciato una volta sola
+    prenotazione.rilascia()
+    del prenotazione
+    gc.collect()
+    assert registro.stato()["riferimenti"] == 1
+
+    del altra
+    gc.collect()
+    assert registro.stato() | {"mb": 0} == {"dataset": 1, "mb": 0, "budget_mb": registro.budget_mb, "in_uso": 0,
+                                            "riferimenti": 0}
+
+
+def test_caricamento_unico_tra_sessioni_concorrenti():
+    registro, chiamate = RegistroDataset(), []
+
+    def carica():
+        chiamate.append(1)
+        time.sleep(0.05)
+        return _dataset(), {}
+
+    risultati = []
+    sessioni = [threading.Thread(target=lambda: risultati.append(registro.acquisisci("a", carica)[0]))
+                for _ in range(8)]
+    for sessione in sessioni:
+        sessione.start()
+    for sessione in sessioni:
+        sessione.join()
+
+    assert len(chiamate) == 1
+    assert registro.stato()["riferimenti"] == 8
+    assert all(np.shares_memory(data["Prezzo"].to_numpy(), risultati[0]["Prezzo"].to_numpy()) for data in risultati)
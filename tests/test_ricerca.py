@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ricerca import IndiceRicerca, CONTIENE, INIZIA_CON, SIMILE
+
+MARCHE = pd.Series(["Bettershop", "BETTER Home", "Brand1", "brand10", None, "Brand1", "Straße", "STRASSE",
+                    "İstanbul", "Café Noir", "A+B (Pro)", "Bettershop", "ab", np.nan, "x.y", "Brand1"],
+                   dtype="category")
+
+
+@pytest.mark.parametrize("testo", ["", "b", "B", "br", "bra", "BRAND1", "brand10", "better", "ter ho", "shop",
+                                   "ss", "ß", "i", "café", "+b (", "a+b", "x.y", ".", "ab", "zzz", "brand100"])
+def test_contiene_come_str_contains(testo):
+    indice = IndiceRicerca(MARCHE)
+    attese = np.flatnonzero(MARCHE.str.contains(testo, case=False, na=False, regex=False))
+
+    np.testing.assert_array_equal(indice.righe(testo, CONTIENE), attese)
+
+
+@pytest.mark.parametrize("testo", ["", "b", "br", "BRAND1", "better ", "str", "zzz"])
+def test_inizia_con(testo):
+    indice = IndiceRicerca(MARCHE)
+    attese = np.flatnonzero(MARCHE.astype(object).fillna("").str.upper().str.startswith(testo.upper()).to_numpy()
+                            & MARCHE.notna().to_numpy())
+
+    np.testing.assert_array_equal(indice.righe(testo, INIZIA_CON), attese)
+
+
+def test_simile_tollera_errori_di_battitura():
+    indice = IndiceRicerca(MARCHE)
+
+    trovati = indice.valori("Betershop", SIMILE)
+    assert trovati[0] == "Bettershop"
+    assert "Brand1" not in trovati
+    # Il valore identico al testo cercato è il più simile
+    assert indice.valori("brand1", SIMILE)[0] == "Brand1"
+    assert len(indice.valori("qwxz", SIMILE)) == 0
+
+
+def test_righe_di_raggruppa_le_righe_per_valore():
+    indice = IndiceRicerca(MARCHE)
+
+    # Valori distinti nell'ordine di prima comparsa, senza i mancanti
+    assert len(indice) == 11
+    assert indice.distinti[0] == "Bettershop"
+    np.testing.assert_array_equal(indice.righe_di([0]), [0, 11])
+    np.testing.assert_array_equal(indice.righe_di(np.array([2, 0])), [0, 2, 5, 11, 15])
+    assert indice.righe_di([]).size == 0
+    # Ogni riga non mancante appartiene a esattamente un valore distinto
+    tutte = indice.righe_di(np.arange(len(indice)))
+    np.testing.assert_array_equal(tutte, np.flatnonzero(MARCHE.notna()))
+
+
+def test_modalita_non_valida():
+    with pytest.raises(ValueError):
+        IndiceRicerca(MARCHE).identificativi("brand", "Regex")
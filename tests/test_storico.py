@@ -0,0 +1,41 @@
+import os
+
+import pandas as pd
+
+import storico
+
+
+def _export(asin, piazzamento):
+    return pd.DataFrame({"ASIN": asin, "Marca": "M", "Categoria": "C", "Piazzamento": piazzamento,
+                         "BSR 30": piazzamento, "Vendite stimate": 1.0, "Entrate stimate": 1.0, "Prezzo": 1.0})
+
+
+def test_export_multipli_non_sostituiscono_il_singolo(tmp_path):
+    cartella = str(tmp_path)
+    impronta_a = "a" * 64
+    # Stesso prefisso dell'export A: prima il nome del file era impronta_file[:16]
+    impronta_unita = impronta_a + "+" + "b" * 64
+
+    assert storico.aggiungi_snapshot(_export(["X1", "X2"], [10.0, 20.0]), impronta_a, "2024-05-01", cartella=cartella) == 2
+    assert storico.aggiungi_snapshot(_export(["X1", "X2", "Y1"], [11.0, 21.0, 5.0]), impronta_unita, "2024-05-01",
+                                     cartella=cartella) == 3
+
+    # Le righe di entrambe le fotografie restano su disco, in file distinti
+    righe = {}
+    for radice, _, nomi in os.walk(cartella):
+        for nome in nomi:
+            if nome.endswith(storico.ESTENSIONE):
+                tabella = storico.ipc.open_file(os.path.join(radice, nome)).read_all()
+                righe[nome] = righe.get(nome, 0) + tabella.num_rows
+    assert sorted(righe.values()) == [2, 3]
+
+
+def test_file_esistente_non_viene_sostituito(tmp_path):
+    percorso = str(tmp_path / "parte" / "f.arrow")
+    tabella = storico.pa.Table.from_pandas(_export(["X1"], [1.0]), preserve_index=False)
+    assert storico._scrivi(tabella, percorso)
+    prima = os.path.getmtime(percorso), os.path.getsize(percorso)
+    assert not storico._scrivi(storico.pa.Table.from_pandas(_export(["X1", "X2"], [1.0, 2.0]), preserve_index=False),
+                               percorso)
+    assert (os.path.getmtime(percorso), os.path.getsize(percorso)) == prima
+    assert os.listdir(os.path.dirname(percorso)) == ["f.arrow"]